@@ -4,13 +4,10 @@
 这个文件包含重构后的API端点，将逐步替换api_server.py中的旧实现
 """
 from flask import request, jsonify
-from datetime import datetime, timedelta
+from datetime import datetime
 import logging
-import re
-import json
-import requests
 import time
-import os
+import uuid
 # 导入数据库操作
 from db_operations import (
     get_or_create_account,
@@ -18,20 +15,44 @@ from db_operations import (
     get_valid_parameters,
     invalidate_parameters,
     save_article,
-    get_article,
-    get_articles_by_filters,
-    is_article_fresh
+    new_save_counts,
+    save_articles_with_fallback,
+    get_articles_page,
+    decode_article_cursor,
+    get_uncovered_ranges,
+    get_article_stat_curve,
+    get_account_stat_curve,
+    ARTICLE_LIST_FIELDS,
+    COVERAGE_MAX_AGE_HOURS,
+    STAT_CURVE_BUCKETS
+)
+from incremental_sync import IncrementalSync
+from db_cache import (
+    get_cached_biz_by_account_name,
+    get_cached_parameters,
+    ensure_account,
+    get_cached_article_with_freshness
 )
-from db_helpers import get_biz_by_account_name
 # 导入现有功能
 from smart_batch_fetch import (
     extract_appmsg_token_from_cookie,
     extract_biz_from_url,
 )
+from article_document import ArticleDocument
 from download_full_html import download_full_html_with_stats
+from page_metadata import extract_page_metadata
+from article_pipeline import parse_concurrency, stream_article_pipeline
+from profile_listing import LISTING_MODES, MODE_BACKFILL, MODE_INCREMENTAL, ProfileListing
+import http_client
 from wechatarticles import ArticlesInfo
 logger = logging.getLogger(__name__)
 
+# 批量写入数据库的页大小（与profile_ext每页文章数一致）
+BULK_SAVE_SIZE = 10
+# 文章列表每页数量：默认值和上限
+DEFAULT_PAGE_LIMIT = 20
+MAX_PAGE_LIMIT = 100
+
 
 def _write_params_to_config(params):
     """
@@ -74,10 +95,17 @@ BIZ = ''
     importlib.reload(params.new_wechat_config)
     
     logger.info(f"   ✅ 已更新params/new_wechat_config.py")
-def fetch_articles_with_params(biz, params, start_date=None, end_date=None, should_stop_func=None):
+def _listing_credentials(params):
+    """数据库参数 -> ProfileListing / 留言接口使用的凭据"""
+    return {name: params.get(name, '') for name in ('uin', 'key', 'pass_ticket', 'appmsg_token', 'cookie')}
+
+
+def fetch_articles_with_params(biz, params, start_date=None, end_date=None, should_stop_func=None, incremental_sync=None):
     """
     使用数据库参数获取公众号文章列表（支持增量更新）
     
+    一次列完再返回；需要边列出边处理时直接使用 profile_listing.ProfileListing
+    
     Parameters
     ----------
     biz : str
@@ -90,152 +118,32 @@ def fetch_articles_with_params(biz, params, start_date=None, end_date=None, shou
         结束日期
     should_stop_func : function, optional
         回调函数，接收 article 字典，返回 True 则停止获取
+    incremental_sync : IncrementalSync, optional
+        增量同步状态（优先于 should_stop_func）：已入库的文章跳过，
+        在缺口区间外遇到已入库的主文章时停止
     
     Returns
     -------
     list
         文章列表
+    
+    完整列出（到达开始日期、列完全部历史或遇到已存在文章）后，
+    会把实际列过的日期区间记录到 fetch_coverage 表
     """
     logger.info(f"📡 使用数据库参数获取文章列表...")
-    
-    # 构造请求头
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36 MicroMessenger/3.4.0',
-        'Cookie': params['cookie'],
-        'Referer': f'https://mp.weixin.qq.com/mp/profile_ext?action=home&__biz={biz}&scene=124',
-        'Accept': 'application/json, text/javascript, */*; q=0.01',
-        'X-Requested-With': 'XMLHttpRequest',
-    }
-    
-    all_articles = []
-    offset = 0
-    count = 10
-    has_more = True
-    
-    while has_more:
-        # ... (API URL construction) ...
-        api_url = (
-            f"https://mp.weixin.qq.com/mp/profile_ext?"
-            f"action=getmsg&"
-            f"__biz={biz}&"
-            f"f=json&"
-            f"offset={offset}&"
-            f"count={count}&"
-            f"is_ok=1&"
-            f"scene=124&"
-            f"uin={params.get('uin', '')}&"
-            f"key={params.get('key', '')}&"
-            f"pass_ticket={params.get('pass_ticket', '')}&"
-            f"wxtoken=&"
-            f"appmsg_token={params.get('appmsg_token', '')}&"
-            f"x5=0"
-        )
-        
-        try:
-            logger.info(f"   获取第 {offset//count + 1} 页...")
-            
-            response = requests.get(api_url, headers=headers, timeout=10)
-            data = response.json()
-            
-            if data.get('ret') != 0:
-                # Error handling...
-                errmsg = data.get('errmsg', 'Unknown')
-                if 'no session' in errmsg.lower():
-                    return {'error': 'no_session', 'message': '参数已失效'}
-                logger.warning(f"   ⚠️  API返回错误: {errmsg}")
-                break
-            
-            # 解析文章列表
-            general_msg_list = data.get('general_msg_list', {})
-            if isinstance(general_msg_list, str):
-                general_msg_list = json.loads(general_msg_list)
-            
-            msg_list = general_msg_list.get('list', [])
-            
-            if not msg_list:
-                logger.info(f"   ✅ 已获取所有文章")
-                break
-            
-            # 处理每条消息
-            for msg in msg_list:
-                comm_msg_info = msg.get('comm_msg_info', {})
-                app_msg_ext_info = msg.get('app_msg_ext_info', {})
-                
-                if not app_msg_ext_info:
-                    continue
-                
-                publish_time = comm_msg_info.get('datetime', 0)
-                article_date = datetime.fromtimestamp(publish_time)
-                
-                # 检查日期范围
-                if end_date and article_date > end_date + timedelta(days=1):
-                    # 文章太新，跳过，继续找旧的
-                    continue
-                
-                if start_date and article_date < start_date:
-                    # 文章太旧，结束获取
-                    logger.info(f"   🛑 遇到早于开始日期的文章 ({article_date.date()})，停止获取")
-                    has_more = False
-                    break
-                
-                # 主文章
-                article_url = app_msg_ext_info.get('content_url', '').replace('\\/', '/')
-                article_title = app_msg_ext_info.get('title', '')
-                
-                article = {
-                    'title': article_title,
-                    'url': article_url,
-                    'digest': app_msg_ext_info.get('digest', ''),
-                    'cover': app_msg_ext_info.get('cover', ''),
-                    'publish_time': publish_time,
-                    'publish_date': article_date.strftime('%Y-%m-%d'),
-                }
-                
-                # 检查主文章是否已存在
-                main_article_exists = should_stop_func and should_stop_func(article) if should_stop_func else False
-                
-                if article['url'] and not main_article_exists:
-                    all_articles.append(article)
-                
-                # 多图文消息（即使主文章存在，也要处理多图文）
-                multi_app_msg_item_list = app_msg_ext_info.get('multi_app_msg_item_list', [])
-                if multi_app_msg_item_list:
-                    logger.info(f"   📑 发现 {len(multi_app_msg_item_list)} 篇多图文")
-                for item in multi_app_msg_item_list:
-                    sub_article = {
-                        'title': item.get('title', ''),
-                        'url': item.get('content_url', '').replace('\\/', '/'),
-                        'digest': item.get('digest', ''),
-                        'cover': item.get('cover', ''),
-                        'publish_time': publish_time,
-                        'publish_date': article_date.strftime('%Y-%m-%d'),
-                    }
-                    if sub_article['url']:
-                        # 检查子文章是否已存在
-                        sub_exists = should_stop_func and should_stop_func(sub_article) if should_stop_func else False
-                        if not sub_exists:
-                            all_articles.append(sub_article)
-                
-                # 如果主文章已存在，且所有子文章也都存在，则停止获取
-                if main_article_exists:
-                    logger.info(f"   🛑 遇到已存在的文章，停止获取: {article_title}")
-                    has_more = False
-                    break
-            
-            offset += count
-            time.sleep(1 + (offset % 3)) # 随机延迟
-            
-        except Exception as e:
-            logger.error(f"   ❌ 获取失败: {e}")
-            break
-    
-    logger.info(f"✅ 从API新获取 {len(all_articles)} 篇文章")
+    listing = ProfileListing(biz, _listing_credentials(params), start_date, end_date,
+                             incremental_sync=incremental_sync, should_stop_func=should_stop_func)
+    all_articles = list(listing)
+    if listing.error == 'no_session':
+        return {'error': 'no_session', 'message': '参数已失效'}
     
     # 调试：打印每篇文章的URL
     for idx, art in enumerate(all_articles, 1):
         logger.debug(f"  [{idx}] {art.get('title', '')[:40]}: {art.get('url', '')[:100]}")
     
     return all_articles
+
+
 def fetch_article_with_cache():
     """
     获取单篇文章数据（使用数据库缓存）
@@ -266,7 +174,7 @@ def fetch_article_with_cache():
         
         # 方法1：如果提供了account_name，从数据库查询BIZ和参数
         if account_name:
-            biz, params = get_biz_by_account_name(account_name)
+            biz, params = get_cached_biz_by_account_name(account_name)
             if biz:
                 logger.info(f"✅ 从数据库获取BIZ: {biz} (账号: {account_name})")
                 if params:
@@ -290,16 +198,16 @@ def fetch_article_with_cache():
             
             # 提取到BIZ后，尝试获取参数
             if not params:
-                params = get_valid_parameters(biz)
+                params = get_cached_parameters(biz)
                 if params:
                     logger.info(f"   获取到已存储的参数")
         
-        # 更新账号信息
-        get_or_create_account(biz, account_name)
+        # 更新账号信息（账号已知且名称没变时不访问数据库）
+        ensure_account(biz, account_name)
         
-        # 2. 检查文章数据缓存
-        cached_article = get_article(article_url)
-        if cached_article and is_article_fresh(article_url, max_age_hours=24):
+        # 2. 检查文章数据缓存（一次查询同时得到文章和是否新鲜）
+        cached_article, is_fresh = get_cached_article_with_freshness(article_url, max_age_hours=24, include_html=True)
+        if cached_article and is_fresh:
             logger.info(f"✅ 使用缓存的文章数据: {cached_article.get('title')}")
             return jsonify({
                 'success': True,
@@ -344,30 +252,17 @@ def fetch_article_with_cache():
         if '/s/' in article_url and '__biz=' not in article_url:
             logger.info(f"   检测到短链接，正在转换...")
             try:
-                import requests
                 headers = {
                     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
                     'Cookie': params['cookie'],
                 }
-                response = requests.get(article_url, headers=headers, timeout=15)
-                
-                # 从页面内容提取完整URL
-                patterns = [
-                    r'var\s+msg_link\s*=\s*["\']([^"\']+)["\']',
-                    r'url:\s*["\']([^"\']+/s\?[^"\']+)["\']',
-                    r'window.msg_link = "([^"]+)"',
-                ]
+                response = http_client.get(article_url, headers=headers, timeout=15)
                 
-                for pattern in patterns:
-                    match = re.search(pattern, response.text)
-                    if match:
-                        extracted_url = match.group(1)
-                        # 转换HTML实体
-                        extracted_url = extracted_url.replace('&amp;', '&').replace('\\/', '/')
-                        if '__biz=' in extracted_url and 'mid=' in extracted_url:
-                            final_article_url = extracted_url
-                            logger.info(f"   ✅ 转换成功: {final_article_url[:80]}...")
-                            break
+                # 从页面内容提取完整URL（msg_link）
+                extracted_url = extract_page_metadata(response.text).msg_link
+                if extracted_url and '__biz=' in extracted_url and 'mid=' in extracted_url:
+                    final_article_url = extracted_url
+                    logger.info(f"   ✅ 转换成功: {final_article_url[:80]}...")
                 else:
                     logger.warning(f"   ⚠️  无法从页面提取完整URL")
                     
@@ -378,7 +273,9 @@ def fetch_article_with_cache():
         try:
             articles_info = ArticlesInfo(
                 appmsg_token=params['appmsg_token'],
-                cookie=params['cookie']
+                cookie=params['cookie'],
+                client=http_client,
+                timeout=http_client.DEFAULT_TIMEOUT
             )
             stats = get_article_stats(final_article_url, articles_info)
             
@@ -410,23 +307,16 @@ def fetch_article_with_cache():
             article_title = None
             article_html = None
             try:
-                import requests as req
                 headers = {
                     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
                     'Cookie': params['cookie'],
                 }
-                article_response = req.get(final_article_url, headers=headers, timeout=15)
+                article_response = http_client.get(final_article_url, headers=headers, timeout=15)
                 article_html = article_response.text
                 
-                # 从HTML提取标题
-                title_match = re.search(r'<h1[^>]*class="rich_media_title"[^>]*>([^<]+)</h1>', article_html)
-                if title_match:
-                    article_title = title_match.group(1).strip()
-                else:
-                    # 尝试其他方式
-                    title_match2 = re.search(r'<meta\s+property="og:title"\s+content="([^"]+)"', article_html)
-                    if title_match2:
-                        article_title = title_match2.group(1).strip()
+                # 从HTML提取标题（<h1>，其次 og:title）
+                page_meta = extract_page_metadata(article_html)
+                article_title = page_meta.h1_title or page_meta.og_title
                 
                 logger.info(f"   ✅ 获取到标题: {article_title}")
             except Exception as e:
@@ -480,6 +370,133 @@ def fetch_article_with_cache():
     except Exception as e:
         logger.error(f"❌ 处理请求时出错: {e}", exc_info=True)
         return jsonify({'success': False, 'error': str(e)}), 500
+def _fetch_article_detail(article, biz, params, account_name):
+    """
+    获取单篇文章详情：转换短链接 → 下载完整HTML并提取统计数据 → 获取并注入留言 → 组装入库数据
+    
+    在 article_pipeline 的线程池中运行，多篇文章并发处理
+    
+    Returns
+    -------
+    dict
+        save_articles_bulk 使用的文章数据
+    """
+    article_url_item = article.get('url', '')
+    article_title = article.get('title', '')
+    
+    # 转换短链接（如果需要）
+    final_url = article_url_item
+    if '//mp.weixin.qq.com/s?' not in article_url_item and '//mp.weixin.qq.com/s/' in article_url_item:
+        try:
+            resp = http_client.get(article_url_item, headers={'User-Agent': 'Mozilla/5.0'}, allow_redirects=False, timeout=10)
+            if resp.status_code in [301, 302]:
+                loc = resp.headers.get('Location')
+                if loc:
+                    final_url = loc
+            else:
+                # 尝试从HTML中提取
+                resp = http_client.get(article_url_item, headers={'User-Agent': 'Mozilla/5.0'}, timeout=10)
+                msg_link = extract_page_metadata(resp.text).msg_link
+                if msg_link:
+                    final_url = msg_link
+        except:
+            pass
+    
+    # 解码HTML实体 (&amp; -> &) - 必须在获取统计数据之前！
+    import html
+    final_url = html.unescape(final_url) if final_url else final_url
+    article_url_item = html.unescape(article_url_item) if article_url_item else article_url_item
+    
+    # ✅ 使用download_full_html_with_stats下载HTML并提取统计数据
+    logger.info(f"      📊 正在下载完整HTML并提取统计数据...")
+    logger.info(f"         URL: {final_url[:100]}...")
+    
+    # 下载、提取统计数据、获取并注入留言都在内存中完成，文件只写一次，
+    # 写入文件的内容（html_content / content_hash）直接交给数据库层
+    download_result = download_full_html_with_stats(
+        final_url,
+        article_title,
+        article.get('publish_date'),
+        account_name=account_name,
+        output_dir="articles_html",
+        comment_credentials={
+            'uin': params.get('uin', ''),
+            'key': params.get('key', ''),
+            'pass_ticket': params.get('pass_ticket', ''),
+            'appmsg_token': params.get('appmsg_token', ''),
+            'cookie': params.get('cookie', '')
+        }
+    )
+    
+    html_file_path = download_result.get('filepath', '')
+    stats = download_result.get('stats', {})
+    
+    # 详细记录统计数据响应
+    if stats:
+        logger.info(f"      📊 从HTML提取的统计数据:")
+        logger.info(f"         read_num: {stats.get('read_num')}")
+        logger.info(f"         old_like_count: {stats.get('old_like_count')}")
+        logger.info(f"         like_count: {stats.get('like_count')}")
+        logger.info(f"         share_count: {stats.get('share_count')}")
+        logger.info(f"         comment_count: {stats.get('comment_count')}")
+    else:
+        logger.warning(f"      ⚠️  未能从HTML提取统计数据")
+    
+    # 本次下载的内容直接使用；文件之前已存在时才读取文件
+    html_content = download_result.get('html_content')
+    content_hash = download_result.get('content_hash')
+    if html_content is None and download_result.get('exists'):
+        doc = ArticleDocument(final_url, article_title, article.get('publish_date'),
+                              account_name=account_name, output_dir="articles_html")
+        try:
+            html_content = doc.load()
+            content_hash = doc.content_hash
+        except Exception as e:
+            logger.warning(f"      ⚠️  读取HTML文件失败: {e}")
+    if html_content:
+        logger.info(f"      ✅ HTML已下载 ({len(html_content)} 字节)")
+    else:
+        logger.warning(f"      ⚠️  HTML下载失败")
+    
+    # 从HTML提取标题（如果需要）
+    page_meta = download_result.get('metadata')
+    if html_content and not article_title:
+        if page_meta is None:
+            page_meta = extract_page_metadata(html_content)
+        if page_meta.og_title:
+            article_title = page_meta.og_title
+    
+    # 清理统计数据：将空值转换为None
+    def clean_stat(value):
+        if value is None or value == '' or value == 'N/A':
+            return None
+        try:
+            return int(value)
+        except (ValueError, TypeError):
+            return None
+    
+    article_data = {
+        'biz': biz,
+        'url': final_url,
+        'short_url': article_url_item if article_url_item != final_url else None,
+        'title': article_title,
+        'html_content': html_content,
+        'content_hash': content_hash,
+        'publish_date': article.get('publish_date'),
+        'read_count': clean_stat(stats.get('read_num')),
+        'old_like_count': clean_stat(stats.get('old_like_count')),
+        'like_count': clean_stat(stats.get('like_count')),
+        'share_count': clean_stat(stats.get('share_count')),
+        'comment_count': clean_stat(stats.get('comment_count')),
+        'local_html_path': html_file_path
+    }
+    
+    logger.info(f"      准备保存:")
+    logger.info(f"        标题: {article_title}")
+    logger.info(f"        URL: {final_url}")  # 完整URL
+    logger.info(f"        短URL: {article_url_item if article_url_item else 'None'}")  # 完整短URL
+    
+    return article_data
 def fetch_articles_filtered():
     """
     批量获取文章（带过滤）
@@ -491,8 +508,17 @@ def fetch_articles_filtered():
         "start_date": "2024-12-01",
         "end_date": "2024-12-10",
         "min_read_count": 10000,
-        "limit": 10  // 可选，限制数量
+        "limit": 10,  // 可选，每页数量（1 ~ 100，默认20）
+        "cursor": "...",  // 可选，上一页返回的 next_cursor
+        "fields": ["title", "url", "read_count"],  // 可选，只返回这些字段
+        "coverage_max_age_hours": 24,  // 可选，已列出区间的有效期，过期后重新列出
+        "concurrency": 3,  // 可选，同时获取详情的文章数（1 ~ CREDENTIAL_CONCURRENCY，超过时按上限）
+        "mode": "incremental"  // 可选，incremental（默认）/ backfill（回填历史，中断后下次请求从游标继续）
     }
+    
+    响应中的 next_cursor 不为空时，带上它再次请求即可获取下一页
+    
+    列表每列完一页都会保存游标（listing_cursors 表），参数失效重新捕获后的重试从游标继续，不再从第一页重新列出
     """
     try:
         # 解析请求
@@ -505,11 +531,40 @@ def fetch_articles_filtered():
         start_date_str = data.get('start_date')
         end_date_str = data.get('end_date')
         min_read_count = data.get('min_read_count')
-        limit = data.get('limit', 20)  # 默认限制20篇
+        limit = data.get('limit')
+        coverage_max_age_hours = data.get('coverage_max_age_hours', COVERAGE_MAX_AGE_HOURS)
+        cursor = data.get('cursor')
+        fields = data.get('fields')
+        mode = data.get('mode', MODE_INCREMENTAL)
         
         if not article_url:
             return jsonify({'success': False, 'error': '缺少必需参数: article_url'}), 400
         
+        if fields:
+            unknown_fields = [field for field in fields if field not in ARTICLE_LIST_FIELDS]
+            if unknown_fields:
+                return jsonify({'success': False, 'error': f"不支持的字段: {', '.join(unknown_fields)}"}), 400
+        
+        if mode not in LISTING_MODES:
+            return jsonify({'success': False, 'error': f"不支持的列表模式: {mode}"}), 400
+        
+        try:
+            concurrency = parse_concurrency(data.get('concurrency'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        if limit is None:
+            limit = DEFAULT_PAGE_LIMIT
+        elif isinstance(limit, bool) or not isinstance(limit, int) or not 1 <= limit <= MAX_PAGE_LIMIT:
+            return jsonify({'success': False, 'error': f"limit 必须是 1 ~ {MAX_PAGE_LIMIT} 的整数: {limit!r}"}), 400
+        
+        if cursor:
+            # 游标格式错误直接返回，不做任何网络请求
+            try:
+                decode_article_cursor(cursor)
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+        
         logger.info(f"📥 收到批量请求: 公众号={account_name}")
         
         # 1. 优先从URL提取BIZ（URL中的BIZ是最准确的）
@@ -548,41 +603,17 @@ def fetch_articles_filtered():
         start_date = datetime.strptime(start_date_str, '%Y-%m-%d') if start_date_str else None
         end_date = datetime.strptime(end_date_str, '%Y-%m-%d') if end_date_str else None
         
-        # 4. 检查数据库中该日期范围内每一天是否都有数据
-        from database import get_db_session
-        from models import Article
-        
-        missing_dates = []
+        # 4. 检查该日期范围是否已被（新鲜的）列表覆盖
+        # 没有指定完整日期范围时直接使用数据库数据
+        uncovered_ranges = []
         if start_date and end_date:
-            with get_db_session() as session:
-                # 获取该BIZ在日期范围内所有文章的发布日期
-                existing_articles = session.query(Article.publish_date).filter(
-                    Article.biz == biz,
-                    Article.publish_date >= start_date.strftime('%Y-%m-%d'),
-                    Article.publish_date <= end_date.strftime('%Y-%m-%d')
-                ).all()
-                
-                existing_dates = set()
-                for row in existing_articles:
-                    if row.publish_date:
-                        # publish_date可能是字符串或datetime
-                        if isinstance(row.publish_date, str):
-                            existing_dates.add(row.publish_date)
-                        else:
-                            existing_dates.add(row.publish_date.strftime('%Y-%m-%d'))
-                
-                # 检查每一天是否都有数据
-                current_date = start_date
-                while current_date <= end_date:
-                    date_str = current_date.strftime('%Y-%m-%d')
-                    if date_str not in existing_dates:
-                        missing_dates.append(date_str)
-                    current_date += timedelta(days=1)
-        
-        if not missing_dates:
-            # 所有日期都有数据，直接从数据库返回
+            uncovered_ranges = get_uncovered_ranges(biz, start_date, end_date, coverage_max_age_hours)
+        
+        if not uncovered_ranges:
+            # 整个范围都已列出过，直接从数据库返回（没有文章的日期也不会再触发API请求）
             logger.info(f"📊 数据库中已有完整数据（{start_date_str} ~ {end_date_str}），直接返回")
-            db_articles = get_articles_by_filters(biz, start_date, end_date, min_read_count)
+            page = get_articles_page(biz, start_date, end_date, min_read_count,
+                                     limit=limit, cursor=cursor, fields=fields)
             return jsonify({
                 'success': True,
                 'data': {
@@ -590,46 +621,68 @@ def fetch_articles_filtered():
                     'biz': biz,
                     'from_cache': True,
                     'total_saved': 0,
-                    'total': len(db_articles[:limit]),
-                    'articles': db_articles[:limit]
+                    'total': len(page['articles']),
+                    'articles': page['articles'],
+                    'next_cursor': page['next_cursor']
                 }
             })
         
-        # 5. 有缺失日期，需要从API获取
-        logger.info(f"📡 数据库缺失以下日期的数据: {', '.join(missing_dates)}")
+        # 5. 有未覆盖的区间，需要从API获取
+        logger.info(f"📡 以下日期区间尚未列出或已过期: "
+                    f"{', '.join(f'{gap_start} ~ {gap_end}' for gap_start, gap_end in uncovered_ranges)}")
         logger.info(f"   开始从微信API获取缺失数据...")
         
-        # 获取现有文章指纹（用于增量更新判断）
-        existing_titles = set()
+        # 只需要列出缺口所在的范围
+        fetch_start_date = datetime.combine(uncovered_ranges[0][0], datetime.min.time())
+        fetch_end_date = datetime.combine(uncovered_ranges[-1][1], datetime.min.time())
         
-        with get_db_session() as session:
-            existing = session.query(Article.title).filter(Article.biz == biz).all()
-            for row in existing:
-                if row.title:
-                    existing_titles.add(row.title)
+        # 增量判断：按 (mid, idx) 逐页查询是否已入库，缺口区间内不提前停止
+        incremental_sync = IncrementalSync(biz, uncovered_ranges)
         
-        logger.info(f"📚 数据库中已有 {len(existing_titles)} 篇文章（全部历史）")
-        
-        # 定义停止抓取的回调函数
-        def should_stop_fetch(article):
-            # 如果标题已存在，说明接上历史数据了
-            title = article.get('title', '')
-            if title and title in existing_titles:
-                return True
-            return False
-        # 5. 从微信API获取（增量模式）
-        logger.info(f"📡 从微信API获取文章（增量模式）...")
+        # 5. 从微信API获取（增量模式 / 回填模式）
+        logger.info(f"📡 从微信API获取文章（{'回填模式' if mode == MODE_BACKFILL else '增量模式'}）...")
+        # 同一次请求的重试共用一个 run_id，从列表游标继续
+        run_id = uuid.uuid4().hex
         
         try:
-            articles_info = ArticlesInfo(
-                appmsg_token=params['appmsg_token'],
-                cookie=params['cookie']
-            )
+            save_counts = new_save_counts()
+            pending_articles = []
+            
+            def flush_pending_articles():
+                try:
+                    save_articles_with_fallback(pending_articles, save_counts)
+                finally:
+                    pending_articles.clear()
             
-            # 获取文章列表（使用数据库参数，传入回调）
-            articles = fetch_articles_with_params(biz, params, start_date, end_date, should_stop_func=should_stop_fetch)
+            def on_result(index, article_data):
+                # 攒够一页后批量写入（一次事务、一次往返）
+                if article_data:
+                    pending_articles.append(article_data)
+                    if len(pending_articles) >= BULK_SAVE_SIZE:
+                        flush_pending_articles()
+            
+            def list_and_fetch(params):
+                """边列出边获取详情：每列出一页，其中的新文章立即进入流水线（队列满时暂停列出）"""
+                # ✅ 关键：将数据库参数写入new_wechat_config.py，供download_full_html使用
+                _write_params_to_config(params)
+                listing = ProfileListing(biz, _listing_credentials(params), fetch_start_date, fetch_end_date,
+                                         incremental_sync=incremental_sync, mode=mode, run_id=run_id,
+                                         persist_cursor=True)
+                stream_article_pipeline(
+                    listing,
+                    [lambda article: _fetch_article_detail(article, biz, params, account_name)],
+                    credential=params.get('uin', ''),
+                    concurrency=concurrency,
+                    on_result=on_result
+                )
+                flush_pending_articles()
+                return listing
+            
+            # 获取文章列表并同时获取详情（使用数据库参数）
+            listing = list_and_fetch(params)
+            new_articles_count = listing.count
             # 检查是否需要重新捕获
-            if isinstance(articles, dict) and articles.get('error') == 'no_session':
+            if listing.error == 'no_session':
                 logger.warning(f"⚠️  参数已失效，开始重新捕获...")
                 
                 # 标记参数失效
@@ -643,10 +696,11 @@ def fetch_articles_filtered():
                     # 重新获取参数
                     params = get_valid_parameters(biz)
                     if params:
-                        # 重试获取文章列表
-                        articles = fetch_articles_with_params(biz, params, start_date, end_date, should_stop_func=should_stop_fetch)
+                        # 重试：从列表游标继续（回退的几页中已保存的文章会被增量判断跳过）
+                        listing = list_and_fetch(params)
+                        new_articles_count += listing.count
                         
-                        if isinstance(articles, dict) and articles.get('error'):
+                        if listing.error == 'no_session':
                             return jsonify({
                                 'success': False,
                                 'error': '重新捕获后仍然无法获取文章列表'
@@ -662,222 +716,6 @@ def fetch_articles_filtered():
                         'error': '参数捕获失败，请确保微信已正常运行',
                         'need_recapture': True
                     }), 500
-                    
-                # 重新创建 ArticlesInfo
-                articles_info = ArticlesInfo(
-                    appmsg_token=params['appmsg_token'],
-                    cookie=params['cookie']
-                )
-            
-            # 如果有新文章，获取详情并保存
-            new_articles_count = 0
-            if articles and not (isinstance(articles, dict) and articles.get('error')):
-                logger.info(f"   发现 {len(articles)} 篇新文章，开始获取详情...")
-                new_articles_count = len(articles)
-                
-                # ✅ 关键：将数据库参数写入new_wechat_config.py，供download_full_html使用
-                _write_params_to_config(params)
-                
-                # 批量获取统计数据并保存
-                import requests as req
-                
-                for i, article in enumerate(articles, 1):
-                    try:
-                        article_url_item = article.get('url', '')
-                        article_title = article.get('title', '')
-                        
-                        logger.info(f"   [{i}/{len(articles)}] 处理: {article_title[:30]}...")
-                        
-                        # 转换短链接（如果需要）
-                        final_url = article_url_item
-                        if '//mp.weixin.qq.com/s?' not in article_url_item and '//mp.weixin.qq.com/s/' in article_url_item:
-                            try:
-                                resp = req.get(article_url_item, headers={'User-Agent': 'Mozilla/5.0'}, allow_redirects=False, timeout=10)
-                                if resp.status_code in [301, 302]:
-                                    loc = resp.headers.get('Location')
-                                    if loc:
-                                        final_url = loc
-                                else:
-                                    # 尝试从HTML中提取
-                                    resp = req.get(article_url_item, headers={'User-Agent': 'Mozilla/5.0'}, timeout=10)
-                                    content = resp.text
-                                    urls = re.findall(r'var\s+msg_link\s*=\s*"([^"]+)"', content)
-                                    if urls:
-                                        final_url = urls[0].replace('\\/', '/')
-                            except:
-                                pass
-                        
-                        # 解码HTML实体 (&amp; -> &) - 必须在获取统计数据之前！
-                        import html
-                        final_url = html.unescape(final_url) if final_url else final_url
-                        article_url_item = html.unescape(article_url_item) if article_url_item else article_url_item
-                        
-                        # ✅ 使用download_full_html_with_stats下载HTML并提取统计数据
-                        logger.info(f"      📊 正在下载完整HTML并提取统计数据...")
-                        logger.info(f"         URL: {final_url[:100]}...")
-                        
-                        download_result = download_full_html_with_stats(
-                            final_url,
-                            article_title,
-                            article.get('publish_date'),
-                            account_name=account_name,
-                            output_dir="articles_html"
-                        )
-                        
-                        html_file_path = download_result.get('filepath', '')
-                        stats = download_result.get('stats', {})
-                        
-                        # 详细记录统计数据响应
-                        if stats:
-                            logger.info(f"      📊 从HTML提取的统计数据:")
-                            logger.info(f"         read_num: {stats.get('read_num')}")
-                            logger.info(f"         old_like_count: {stats.get('old_like_count')}")
-                            logger.info(f"         like_count: {stats.get('like_count')}")
-                            logger.info(f"         share_count: {stats.get('share_count')}")
-                            logger.info(f"         comment_count: {stats.get('comment_count')}")
-                        else:
-                            logger.warning(f"      ⚠️  未能从HTML提取统计数据")
-                        
-                        # ✅ 获取留言并注入到HTML
-                        if html_file_path and os.path.exists(html_file_path):
-                            try:
-                                logger.info(f"      💬 正在获取留言...")
-                                from get_comments_improved import get_comment_id_from_html
-                                from inject_comments_dom import inject_comments_direct_render
-                                import urllib.parse
-                                
-                                # 1. 从已下载的HTML中提取comment_id
-                                with open(html_file_path, 'r', encoding='utf-8') as f:
-                                    downloaded_html = f.read()
-                                
-                                comment_id = get_comment_id_from_html(downloaded_html)
-                                
-                                if comment_id:
-                                    # 2. 提取URL参数
-                                    parsed = urllib.parse.urlparse(final_url)
-                                    url_params = urllib.parse.parse_qs(parsed.query)
-                                    __biz = url_params.get('__biz', [''])[0]
-                                    idx = url_params.get('idx', ['1'])[0]
-                                    
-                                    # 3. 构建留言API请求
-                                    comment_api_params = {
-                                        'action': 'getcomment',
-                                        '__biz': __biz,
-                                        'idx': idx,
-                                        'comment_id': comment_id,
-                                        'limit': '100',
-                                        'uin': params.get('uin', ''),
-                                        'key': params.get('key', ''),
-                                        'pass_ticket': params.get('pass_ticket', ''),
-                                        'appmsg_token': params.get('appmsg_token', '')
-                                    }
-                                    
-                                    comment_url = "https://mp.weixin.qq.com/mp/appmsg_comment?" + urllib.parse.urlencode(comment_api_params)
-                                    
-                                    headers = {
-                                        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-                                        'Cookie': params.get('cookie', '')
-                                    }
-                                    
-                                    proxies = {"http": None, "https": None}
-                                    comment_response = requests.get(comment_url, headers=headers, proxies=proxies, timeout=15)
-                                    
-                                    if comment_response.status_code == 200 and comment_response.text.strip():
-                                        try:
-                                            comments_data = comment_response.json()
-                                            if comments_data and comments_data.get('elected_comment'):
-                                                inject_comments_direct_render(html_file_path, comments_data)
-                                            else:
-                                                logger.info(f"      ℹ️  该文章没有精选留言")
-                                        except:
-                                            logger.info(f"      ℹ️  留言API返回非JSON格式")
-                                    else:
-                                        logger.info(f"      ℹ️  留言API请求失败")
-                                else:
-                                    logger.info(f"      ℹ️  该文章未开启留言功能")
-                            except Exception as e:
-                                logger.warning(f"      ⚠️  留言获取/注入失败: {e}")
-                        
-                        # 读取本地HTML文件（包含已注入的留言）
-                        html_content = None
-                        if html_file_path and os.path.exists(html_file_path):
-                            try:
-                                with open(html_file_path, 'r', encoding='utf-8') as f:
-                                    html_content = f.read()
-                                logger.info(f"      ✅ HTML已下载 ({len(html_content)} 字节)")
-                            except Exception as e:
-                                logger.warning(f"      ⚠️  读取HTML文件失败: {e}")
-                        else:
-                            logger.warning(f"      ⚠️  HTML下载失败")
-                        
-                        # 从HTML提取标题（如果需要）
-                        if html_content and not article_title:
-                            import re
-                            title_match = re.search(r'<meta\s+property="og:title"\s+content="([^"]+)"', html_content)
-                            if title_match:
-                                article_title = title_match.group(1).strip()
-                        
-                        # 清理统计数据：将空值转换为None
-                        def clean_stat(value):
-                            if value is None or value == '' or value == 'N/A':
-                                return None
-                            try:
-                                return int(value)
-                            except (ValueError, TypeError):
-                                return None
-                        
-                        article_data = {
-                            'biz': biz,
-                            'url': final_url,
-                            'short_url': article_url_item if article_url_item != final_url else None,
-                            'title': article_title,
-                            'html_content': html_content,
-                            'publish_date': article.get('publish_date'),
-                            'read_count': clean_stat(stats.get('read_num')),
-                            'old_like_count': clean_stat(stats.get('old_like_count')),
-                            'like_count': clean_stat(stats.get('like_count')),
-                            'share_count': clean_stat(stats.get('share_count')),
-                            'comment_count': clean_stat(stats.get('comment_count')),
-                            'local_html_path': html_file_path
-                        }
-                        
-                        # 直接插入新文章（前面的增量逻辑已经保证了只获取新文章）
-                        logger.info(f"      准备保存:")
-                        logger.info(f"        标题: {article_title}")
-                        logger.info(f"        URL: {final_url}")  # 完整URL
-                        logger.info(f"        短URL: {article_url_item if article_url_item else 'None'}")  # 完整短URL
-                        
-                        from database import get_db_session
-                        from models import Article as ArticleModel
-                        
-                        with get_db_session() as db_session:
-                            new_article = ArticleModel(
-                                biz=article_data['biz'],
-                                url=article_data['url'],
-                                short_url=article_data.get('short_url'),
-                                title=article_data.get('title'),
-                                html_content=article_data.get('html_content'),
-                                publish_date=article_data.get('publish_date'),
-                                read_count=article_data.get('read_count'),
-                                old_like_count=article_data.get('old_like_count'),
-                                like_count=article_data.get('like_count'),
-                                share_count=article_data.get('share_count'),
-                                comment_count=article_data.get('comment_count'),
-                                local_html_path=article_data.get('local_html_path')
-                            )
-                            db_session.add(new_article)
-                            db_session.flush()
-                            logger.info(f"      ✅ 保存成功 (ID: {new_article.id})")
-
-
-
-                        
-                        # 避免请求过快（参考smart_batch_auto.py）
-                        time.sleep(2)
-                        
-                    except Exception as e:
-                        logger.warning(f"   ⚠️  处理文章失败: {e}")
-                        continue
             
             if new_articles_count > 0:
                 logger.info(f"✅ 成功获取并保存 {new_articles_count} 篇新文章")
@@ -886,10 +724,9 @@ def fetch_articles_filtered():
             
             # 6. 从数据库查询最终结果（按过滤条件）
             # 注意：这里重新查询以获取包括旧文章在内的所有符合条件的文章
-            final_articles = get_articles_by_filters(biz, start_date, end_date, min_read_count)
-            
-            # 手动截取 limit（因为 get_articles_by_filters 没有 limit 参数）
-            final_articles = final_articles[:limit]
+            page = get_articles_page(biz, start_date, end_date, min_read_count,
+                                     limit=limit, cursor=cursor, fields=fields)
+            final_articles = page['articles']
             
             return jsonify({
                 'success': True,
@@ -898,8 +735,10 @@ def fetch_articles_filtered():
                     'biz': biz,
                     'from_cache': new_articles_count == 0, # 如果没有新文章，说明完全来自缓存
                     'total_saved': new_articles_count, # 本次新保存的数量
+                    'save_stats': save_counts,  # 写入结果：新增/更新/未变化（批量失败时逐篇保存/失败）
                     'total': len(final_articles),     # 返回给前端的总数
-                    'articles': final_articles
+                    'articles': final_articles,
+                    'next_cursor': page['next_cursor']  # 下一页游标，为空表示没有更多
                 }
             })
             
@@ -914,4 +753,62 @@ def fetch_articles_filtered():
     
     except Exception as e:
         logger.error(f"❌ 处理请求时出错: {e}", exc_info=True)
-        return jsonify({'success': False, 'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+def get_stats_curve():
+    """
+    获取统计数据曲线（阅读量、点赞数等随时间的变化）
+    
+    请求体（article_url 和 biz 二选一）：
+    {
+        "article_url": "文章URL",  // 返回单篇文章的每个快照
+        "biz": "公众号BIZ",  // 返回公众号所有文章的合计曲线
+        "bucket": "day",  // 可选，公众号曲线的时间粒度：hour / day / week
+        "start": "2024-12-01T00:00:00",  // 可选
+        "end": "2024-12-31T23:59:59"  // 可选
+    }
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'success': False, 'error': '请求体不能为空'}), 400
+        
+        article_url = data.get('article_url')
+        biz = data.get('biz')
+        bucket = data.get('bucket', 'day')
+        if not article_url and not biz:
+            return jsonify({'success': False, 'error': '缺少必需参数: article_url 或 biz'}), 400
+        if bucket not in STAT_CURVE_BUCKETS:
+            return jsonify({'success': False, 'error': f"不支持的时间粒度: {bucket}"}), 400
+        try:
+            start = datetime.fromisoformat(data['start']) if data.get('start') else None
+            end = datetime.fromisoformat(data['end']) if data.get('end') else None
+        except ValueError:
+            return jsonify({'success': False, 'error': '时间格式错误，应为ISO格式'}), 400
+        
+        if article_url:
+            article, _ = get_cached_article_with_freshness(article_url)
+            if not article:
+                return jsonify({'success': False, 'error': '数据库中没有这篇文章'}), 404
+            return jsonify({
+                'success': True,
+                'data': {
+                    'article_id': article['id'],
+                    'title': article['title'],
+                    'points': get_article_stat_curve(article['id'], start, end)
+                }
+            })
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'biz': biz,
+                'bucket': bucket,
+                'points': get_account_stat_curve(biz, start, end, bucket)
+            }
+        })
+    
+    except Exception as e:
+        logger.error(f"❌ 处理请求时出错: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': str(e)}), 500
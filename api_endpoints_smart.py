@@ -12,12 +12,11 @@
 """
 
 from flask import request, jsonify
-from datetime import datetime, timedelta
+from datetime import datetime
 import logging
 import os
 import sys
 import re
-import json
 import time
 import importlib.util
 
@@ -29,15 +28,24 @@ from smart_batch_fetch import (
     save_to_json
 )
 from download_full_html import download_full_html_with_stats
+import http_client
 from extract_stats_from_html import extract_stats_from_html
 from wechatarticles import ArticlesInfo
+from incremental_sync import IncrementalSync
+from article_pipeline import parse_concurrency, stream_article_pipeline
+from profile_listing import ProfileListing
 from db_operations import (
     get_or_create_account,
-    save_article
+    new_save_counts,
+    save_articles_with_fallback,
+    get_uncovered_ranges
 )
 
 logger = logging.getLogger(__name__)
 
+# 攒够多少篇文章批量写入一次数据库
+BULK_SAVE_SIZE = 10
+
 
 def _write_params_to_config(biz_params):
     """
@@ -103,7 +111,6 @@ def check_params_validity(biz, biz_params):
             return False
         
         # 测试API调用
-        import requests
         test_url = (
             f"https://mp.weixin.qq.com/mp/profile_ext?"
             f"action=getmsg&"
@@ -127,7 +134,7 @@ def check_params_validity(biz, biz_params):
             'Referer': f'https://mp.weixin.qq.com/mp/profile_ext?action=home&__biz={biz}&scene=124',
         }
         
-        response = requests.get(test_url, headers=headers, timeout=10)
+        response = http_client.get(test_url, headers=headers, timeout=10)
         data = response.json()
         
         ret = data.get('ret')
@@ -188,10 +195,35 @@ def load_biz_params_from_file(biz):
         return None
 
 
-def fetch_articles_from_api(biz, biz_params, start_date=None, end_date=None):
+def _profile_listing(biz, biz_params, start_date=None, end_date=None, incremental_sync=None):
+    """
+    用BIZ专属参数创建文章列表迭代器（profile_listing.ProfileListing）
+    
+    Returns
+    -------
+    ProfileListing or None
+        Cookie 中没有 appmsg_token 时返回 None
+    """
+    appmsg_token = extract_appmsg_token_from_cookie(biz_params['COOKIE'])
+    if not appmsg_token:
+        logger.error("❌ 无法从Cookie提取appmsg_token")
+        return None
+    credentials = {
+        'uin': biz_params['UIN'],
+        'key': biz_params['KEY'],
+        'pass_ticket': biz_params['PASS_TICKET'],
+        'appmsg_token': appmsg_token,
+        'cookie': biz_params['COOKIE']
+    }
+    return ProfileListing(biz, credentials, start_date, end_date, incremental_sync=incremental_sync)
+
+
+def fetch_articles_from_api(biz, biz_params, start_date=None, end_date=None, incremental_sync=None):
     """
     从微信API获取文章列表（完全模拟smart_batch_auto.py）
     
+    一次列完再返回；需要边列出边处理时使用 _profile_listing
+    
     Parameters
     ----------
     biz : str
@@ -202,138 +234,95 @@ def fetch_articles_from_api(biz, biz_params, start_date=None, end_date=None):
         开始日期
     end_date : datetime, optional
         结束日期
+    incremental_sync : IncrementalSync, optional
+        增量同步状态：已入库的文章跳过，在缺口区间外遇到已入库的主文章时停止
     
     Returns
     -------
     list or dict
         文章列表，或错误信息字典
+    
+    正常列完（到达开始日期或列完全部历史）后，会把列过的日期区间记录到 fetch_coverage 表
     """
     logger.info(f"📡 从微信API获取文章列表...")
-    
-    # 提取appmsg_token
-    appmsg_token = extract_appmsg_token_from_cookie(biz_params['COOKIE'])
-    if not appmsg_token:
-        logger.error("❌ 无法从Cookie提取appmsg_token")
+    listing = _profile_listing(biz, biz_params, start_date, end_date, incremental_sync)
+    if listing is None:
         return {'error': 'invalid_params', 'message': '无法提取appmsg_token'}
+    all_articles = list(listing)
+    if listing.error == 'no_session':
+        return {'error': 'no_session', 'message': listing.message}
+    return all_articles
+
+
+def _safe_int(val):
+    """转换统计数据格式（空值或无法解析时为0）"""
+    try:
+        return int(val) if val else 0
+    except:
+        return 0
+
+
+def _download_article_with_stats(article, account_name):
+    """
+    下载单篇文章的完整HTML并提取统计数据（在 article_pipeline 的线程池中运行）
     
-    # 构造请求头
-    import requests
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36 MicroMessenger/3.4.0',
-        'Cookie': biz_params['COOKIE'],
-        'Referer': f'https://mp.weixin.qq.com/mp/profile_ext?action=home&__biz={biz}&scene=124',
-        'Accept': 'application/json, text/javascript, */*; q=0.01',
-        'X-Requested-With': 'XMLHttpRequest',
-    }
+    参数已经写入 params/new_wechat_config.py，download_full_html 会自动读取
     
-    all_articles = []
-    offset = 0
-    count = 10
-    has_more = True
+    Returns
+    -------
+    dict
+        文章字典合并统计数据后的结果
+    """
+    download_result = download_full_html_with_stats(
+        article.get('url', ''),
+        article.get('title', ''),
+        article.get('publish_date', ''),
+        account_name=account_name,
+        output_dir="articles_html"
+    )
     
-    while has_more:
-        api_url = (
-            f"https://mp.weixin.qq.com/mp/profile_ext?"
-            f"action=getmsg&"
-            f"__biz={biz}&"
-            f"f=json&"
-            f"offset={offset}&"
-            f"count={count}&"
-            f"is_ok=1&"
-            f"scene=124&"
-            f"uin={biz_params['UIN']}&"
-            f"key={biz_params['KEY']}&"
-            f"pass_ticket={biz_params['PASS_TICKET']}&"
-            f"wxtoken=&"
-            f"appmsg_token={appmsg_token}&"
-            f"x5=0"
-        )
-        
-        try:
-            logger.info(f"   获取第 {offset//count + 1} 页...")
-            
-            response = requests.get(api_url, headers=headers, timeout=10)
-            data = response.json()
-            
-            if data.get('ret') != 0:
-                errmsg = data.get('errmsg', 'Unknown')
-                if 'no session' in errmsg.lower():
-                    logger.error(f"❌ 参数已失效: {errmsg}")
-                    return {'error': 'no_session', 'message': '参数已失效，需要重新捕获'}
-                logger.warning(f"   ⚠️  API返回错误: {errmsg}")
-                break
-            
-            # 解析文章列表
-            general_msg_list = data.get('general_msg_list', {})
-            if isinstance(general_msg_list, str):
-                general_msg_list = json.loads(general_msg_list)
-            
-            msg_list = general_msg_list.get('list', [])
-            
-            if not msg_list:
-                logger.info(f"   ✅ 已获取所有文章")
-                break
-            
-            # 处理每条消息
-            for msg in msg_list:
-                comm_msg_info = msg.get('comm_msg_info', {})
-                app_msg_ext_info = msg.get('app_msg_ext_info', {})
-                
-                if not app_msg_ext_info:
-                    continue
-                
-                publish_time = comm_msg_info.get('datetime', 0)
-                article_date = datetime.fromtimestamp(publish_time)
-                
-                # 检查日期范围
-                if end_date and article_date > end_date + timedelta(days=1):
-                    continue
-                
-                if start_date and article_date < start_date:
-                    logger.info(f"   🛑 遇到早于开始日期的文章 ({article_date.date()})，停止获取")
-                    has_more = False
-                    break
-                
-                # 主文章
-                article_url = app_msg_ext_info.get('content_url', '').replace('\\/', '/')
-                article_title = app_msg_ext_info.get('title', '')
-                
-                if article_url:
-                    article = {
-                        'title': article_title,
-                        'url': article_url,
-                        'digest': app_msg_ext_info.get('digest', ''),
-                        'cover': app_msg_ext_info.get('cover', ''),
-                        'publish_time': publish_time,
-                        'publish_date': article_date.strftime('%Y-%m-%d'),
-                    }
-                    all_articles.append(article)
-                
-                # 多图文消息
-                multi_app_msg_item_list = app_msg_ext_info.get('multi_app_msg_item_list', [])
-                if multi_app_msg_item_list:
-                    logger.info(f"   📑 发现 {len(multi_app_msg_item_list)} 篇多图文")
-                    for item in multi_app_msg_item_list:
-                        sub_article = {
-                            'title': item.get('title', ''),
-                            'url': item.get('content_url', '').replace('\\/', '/'),
-                            'digest': item.get('digest', ''),
-                            'cover': item.get('cover', ''),
-                            'publish_time': publish_time,
-                            'publish_date': article_date.strftime('%Y-%m-%d'),
-                        }
-                        if sub_article['url']:
-                            all_articles.append(sub_article)
-            
-            offset += count
-            time.sleep(1 + (offset % 3))  # 随机延迟
-            
-        except Exception as e:
-            logger.error(f"   ❌ 获取失败: {e}")
-            break
+    html_file_path = download_result.get('filepath', '')
+    stats = download_result.get('stats', {})
     
-    logger.info(f"✅ 从API获取 {len(all_articles)} 篇文章")
-    return all_articles
+    if download_result.get('success') and stats:
+        read_num = stats.get('read_num', 0)
+        old_like_count = stats.get('old_like_count', 0)
+        share_count = stats.get('share_count', 0)
+        comment_count = stats.get('comment_count', 0)
+        logger.info(f"      ✅ 阅读: {read_num} | 点赞: {old_like_count} | 分享: {share_count} | 评论: {comment_count}")
+    else:
+        logger.warning(f"      ⚠️  下载或提取统计数据失败: {download_result.get('error', '')}")
+    
+    return {
+        **article,
+        'local_html_path': html_file_path,
+        'read_count': _safe_int(stats.get('read_num')),
+        'like_count': _safe_int(stats.get('like_count')),  # 喜欢/收藏（爱心）
+        'old_like_count': _safe_int(stats.get('old_like_count')),  # 点赞（大拇指）
+        'share_count': _safe_int(stats.get('share_count')),
+        'comment_count': _safe_int(stats.get('comment_count')),
+        'nickname': stats.get('nickname', ''),
+        'user_name': stats.get('user_name', ''),
+        'success': download_result.get('success', False),
+        'method': 'html_extraction'
+    }
+
+
+def _article_to_db(biz, result):
+    """流水线结果转换为 save_articles_bulk 的行"""
+    return {
+        'biz': biz,
+        'url': result.get('url'),
+        'title': result.get('title'),
+        'html_content': None,  # HTML已保存到本地文件
+        'publish_date': result.get('publish_date'),
+        'read_count': result.get('read_count', 0),
+        'like_count': result.get('like_count', 0),
+        'old_like_count': result.get('old_like_count', 0),
+        'share_count': result.get('share_count', 0),
+        'comment_count': result.get('comment_count', 0),
+        'local_html_path': result.get('local_html_path', '')
+    }
 
 
 def fetch_articles_smart():
@@ -345,7 +334,8 @@ def fetch_articles_smart():
         "account_name": "公众号名称",
         "article_url": "任意一篇文章URL",
         "start_date": "2024-12-01",
-        "end_date": "2024-12-10"
+        "end_date": "2024-12-10",
+        "concurrency": 3  // 可选，同时下载的文章数（1 ~ CREDENTIAL_CONCURRENCY，超过时按上限）
     }
     
     工作流程：
@@ -373,6 +363,11 @@ def fetch_articles_smart():
         if not article_url:
             return jsonify({'success': False, 'error': '缺少必需参数: article_url'}), 400
         
+        try:
+            concurrency = parse_concurrency(data.get('concurrency'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
         logger.info(f"📥 收到智能批量请求: 公众号={account_name}")
         
         # 1. 从URL提取BIZ
@@ -388,44 +383,16 @@ def fetch_articles_smart():
         start_date = datetime.strptime(start_date_str, '%Y-%m-%d') if start_date_str else None
         end_date = datetime.strptime(end_date_str, '%Y-%m-%d') if end_date_str else None
         
-        # 3. 智能增量：检查数据库已有哪些日期的文章
+        # 3. 智能增量：检查该日期范围是否已被（新鲜的）列表覆盖
         logger.info(f"🔍 检查数据库已有数据...")
-        from database import get_db_session
-        from models import Article
-        
-        existing_dates = set()
-        missing_dates = []
         
+        uncovered_ranges = []
         if start_date and end_date:
-            with get_db_session() as session:
-                # 获取该BIZ在日期范围内所有文章的发布日期
-                existing_articles = session.query(Article.publish_date).filter(
-                    Article.biz == biz,
-                    Article.publish_date >= start_date.strftime('%Y-%m-%d'),
-                    Article.publish_date <= end_date.strftime('%Y-%m-%d')
-                ).all()
-                
-                for row in existing_articles:
-                    if row.publish_date:
-                        if isinstance(row.publish_date, str):
-                            existing_dates.add(row.publish_date)
-                        else:
-                            existing_dates.add(row.publish_date.strftime('%Y-%m-%d'))
-                
-                # 检查每一天是否都有数据
-                current_date = start_date
-                while current_date <= end_date:
-                    date_str = current_date.strftime('%Y-%m-%d')
-                    if date_str not in existing_dates:
-                        missing_dates.append(date_str)
-                    current_date += timedelta(days=1)
-        
-        if existing_dates:
-            logger.info(f"   ✅ 数据库已有 {len(existing_dates)} 天的数据: {sorted(existing_dates)}")
-        
-        if not missing_dates:
-            # 所有日期都有数据，直接从数据库返回
-            logger.info(f"   ✅ 所有日期都有数据，直接从数据库返回")
+            uncovered_ranges = get_uncovered_ranges(biz, start_date, end_date)
+        
+        if not uncovered_ranges:
+            # 整个范围都已列出过，直接从数据库返回
+            logger.info(f"   ✅ 日期范围已完整列出，直接从数据库返回")
             
             from db_operations import get_articles_by_filters
             db_articles = get_articles_by_filters(biz, start_date, end_date, None)
@@ -442,8 +409,12 @@ def fetch_articles_smart():
                 }
             })
         
-        logger.info(f"   ⚠️  缺失 {len(missing_dates)} 天的数据: {missing_dates}")
+        logger.info(f"   ⚠️  以下日期区间尚未列出或已过期: "
+                    f"{', '.join(f'{gap_start} ~ {gap_end}' for gap_start, gap_end in uncovered_ranges)}")
         logger.info(f"   📡 需要从微信API获取缺失数据...")
+        fetch_start_date = datetime.combine(uncovered_ranges[0][0], datetime.min.time())
+        fetch_end_date = datetime.combine(uncovered_ranges[-1][1], datetime.min.time())
+        incremental_sync = IncrementalSync(biz, uncovered_ranges)
         
         # 4. 加载本地BIZ专属参数
         logger.info(f"📂 加载本地BIZ专属参数...")
@@ -492,48 +463,111 @@ def fetch_articles_smart():
         
         logger.info(f"✅ 参数有效，开始获取文章")
         
-        # 7. 从微信API获取文章列表（只获取缺失日期的）
-        articles = fetch_articles_from_api(biz, biz_params, start_date, end_date)
+        # 7. 从微信API列出文章（只列出未覆盖的区间），同时下载HTML并提取统计数据（使用参数化请求）
+        # 按 url 去重（参数失效重试时可能再次列出同一篇），保留第一次成功的结果；
+        # 值为 ((第几次列出, 列出顺序), 结果)
+        finished = {}
+        passes = []
+        save_counts = new_save_counts()
+        pending_articles = []
+        
+        def flush_pending_articles():
+            try:
+                save_articles_with_fallback(pending_articles, save_counts)
+            finally:
+                pending_articles.clear()
+        
+        def on_result(index, result):
+            url = result.get('url')
+            previous = finished.get(url)
+            if previous and previous[1].get('success'):
+                return
+            finished[url] = ((len(passes), index), result)
+            # 成功的文章攒够一批立即入库，重试时增量判断会跳过它们；
+            # 失败的文章留到最后，重试成功则覆盖
+            if url and result.get('success'):
+                pending_articles.append(_article_to_db(biz, result))
+                if len(pending_articles) >= BULK_SAVE_SIZE:
+                    flush_pending_articles()
+        
+        def list_and_download(biz_params):
+            """边列出边下载：每列出一页，其中的新文章立即进入流水线（队列满时暂停列出）"""
+            listing = _profile_listing(biz, biz_params, fetch_start_date, fetch_end_date, incremental_sync)
+            if listing is None:
+                return None
+            passes.append(listing)
+            logger.info(f"📊 开始列出文章并下载HTML、提取统计数据...")
+            # ✅ 关键：将BIZ参数写入new_wechat_config.py，供download_full_html使用
+            _write_params_to_config(biz_params)
+            stream_article_pipeline(
+                listing,
+                [lambda article: _download_article_with_stats(article, account_name)],
+                credential=biz_params.get('UIN', ''),
+                concurrency=concurrency,
+                on_result=on_result,
+                on_error=lambda article, e: {
+                    **article,
+                    'read_count': 0,
+                    'like_count': 0,
+                    'old_like_count': 0,
+                    'share_count': 0,
+                    'comment_count': 0,
+                    'success': False,
+                    'error': str(e)
+                }
+            )
+            flush_pending_articles()
+            return listing
+        
+        listing = list_and_download(biz_params)
+        if listing is None:
+            return jsonify({'success': False, 'error': '无法提取appmsg_token'}), 500
         
-        if isinstance(articles, dict) and articles.get('error'):
+        if listing.error == 'no_session':
             # 如果是参数失效错误，再次尝试重新捕获
-            if articles.get('error') == 'no_session':
-                logger.warning(f"⚠️  获取文章时检测到参数失效，重新捕获...")
-                
-                # 自动打开微信中的文章
-                from wechat_automation import auto_open_article_in_wechat
-                auto_open_article_in_wechat(article_url)
-                
-                from api_server import ProxyManager
-                if ProxyManager.start_proxy_and_capture(article_url, biz=biz, timeout=120):
-                    time.sleep(2)
-                    biz_params = load_biz_params_from_file(biz)
-                    if biz_params:
-                        # 重试获取文章
-                        articles = fetch_articles_from_api(biz, biz_params, start_date, end_date)
-                        if isinstance(articles, dict) and articles.get('error'):
-                            return jsonify({
-                                'success': False,
-                                'error': articles.get('message', '获取文章列表失败'),
-                                'need_recapture': True
-                            }), 500
-                    else:
+            logger.warning(f"⚠️  获取文章时检测到参数失效，重新捕获...")
+            
+            # 自动打开微信中的文章
+            from wechat_automation import auto_open_article_in_wechat
+            auto_open_article_in_wechat(article_url)
+            
+            from api_server import ProxyManager
+            if ProxyManager.start_proxy_and_capture(article_url, biz=biz, timeout=120):
+                time.sleep(2)
+                biz_params = load_biz_params_from_file(biz)
+                if biz_params:
+                    # 重试（已入库的文章会被增量判断跳过）
+                    listing = list_and_download(biz_params)
+                    if listing is None or listing.error == 'no_session':
                         return jsonify({
                             'success': False,
-                            'error': '重新捕获后仍无法加载参数'
+                            'error': listing.message if listing else '无法提取appmsg_token',
+                            'need_recapture': True
                         }), 500
                 else:
                     return jsonify({
                         'success': False,
-                        'error': '参数捕获失败'
+                        'error': '重新捕获后仍无法加载参数'
                     }), 500
             else:
                 return jsonify({
                     'success': False,
-                    'error': articles.get('message', '获取文章列表失败')
+                    'error': '参数捕获失败'
                 }), 500
         
-        if not articles:
+        # 8. 上传到数据库：成功的文章已在获取过程中分批写入，这里写入剩下的失败文章
+        logger.info(f"📤 上传到数据库...")
+        pending_articles.extend(
+            _article_to_db(biz, result)
+            for url, (_, result) in finished.items()
+            if url and not result.get('success')
+        )
+        flush_pending_articles()
+        uploaded_count = sum(count for status, count in save_counts.items() if status != 'failed')
+        # 按列出顺序输出
+        results = [result for _, result in sorted(finished.values(), key=lambda item: item[0])]
+        
+        if not results:
             # 没有新文章，但可能数据库有旧文章
             logger.info(f"   ℹ️  没有获取到新文章")
             
@@ -552,88 +586,9 @@ def fetch_articles_smart():
                 }
             })
         
-        # 8. 批量下载HTML并从HTML中提取统计数据（使用参数化请求）
-        logger.info(f"📊 开始批量下载HTML并提取统计数据（共 {len(articles)} 篇新文章）...")
-        logger.info(f"   🔧 使用参数化请求方式（从HTML中提取统计数据）")
+        success_count = sum(1 for result in results if result.get('success'))
         
-        # ✅ 关键：将BIZ参数写入new_wechat_config.py，供download_full_html使用
-        _write_params_to_config(biz_params)
-        
-        results = []
-        success_count = 0
-        
-        for i, article in enumerate(articles, 1):
-            try:
-                article_url_item = article.get('url', '')
-                article_title = article.get('title', '')
-                publish_date = article.get('publish_date', '')
-                
-                logger.info(f"   [{i}/{len(articles)}] {article_title[:40]}...")
-                
-                # 使用参数化请求下载HTML并提取统计数据
-                # 参数已经写入params/new_wechat_config.py，download_full_html会自动读取
-                download_result = download_full_html_with_stats(
-                    article_url_item,
-                    article_title,
-                    publish_date,
-                    account_name=account_name,
-                    output_dir="articles_html"
-                )
-                
-                html_file_path = download_result.get('filepath', '')
-                stats = download_result.get('stats', {})
-                
-                if download_result.get('success') and stats:
-                    success_count += 1
-                    read_num = stats.get('read_num', 0)
-                    old_like_count = stats.get('old_like_count', 0)
-                    share_count = stats.get('share_count', 0)
-                    comment_count = stats.get('comment_count', 0)
-                    logger.info(f"      ✅ 阅读: {read_num} | 点赞: {old_like_count} | 分享: {share_count} | 评论: {comment_count}")
-                else:
-                    logger.warning(f"      ⚠️  下载或提取统计数据失败: {download_result.get('error', '')}")
-                
-                # 转换统计数据格式
-                def safe_int(val):
-                    try:
-                        return int(val) if val else 0
-                    except:
-                        return 0
-                
-                # 合并数据
-                result = {
-                    **article,
-                    'local_html_path': html_file_path,
-                    'read_count': safe_int(stats.get('read_num')),
-                    'like_count': safe_int(stats.get('like_count')),  # 喜欢/收藏（爱心）
-                    'old_like_count': safe_int(stats.get('old_like_count')),  # 点赞（大拇指）
-                    'share_count': safe_int(stats.get('share_count')),
-                    'comment_count': safe_int(stats.get('comment_count')),
-                    'nickname': stats.get('nickname', ''),
-                    'user_name': stats.get('user_name', ''),
-                    'success': download_result.get('success', False),
-                    'method': 'html_extraction'
-                }
-                results.append(result)
-                
-                # 避免请求过快
-                if i < len(articles):
-                    time.sleep(2)
-                
-            except Exception as e:
-                logger.error(f"      ❌ 处理失败: {e}")
-                results.append({
-                    **article,
-                    'read_count': 0,
-                    'like_count': 0,
-                    'old_like_count': 0,
-                    'share_count': 0,
-                    'comment_count': 0,
-                    'success': False,
-                    'error': str(e)
-                })
-        
-        logger.info(f"✅ 批量获取完成: 成功 {success_count}/{len(articles)}")
+        logger.info(f"✅ 批量获取完成: 成功 {success_count}/{len(results)}")
         
         # 9. 保存为JSON和CSV
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -645,32 +600,6 @@ def fetch_articles_smart():
         
         logger.info(f"💾 已保存: {csv_filename}, {json_filename}")
         
-        # 10. 上传到数据库
-        logger.info(f"📤 上传到数据库...")
-        uploaded_count = 0
-        
-        for result in results:
-            try:
-                article_data = {
-                    'biz': biz,
-                    'url': result.get('url'),
-                    'title': result.get('title'),
-                    'html_content': None,  # HTML已保存到本地文件
-                    'publish_date': result.get('publish_date'),
-                    'read_count': result.get('read_count', 0),
-                    'like_count': result.get('like_count', 0),
-                    'old_like_count': result.get('old_like_count', 0),
-                    'share_count': result.get('share_count', 0),
-                    'comment_count': result.get('comment_count', 0),
-                    'local_html_path': result.get('local_html_path', '')
-                }
-                
-                save_article(article_data)
-                uploaded_count += 1
-                
-            except Exception as e:
-                logger.warning(f"   ⚠️  上传失败: {result.get('title', '')[:30]} - {e}")
-        
         logger.info(f"✅ 已上传 {uploaded_count}/{len(results)} 篇新文章到数据库")
         
         # 11. 从数据库获取完整日期范围的文章（已有+新获取）
@@ -689,6 +618,7 @@ def fetch_articles_smart():
                 'from_cache': False,
                 'total': len(all_articles),
                 'new_fetched': uploaded_count,
+                'save_stats': save_counts,
                 'existing_in_db': len(all_articles) - uploaded_count,
                 'csv_file': csv_filename,
                 'json_file': json_filename,
@@ -27,6 +27,7 @@ warnings.filterwarnings('ignore', message='urllib3 v2 only supports OpenSSL 1.1.
 import signal
 import atexit
 # 导入现有模块
+import http_client
 from params.new_wechat_config import COOKIE
 from wechatarticles import ArticlesInfo
 from smart_batch_fetch import (
@@ -625,10 +626,18 @@ class ProxyManager:
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """健康检查"""
+    from db_cache import cache_stats
+    from css_cache import css_cache_stats
+    from http_client import connection_stats
+    from rate_limiter import limiter
     return jsonify({
         'status': 'ok',
         'timestamp': datetime.now().isoformat(),
-        'service': 'WeChat Articles API'
+        'service': 'WeChat Articles API',
+        'cache': cache_stats(),  # 数据库查询缓存的命中/未命中计数
+        'http': connection_stats(),  # 访问微信的请求数、新建连接（握手）数和连接复用率
+        'rate_limits': limiter.stats(),  # 每个 (uin, 接口类别) 当前的请求速率和被限流次数
+        'css_cache': css_cache_stats()  # 内联CSS缓存的命中率
     })
 
 @app.route('/articles/<path:filepath>')
@@ -845,7 +854,7 @@ def fetch_article():
                         logger.info(f"🔍 验证参数有效性...")
                         logger.info(f"   使用BIZ: {biz}")
                         try:
-                            import requests
+                            import http_client
                             
                             # 使用当前BIZ进行验证（而不是固定的测试BIZ）
                             test_url = (
@@ -871,7 +880,7 @@ def fetch_article():
                                 'Referer': f'https://mp.weixin.qq.com/mp/profile_ext?action=home&__biz={biz}&scene=124',
                             }
                             
-                            response = requests.get(test_url, headers=headers, timeout=10)
+                            response = http_client.get(test_url, headers=headers, timeout=10)
                             data = response.json()
                             
                             # 检查返回结果
@@ -944,13 +953,13 @@ def fetch_article():
             if '/s/' in article_url and '__biz=' not in article_url:
                 logger.info(f"   检测到短链接，正在转换为长链接...")
                 try:
-                    import requests
+                    import http_client
                     headers = {
                         'User-Agent': 'Mozilla/5.0 (iPhone; CPU iPhone OS 14_0 like Mac OS X) AppleWebKit/605.1.15',
                         'Cookie': cookie,
                     }
                     logger.info(f"   发送请求到: {article_url}")
-                    response = requests.get(article_url, headers=headers, allow_redirects=True, timeout=15)
+                    response = http_client.get(article_url, headers=headers, allow_redirects=True, timeout=15)
                     final_article_url = response.url
                     logger.info(f"   响应状态码: {response.status_code}")
                     logger.info(f"   最终URL: {final_article_url}")
@@ -979,7 +988,8 @@ def fetch_article():
             
             logger.info(f"   最终使用的URL: {final_article_url[:150]}...")
             
-            articles_info = ArticlesInfo(appmsg_token=appmsg_token, cookie=cookie)
+            articles_info = ArticlesInfo(appmsg_token=appmsg_token, cookie=cookie,
+                                         client=http_client, timeout=http_client.DEFAULT_TIMEOUT)
             stats = get_article_stats(final_article_url, articles_info)
             
             if not stats or not stats.get('success'):
@@ -1125,7 +1135,8 @@ def fetch_articles():
                 
                 appmsg_token = params.get('appmsg_token')
                 cookie = params.get('cookie', COOKIE)
-                articles_info = ArticlesInfo(appmsg_token=appmsg_token, cookie=cookie)
+                articles_info = ArticlesInfo(appmsg_token=appmsg_token, cookie=cookie,
+                                             client=http_client, timeout=http_client.DEFAULT_TIMEOUT)
                 
                 stats = get_article_stats(article_url, articles_info)
                 
@@ -1152,10 +1163,6 @@ def fetch_articles():
                 else:
                     failed_count += 1
                     logger.warning(f"⚠️  第{idx}篇文章获取失败")
-                
-                # 延迟，避免请求过快
-                if idx < len(articles):
-                    time.sleep(5)
                     
             except Exception as e:
                 logger.error(f"❌ 第{idx}篇文章处理失败: {e}")
@@ -1244,9 +1251,10 @@ if __name__ == '__main__':
         logger.warning(f"⚠️  数据库初始化失败: {e}，将使用文件存储")
     
     # 注册新的API端点（使用数据库缓存）
-    from api_endpoints_new import fetch_article_with_cache, fetch_articles_filtered
+    from api_endpoints_new import fetch_article_with_cache, fetch_articles_filtered, get_stats_curve
     app.add_url_rule('/api/v2/fetch_article', 'fetch_article_v2', fetch_article_with_cache, methods=['POST'])
     app.add_url_rule('/api/v2/fetch_articles_filtered', 'fetch_articles_filtered', fetch_articles_filtered, methods=['POST'])
+    app.add_url_rule('/api/v2/stats_curve', 'stats_curve', get_stats_curve, methods=['POST'])
     
     # 注册智能API端点（完全模拟smart_batch_auto.py + 智能增量）
     from api_endpoints_smart import fetch_articles_smart
@@ -1260,6 +1268,7 @@ if __name__ == '__main__':
     logger.info("   - POST /api/fetch_article - 获取单篇文章（旧版）")
     logger.info("   - POST /api/v2/fetch_article - 获取单篇文章（新版，使用数据库缓存）")
     logger.info("   - POST /api/v2/fetch_articles_filtered - 批量获取文章（带过滤）")
+    logger.info("   - POST /api/v2/stats_curve - 统计数据曲线（单篇文章/公众号）")
     logger.info("   - POST /api/fetch_articles - 批量获取文章（旧版）")
     logger.info("   - POST /api/fetch_articles_smart - 智能批量获取（增量+自动捕获）")
     logger.info("   - POST /api/stop_proxy - 停止代理服务器")
@@ -0,0 +1,226 @@
+# coding: utf-8
+"""
+文章文档（单篇文章在内存中的处理过程）
+原来下载一篇文章：download_full_html_with_stats 写文件 → 重新读文件找 comment_id →
+inject_comments_direct_render 读文件、改写文件 → 接口再读一次文件把HTML存进数据库，
+同一篇 1~3 MB 的文章要读三次、写三次。
+
+ArticleDocument 把 下载 → 提取元数据 → 获取留言 → 注入（html_transforms 一次解析）→ 保存
+都放在内存里完成，文件只在最后写一次，写文件用的同一份内容（content / encoded / content_hash）
+直接交给数据库层：
+
+    doc = ArticleDocument(url, title, publish_date, account_name)
+    if not doc.exists:
+        doc.download()
+        doc.fetch_comments(credentials)
+        doc.persist()
+    article_data = {..., **doc.db_fields()}
+"""
+import hashlib
+import html as html_module
+import os
+import re
+import urllib.parse
+from datetime import datetime
+from typing import Dict, Optional
+
+import http_client
+from comments_client import CommentSet, CommentsClient
+from html_transforms import (
+    add_referrer_meta,
+    apply_transforms,
+    inject_comments,
+    inline_stylesheets,
+    swap_lazy_images
+)
+from page_metadata import PageMetadata, extract_page_metadata
+
+_UNSAFE_FILENAME_CHARS = re.compile(r'[<>:"/\\|?*]')
+
+
+def article_html_path(title: str, publish_date: Optional[str], account_name: Optional[str] = None,
+                      output_dir: str = "articles_html") -> str:
+    """
+    文章HTML文件路径：{output_dir}/{公众号名称}/{日期}/{标题}.html（没有公众号名称时直接放在 output_dir 下）
+    """
+    if account_name:
+        # 清理公众号名称（移除非法字符）并限制长度
+        safe_account_name = _UNSAFE_FILENAME_CHARS.sub('_', account_name)[:50]
+        date_str = publish_date or datetime.now().strftime('%Y-%m-%d')
+        directory = os.path.join(output_dir, safe_account_name, date_str)
+    else:
+        directory = output_dir
+    safe_title = _UNSAFE_FILENAME_CHARS.sub('_', title or '')[:100]
+    return os.path.join(directory, f"{safe_title}.html")
+
+
+def _query_params(url: str) -> Dict[str, str]:
+    """URL查询参数（保持原样，不做百分号解码；同名参数取第一个）"""
+    query = urllib.parse.urlsplit(url).query
+    params = {}
+    for part in query.split('&'):
+        name, sep, value = part.partition('=')
+        if sep:
+            params.setdefault(name, value)
+    return params
+
+
+def config_credentials() -> Dict[str, str]:
+    """从 params/new_wechat_config.py 读取当前凭据（key、uin、pass_ticket、cookie）"""
+    from params.new_wechat_config import KEY, UIN, PASS_TICKET, COOKIE
+    return {'key': KEY, 'uin': UIN, 'pass_ticket': PASS_TICKET, 'cookie': COOKIE}
+
+
+class ArticleDocument:
+    """一篇文章的内存文档：原始HTML、元数据、留言和最终写入文件的内容"""
+
+    def __init__(self, url: str, title: str, publish_date: Optional[str] = None,
+                 account_name: Optional[str] = None, output_dir: str = "articles_html"):
+        # URL 解码（&amp; -> &）
+        self.url = html_module.unescape(url or '')
+        self.title = title
+        self.publish_date = publish_date
+        self.filepath = article_html_path(title, publish_date, account_name, output_dir)
+        self.exists = os.path.isfile(self.filepath)
+
+        self.raw_html: Optional[str] = None  # 下载到的原始HTML
+        self.metadata: Optional[PageMetadata] = None
+        self.comments: Optional[Dict] = None
+        self.comment_set: Optional[CommentSet] = None
+        self.content: Optional[str] = None  # 处理后的HTML（写入文件和数据库的内容）
+        self.encoded: Optional[bytes] = None
+        self.content_hash: Optional[str] = None
+        self.file_size: Optional[int] = None
+        self.transform_results: Dict = {}
+        self.headers: Optional[Dict] = None  # 下载文章用的请求头和代理（下载CSS时沿用）
+        self.proxies: Optional[Dict] = None
+
+    def download(self, credentials: Dict[str, str] = None) -> PageMetadata:
+        """
+        带凭据请求文章页面（这样页面中才有阅读数等统计数据），并提取元数据
+
+        Parameters
+        ----------
+        credentials : dict, optional
+            key、uin、pass_ticket、cookie，默认读取 params/new_wechat_config.py
+
+        Returns
+        -------
+        PageMetadata
+            页面元数据；请求失败时抛出异常
+        """
+        credentials = credentials or config_credentials()
+        query = _query_params(self.url)
+        params = {
+            "__biz": query['__biz'],
+            "mid": query['mid'],
+            "idx": query['idx'],
+            "sn": query['sn'],
+            "scene": query.get('scene') or "126",
+            "key": credentials.get('key'),
+            "uin": credentials.get('uin'),
+            "pass_ticket": credentials.get('pass_ticket'),
+            "devicetype": "Windows",
+            "version": "6309091f",
+            "lang": "zh_CN",
+            "acctmode": "0",
+            "ascene": "1",
+            "wx_header": "1"
+        }
+        if query.get('chksm'):
+            params["chksm"] = query['chksm']
+
+        self.headers = http_client.build_headers('desktop', cookie=credentials.get('cookie'))
+        self.proxies = {"http": None, "https": None}
+        response = http_client.get("https://mp.weixin.qq.com/s", params=params, headers=self.headers,
+                                   proxies=self.proxies, timeout=15)
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}")
+
+        self.raw_html = response.text
+        self.metadata = extract_page_metadata(self.raw_html)
+        return self.metadata
+
+    @property
+    def stats(self) -> Dict[str, str]:
+        """页面中的统计数据（原始字符串；没有的字段不出现）"""
+        if self.metadata is None:
+            return {}
+        raw = self.metadata.raw
+        stats = {}
+        read_num = raw.get('read_num', raw.get('read_num_new'))
+        if read_num is not None:
+            stats['read_num'] = read_num
+        for name in ('old_like_count', 'like_count', 'share_count', 'comment_count'):
+            if name in raw:
+                stats[name] = raw[name]
+        return stats
+
+    def fetch_comments(self, credentials: Dict[str, str]) -> Dict:
+        """
+        获取全部精选留言和回复（使用页面中已有的 comment_id，不再请求一次文章页面；分页见 comments_client）
+
+        Parameters
+        ----------
+        credentials : dict
+            key、uin、pass_ticket、appmsg_token、cookie
+
+        Returns
+        -------
+        dict
+            接口格式的留言数据（CommentSet.to_dict()），文章未开启留言或获取失败时为空字典；
+            完整结果在 self.comment_set 中
+        """
+        self.comments = {}
+        comment_id = self.metadata.comment_id if self.metadata else None
+        if not comment_id:
+            return self.comments
+
+        self.comment_set = CommentsClient(credentials).fetch(self.url, comment_id)
+        if self.comment_set.comments:
+            self.comments = self.comment_set.to_dict()
+        return self.comments
+
+    def render(self) -> str:
+        """内联CSS、替换图片地址、添加 referrer、注入留言（一次解析、一次序列化）"""
+        transforms = [
+            inline_stylesheets(self.headers, self.proxies),
+            swap_lazy_images,
+            add_referrer_meta
+        ]
+        if self.comments and self.comments.get('elected_comment'):
+            transforms.append(inject_comments(self.comments))
+        self.transform_results = {}
+        self.content = apply_transforms(self.raw_html, transforms, self.transform_results)
+        return self.content
+
+    def persist(self) -> str:
+        """处理（如果还没有处理）并写入文件，只写一次；返回文件路径"""
+        if self.content is None:
+            self.render()
+        self.encoded = self.content.encode('utf-8')
+        self.content_hash = hashlib.sha256(self.encoded).hexdigest()
+        os.makedirs(os.path.dirname(self.filepath) or '.', exist_ok=True)
+        with open(self.filepath, 'wb') as f:
+            f.write(self.encoded)
+        self.file_size = len(self.encoded)
+        self.exists = True
+        return self.filepath
+
+    def load(self) -> Optional[str]:
+        """读取已存在的文件（文章之前已下载过时使用）"""
+        if self.content is None and os.path.isfile(self.filepath):
+            with open(self.filepath, 'rb') as f:
+                self.encoded = f.read()
+            self.content = self.encoded.decode('utf-8')
+            self.content_hash = hashlib.sha256(self.encoded).hexdigest()
+            self.file_size = len(self.encoded)
+        return self.content
+
+    def db_fields(self) -> Dict:
+        """交给数据库层的字段：HTML内容、内容哈希（与文件内容相同，无需重新计算）、本地路径"""
+        return {
+            'html_content': self.content,
+            'content_hash': self.content_hash,
+            'local_html_path': self.filepath if self.exists else ''
+        }
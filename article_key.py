@@ -0,0 +1,69 @@
+# coding: utf-8
+"""
+文章URL规范化
+微信文章URL中的chksm、scene等参数每次都会变化，只有 __biz + mid + idx + sn 能唯一确定一篇文章
+所有需要判断"是否同一篇文章"的地方都应使用这里的函数，避免各处各写一套正则
+"""
+import html
+import re
+import urllib.parse
+from typing import Optional, Tuple
+
+_CORE_PARAM_PATTERNS = {
+    '__biz': re.compile(r'[?&;]__biz=([^&#]+)'),
+    'mid': re.compile(r'[?&;]mid=(\d+)'),
+    'idx': re.compile(r'[?&;]idx=(\d+)'),
+    'sn': re.compile(r'[?&;]sn=([0-9a-fA-F]+)'),
+}
+
+
+def extract_core_params(url: str) -> Optional[dict]:
+    """
+    提取URL的核心参数 (__biz, mid, idx, sn)
+
+    Parameters
+    ----------
+    url : str
+        文章URL（支持 &amp; 转义、\\/ 转义和URL编码的BIZ）
+
+    Returns
+    -------
+    dict or None
+        {'__biz': str, 'mid': str, 'idx': str, 'sn': str}，缺少任一参数返回None
+    """
+    if not url:
+        return None
+
+    url = html.unescape(url).replace('\\/', '/')
+    params = {}
+    for key, pattern in _CORE_PARAM_PATTERNS.items():
+        match = pattern.search(url)
+        if not match:
+            return None
+        params[key] = match.group(1)
+
+    params['__biz'] = urllib.parse.unquote(params['__biz'])
+    params['sn'] = params['sn'].lower()
+    return params
+
+
+def canonical_article_key(url: str) -> Optional[Tuple[str, int, int, str]]:
+    """
+    计算文章的规范化键 (biz, mid, idx, sn)
+
+    与 models.Article 上的 (biz, mid, idx, sn) 唯一索引一一对应
+
+    Parameters
+    ----------
+    url : str
+        文章URL
+
+    Returns
+    -------
+    tuple or None
+        (biz, mid, idx, sn)，短链接等无法解析的URL返回None
+    """
+    params = extract_core_params(url)
+    if not params:
+        return None
+    return params['__biz'], int(params['mid']), int(params['idx']), params['sn']
@@ -0,0 +1,300 @@
+# coding: utf-8
+"""
+文章详情异步流水线
+批量获取文章详情（下载HTML、内联CSS、获取留言、注入、提取统计数据）时，
+原来逐篇串行处理，每篇之间还要固定等待，绝大部分时间都在等网络。
+
+这里用 asyncio 同时处理多篇文章：
+- 每篇文章的各个阶段（stages）按顺序执行，阶段函数就是原来的同步函数，在线程池中运行
+  （HTTP请求都走 http_client 的共享连接池，线程安全）
+- 并发数受两层限制：全局（整个进程）和每个凭据（同一个微信号的 uin，上限固定为 CREDENTIAL_CONCURRENCY，
+  同一凭据的多个请求共用；每个请求的 concurrency 只能在这个上限内再调小）；
+  请求频率不在这里控制，由 http_client 按 (uin, 接口类别) 自适应限流（见 rate_limiter）
+- 结果按输入顺序返回；on_result 回调按完成顺序串行调用（用于攒批写数据库）
+- stream_article_pipeline 边列出边处理：文章来源是迭代器（如逐页列出的 ProfileListing），
+  经有界队列交给工作协程，第一页列出后就开始处理，队列满时暂停列出
+
+事件循环在后台线程中常驻，Flask 接口和命令行脚本通过同步函数 run_article_pipeline 调用，
+这样全局并发限制在多个请求之间也是共享的
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# 整个进程同时处理的文章数
+GLOBAL_CONCURRENCY = 8
+# 同一凭据同时处理的文章数
+CREDENTIAL_CONCURRENCY = 3
+# 边列出边处理时，已列出、等待处理的文章数上限
+STREAM_QUEUE_SIZE = 20
+
+_loop = None
+_loop_lock = threading.Lock()
+_global_semaphore = None
+_credential_slots = {}  # credential -> asyncio.Semaphore(CREDENTIAL_CONCURRENCY)
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """后台常驻的事件循环（第一次调用时启动）"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            # 阶段函数都在这个线程池里运行，大小与全局并发数一致
+            loop.set_default_executor(ThreadPoolExecutor(max_workers=GLOBAL_CONCURRENCY,
+                                                         thread_name_prefix='article-stage'))
+            threading.Thread(target=loop.run_forever, name='article-pipeline', daemon=True).start()
+            _loop = loop
+    return _loop
+
+
+def _credential_semaphore(credential: str) -> asyncio.Semaphore:
+    """凭据的并发槽位（只在事件循环线程中调用）；同一凭据的所有请求共用，上限固定"""
+    semaphore = _credential_slots.get(credential)
+    if semaphore is None:
+        semaphore = _credential_slots[credential] = asyncio.Semaphore(CREDENTIAL_CONCURRENCY)
+    return semaphore
+
+
+def parse_concurrency(value) -> Optional[int]:
+    """
+    校验接口传入的 concurrency
+
+    Parameters
+    ----------
+    value : int or str or None
+        请求中的并发数
+
+    Returns
+    -------
+    int or None
+        不超过 CREDENTIAL_CONCURRENCY 的正整数；没有传时为 None（使用默认值）
+
+    Raises
+    ------
+    ValueError
+        不是正整数
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"concurrency 必须是正整数: {value!r}")
+    try:
+        concurrency = int(value)
+    except ValueError:
+        raise ValueError(f"concurrency 必须是正整数: {value!r}")
+    if concurrency < 1:
+        raise ValueError(f"concurrency 必须是正整数: {value!r}")
+    return min(concurrency, CREDENTIAL_CONCURRENCY)
+
+
+def _effective_concurrency(concurrency: Optional[int]) -> int:
+    """本次调用的并发数：默认 CREDENTIAL_CONCURRENCY，不超过凭据上限"""
+    return max(1, min(concurrency or CREDENTIAL_CONCURRENCY, CREDENTIAL_CONCURRENCY))
+
+
+async def process_articles(
+    articles: Sequence[Dict],
+    stages: Sequence[Callable[[Any], Any]],
+    credential: str = '',
+    concurrency: int = None,
+    on_result: Callable[[int, Any], None] = None,
+    on_error: Callable[[Dict, Exception], Any] = None
+) -> List[Any]:
+    """
+    并发处理文章列表（协程版本，需在 run_article_pipeline 的事件循环中运行）
+
+    参数说明见 run_article_pipeline
+    """
+    global _global_semaphore
+    if _global_semaphore is None:
+        _global_semaphore = asyncio.Semaphore(GLOBAL_CONCURRENCY)
+    credential_semaphore = _credential_semaphore(credential)
+    # 本次调用自己的并发数（在凭据上限内）
+    call_semaphore = asyncio.Semaphore(_effective_concurrency(concurrency))
+    result_lock = asyncio.Lock()
+    total = len(articles)
+    results = [None] * total
+
+    async def run_one(index: int, article: Dict):
+        async with call_semaphore, credential_semaphore, _global_semaphore:
+            logger.info(f"   [{index + 1}/{total}] {(article.get('title') or '')[:40]}...")
+            value = await _run_stages(article, stages, on_error)
+        results[index] = value
+        if on_result:
+            # 回调串行执行，调用方无需自己加锁
+            async with result_lock:
+                await asyncio.to_thread(on_result, index, value)
+
+    await asyncio.gather(*(run_one(index, article) for index, article in enumerate(articles)))
+    return results
+
+
+async def _run_stages(article: Dict, stages: Sequence[Callable[[Any], Any]],
+                      on_error: Callable[[Dict, Exception], Any] = None) -> Any:
+    """按顺序在线程池中执行一篇文章的各个阶段"""
+    value = article
+    try:
+        for stage in stages:
+            value = await asyncio.to_thread(stage, value)
+    except Exception as e:
+        logger.error(f"      ❌ 处理失败: {e}")
+        value = on_error(article, e) if on_error else None
+    return value
+
+
+async def process_article_stream(
+    source: Iterable[Dict],
+    stages: Sequence[Callable[[Any], Any]],
+    credential: str = '',
+    concurrency: int = None,
+    on_result: Callable[[int, Any], None] = None,
+    on_error: Callable[[Dict, Exception], Any] = None,
+    queue_size: int = None
+) -> int:
+    """
+    边列出边处理（协程版本，需在 stream_article_pipeline 的事件循环中运行）
+
+    参数说明见 stream_article_pipeline
+    """
+    global _global_semaphore
+    if _global_semaphore is None:
+        _global_semaphore = asyncio.Semaphore(GLOBAL_CONCURRENCY)
+    # 工作协程数就是本次调用的并发数，凭据槽位限制同一凭据所有请求的总数
+    concurrency = _effective_concurrency(concurrency)
+    credential_semaphore = _credential_semaphore(credential)
+    result_lock = asyncio.Lock()
+    queue = asyncio.Queue(maxsize=queue_size or STREAM_QUEUE_SIZE)
+    done = object()
+    iterator = iter(source)
+
+    def next_article():
+        # 在线程池中推进迭代器（列表请求是同步的）
+        return next(iterator, done)
+
+    async def produce() -> int:
+        count = 0
+        try:
+            while True:
+                article = await asyncio.to_thread(next_article)
+                if article is done:
+                    break
+                # 队列满时在这里等待，迭代器暂停，不会请求下一页
+                await queue.put((count, article))
+                count += 1
+        finally:
+            for _ in range(concurrency):
+                await queue.put(None)
+        return count
+
+    async def consume():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            index, article = item
+            async with credential_semaphore, _global_semaphore:
+                logger.info(f"   [{index + 1}] {(article.get('title') or '')[:40]}...")
+                value = await _run_stages(article, stages, on_error)
+            if on_result:
+                async with result_lock:
+                    await asyncio.to_thread(on_result, index, value)
+
+    produced, *_ = await asyncio.gather(produce(), *(consume() for _ in range(concurrency)))
+    return produced
+
+
+def run_article_pipeline(
+    articles: Sequence[Dict],
+    stages: Sequence[Callable[[Any], Any]],
+    credential: str = '',
+    concurrency: int = None,
+    on_result: Callable[[int, Any], None] = None,
+    on_error: Callable[[Dict, Exception], Any] = None,
+    timeout: Optional[float] = None
+) -> List[Any]:
+    """
+    并发处理文章列表（同步调用，阻塞到全部完成）
+
+    Parameters
+    ----------
+    articles : Sequence[dict]
+        文章列表（至少包含 title、url）
+    stages : Sequence[callable]
+        每篇文章依次执行的阶段：第一个阶段接收文章字典，之后每个阶段接收上一阶段的返回值，
+        最后一个阶段的返回值就是这篇文章的结果
+    credential : str
+        凭据标识（一般为 uin），同一凭据共享并发限制
+    concurrency : int, optional
+        本次同时处理的文章数，默认且最多为 CREDENTIAL_CONCURRENCY（同一凭据的所有调用合计也不超过它）
+    on_result : callable, optional
+        on_result(index, result)，每篇完成后按完成顺序串行调用
+    on_error : callable, optional
+        on_error(article, exception) 的返回值作为出错文章的结果，默认结果为 None
+    timeout : float, optional
+        整批的超时时间（秒）
+
+    Returns
+    -------
+    List
+        与 articles 顺序一致的结果列表
+    """
+    loop = _get_loop()
+    if threading.current_thread().name == 'article-pipeline':
+        raise RuntimeError("不能在流水线的事件循环线程中同步调用 run_article_pipeline")
+    future = asyncio.run_coroutine_threadsafe(
+        process_articles(articles, stages, credential, concurrency, on_result, on_error),
+        loop
+    )
+    return future.result(timeout)
+
+
+def stream_article_pipeline(
+    source: Iterable[Dict],
+    stages: Sequence[Callable[[Any], Any]],
+    credential: str = '',
+    concurrency: int = None,
+    on_result: Callable[[int, Any], None] = None,
+    on_error: Callable[[Dict, Exception], Any] = None,
+    queue_size: int = None,
+    timeout: Optional[float] = None
+) -> int:
+    """
+    边列出边处理：从 source（如 profile_listing.ProfileListing）逐篇取文章放进有界队列，
+    concurrency 个工作协程从队列中取出并执行各个阶段（同步调用，阻塞到全部完成）
+
+    第一篇文章列出后立即开始处理；队列满时暂停迭代 source（背压），
+    同时在内存中的文章数不超过 queue_size + concurrency。结果不在内存中攒成列表，通过 on_result 交给调用方
+
+    Parameters
+    ----------
+    source : Iterable[dict]
+        文章来源（可以是生成器，在线程池中迭代）
+    stages, credential, on_error
+        见 run_article_pipeline
+    concurrency : int, optional
+        工作协程数（本次同时处理的文章数），默认且最多为 CREDENTIAL_CONCURRENCY
+    on_result : callable, optional
+        on_result(index, result)，index 为文章在 source 中的序号，按完成顺序串行调用
+    queue_size : int, optional
+        队列长度，默认 STREAM_QUEUE_SIZE
+    timeout : float, optional
+        整批的超时时间（秒）
+
+    Returns
+    -------
+    int
+        从 source 取出的文章数
+    """
+    loop = _get_loop()
+    if threading.current_thread().name == 'article-pipeline':
+        raise RuntimeError("不能在流水线的事件循环线程中同步调用 stream_article_pipeline")
+    future = asyncio.run_coroutine_threadsafe(
+        process_article_stream(source, stages, credential, concurrency, on_result, on_error, queue_size),
+        loop
+    )
+    return future.result(timeout)
@@ -1,95 +1,280 @@
 # coding: utf-8
 """
 数据库备份脚本
-将 PostgreSQL 数据库导出为 SQL 和 JSON 格式
+将数据库按表流式导出为 gzip 压缩的 NDJSON（每行一条记录），并支持恢复
+
+- 使用服务端游标逐批读取，内存占用与表大小无关
+- 每张表按固定行数切分为多个文件：backup/<时间戳>/<表名>_0001.ndjson.gz
+- 增量模式：只导出上次备份之后新增/更新的行（按 fetched_at / updated_at 等时间列判断）
+  （删除操作不会体现在增量备份中，需要时请做一次全量备份）
+- manifest.json 记录备份时间、上一次备份、每张表的文件和行数
+
+用法:
+    python backup_database.py                     # 全量备份
+    python backup_database.py --incremental       # 增量备份（基于最近一次备份）
+    python backup_database.py --with-contents     # 同时备份HTML正文（article_contents）
+    python backup_database.py restore backup/20250101_120000   # 恢复（自动先恢复它依赖的备份）
 """
-import os
+import argparse
+import base64
+import gzip
 import json
-from datetime import datetime
-from database import get_db_session
-from models import Account, Parameter, Article
-
-def backup_to_json():
-    """将数据库导出为 JSON 格式"""
-    backup_dir = "backup"
-    os.makedirs(backup_dir, exist_ok=True)
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    
-    with get_db_session() as session:
-        # 备份 accounts
-        accounts = session.query(Account).all()
-        accounts_data = []
-        for acc in accounts:
-            accounts_data.append({
-                'id': acc.id,
-                'biz': acc.biz,
-                'name': acc.name,
-                'created_at': acc.created_at.isoformat() if acc.created_at else None,
-                'updated_at': acc.updated_at.isoformat() if acc.updated_at else None
-            })
-        
-        # 备份 parameters
-        parameters = session.query(Parameter).all()
-        params_data = []
-        for p in parameters:
-            params_data.append({
-                'id': p.id,
-                'biz': p.biz,
-                'cookie': p.cookie[:100] + '...' if p.cookie and len(p.cookie) > 100 else p.cookie,
-                'key': p.key[:50] + '...' if p.key and len(p.key) > 50 else p.key,
-                'pass_ticket': p.pass_ticket[:50] + '...' if p.pass_ticket and len(p.pass_ticket) > 50 else p.pass_ticket,
-                'uin': p.uin,
-                'appmsg_token': p.appmsg_token,
-                'captured_at': p.captured_at.isoformat() if p.captured_at else None,
-                'expires_at': p.expires_at.isoformat() if p.expires_at else None,
-                'is_valid': p.is_valid
-            })
-        
-        # 备份 articles
-        articles = session.query(Article).all()
-        articles_data = []
-        for art in articles:
-            articles_data.append({
-                'id': art.id,
-                'biz': art.biz,
-                'url': art.url,
-                'short_url': art.short_url,
-                'title': art.title,
-                'publish_date': art.publish_date.isoformat() if art.publish_date else None,
-                'read_count': art.read_count,
-                'old_like_count': art.old_like_count,
-                'like_count': art.like_count,
-                'share_count': art.share_count,
-                'comment_count': art.comment_count,
-                'local_html_path': art.local_html_path,
-                'fetched_at': art.fetched_at.isoformat() if art.fetched_at else None
-            })
-        
-        # 保存备份
-        backup_data = {
-            'backup_time': datetime.now().isoformat(),
-            'accounts': accounts_data,
-            'parameters': params_data,
-            'articles': articles_data,
-            'stats': {
-                'accounts_count': len(accounts_data),
-                'parameters_count': len(params_data),
-                'articles_count': len(articles_data)
-            }
-        }
-        
-        backup_file = os.path.join(backup_dir, f"wechat_db_backup_{timestamp}.json")
-        with open(backup_file, 'w', encoding='utf-8') as f:
-            json.dump(backup_data, f, ensure_ascii=False, indent=2)
-        
-        print(f"✅ 数据库备份完成!")
-        print(f"   备份文件: {backup_file}")
-        print(f"   公众号数量: {len(accounts_data)}")
-        print(f"   参数记录数: {len(params_data)}")
-        print(f"   文章数量: {len(articles_data)}")
-        
-        return backup_file
+import os
+from datetime import datetime, date
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.types import Date, DateTime, LargeBinary
+from database import engine
+from models import Account, Parameter, Article, ArticleContent, FetchCoverage, ArticleStatSnapshot, ListingCursor
+
+BACKUP_DIR = "backup"
+MANIFEST_FILE = "manifest.json"
+
+# 每个文件的行数、每次从数据库读取的行数、恢复时每批写入的行数
+CHUNK_ROWS = 10000
+FETCH_SIZE = 1000
+RESTORE_BATCH_SIZE = 1000
+
+# 按外键依赖顺序排列：(模型, 增量备份使用的时间列)
+BACKUP_TABLES = [
+    (Account, 'updated_at'),
+    (Parameter, 'created_at'),
+    (Article, 'fetched_at'),
+    (ArticleContent, 'updated_at'),
+    (FetchCoverage, 'listed_at'),
+    (ArticleStatSnapshot, 'captured_at'),
+    (ListingCursor, 'updated_at'),
+]
+
+# 参数中的敏感字段只保留前缀（参数4小时就会过期，备份只用于排查问题，不恢复）
+TRUNCATED_FIELDS = {'cookie': 100, 'key': 50, 'pass_ticket': 50}
+
+
+def _to_json_value(value):
+    """数据库值 -> JSON值"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (bytes, memoryview)):
+        return base64.b64encode(bytes(value)).decode('ascii')
+    return value
+
+
+def _from_json_value(column, value):
+    """JSON值 -> 数据库值（按列类型还原日期和二进制）"""
+    if value is None:
+        return None
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(column.type, Date):
+        return date.fromisoformat(value)
+    if isinstance(column.type, LargeBinary):
+        return base64.b64decode(value)
+    return value
+
+
+def _serialize_row(table_name, row):
+    record = {key: _to_json_value(value) for key, value in row.items()}
+    if table_name == Parameter.__tablename__:
+        for field, length in TRUNCATED_FIELDS.items():
+            if record.get(field) and len(record[field]) > length:
+                record[field] = record[field][:length] + '...'
+    return record
+
+
+def find_latest_manifest(backup_dir=BACKUP_DIR):
+    """查找最近一次备份的 manifest，没有返回 None"""
+    if not os.path.isdir(backup_dir):
+        return None
+    for name in sorted(os.listdir(backup_dir), reverse=True):
+        manifest_path = os.path.join(backup_dir, name, MANIFEST_FILE)
+        if os.path.isfile(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            manifest['path'] = os.path.join(backup_dir, name)
+            return manifest
+    return None
+
+
+def _dump_table(conn, model, since_column, since, output_dir):
+    """流式导出一张表，返回 {'files': [...], 'rows': int}"""
+    table = model.__table__
+    stmt = select(table).order_by(*table.primary_key.columns)
+    if since:
+        stmt = stmt.where(table.c[since_column] >= since)
+
+    files = []
+    rows = 0
+    out = None
+    result = conn.execution_options(stream_results=True, yield_per=FETCH_SIZE).execute(stmt)
+    try:
+        for row in result.mappings():
+            if rows % CHUNK_ROWS == 0:
+                if out:
+                    out.close()
+                filename = f"{table.name}_{len(files) + 1:04d}.ndjson.gz"
+                out = gzip.open(os.path.join(output_dir, filename), 'wt', encoding='utf-8')
+                files.append(filename)
+            out.write(json.dumps(_serialize_row(table.name, row), ensure_ascii=False))
+            out.write('\n')
+            rows += 1
+    finally:
+        if out:
+            out.close()
+        result.close()
+    return {'files': files, 'rows': rows}
+
+
+def backup_database(incremental=False, with_contents=False, backup_dir=BACKUP_DIR):
+    """
+    流式备份数据库
+
+    Parameters
+    ----------
+    incremental : bool
+        只备份上次备份之后新增/更新的行（没有上次备份时自动改为全量）
+    with_contents : bool
+        是否备份 article_contents（HTML正文，体积较大）
+    backup_dir : str
+        备份根目录
+
+    Returns
+    -------
+    str
+        本次备份目录
+    """
+    started_at = datetime.now()
+    base = find_latest_manifest(backup_dir) if incremental else None
+    if incremental and not base:
+        print("⚠️  没有找到上一次备份，改为全量备份")
+    since = datetime.fromisoformat(base['started_at']) if base else None
+
+    output_dir = os.path.join(backup_dir, started_at.strftime("%Y%m%d_%H%M%S"))
+    os.makedirs(output_dir, exist_ok=True)
+
+    manifest = {
+        'started_at': started_at.isoformat(),
+        'mode': 'incremental' if base else 'full',
+        'since': since.isoformat() if since else None,
+        'base': os.path.basename(base['path']) if base else None,
+        'tables': {}
+    }
+
+    with engine.connect() as conn:
+        for model, since_column in BACKUP_TABLES:
+            if model is ArticleContent and not with_contents:
+                continue
+            table_name = model.__tablename__
+            info = _dump_table(conn, model, since_column, since, output_dir)
+            info['since_column'] = since_column
+            info['restorable'] = model is not Parameter
+            manifest['tables'][table_name] = info
+            print(f"   {table_name}: {info['rows']} 行, {len(info['files'])} 个文件")
+
+    manifest['finished_at'] = datetime.now().isoformat()
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    print(f"✅ 数据库备份完成!（{'增量' if base else '全量'}）")
+    print(f"   备份目录: {output_dir}")
+    if since:
+        print(f"   增量起点: {since.isoformat()}")
+    return output_dir
+
+
+def _upsert_statement(table, dialect_name):
+    """按主键冲突时更新全部字段的 INSERT 语句"""
+    if dialect_name not in ('postgresql', 'sqlite'):
+        return table.insert()
+    dialect_insert = pg_insert if dialect_name == 'postgresql' else sqlite_insert
+    stmt = dialect_insert(table)
+    pk_names = [col.name for col in table.primary_key.columns]
+    return stmt.on_conflict_do_update(
+        index_elements=pk_names,
+        set_={col.name: stmt.excluded[col.name] for col in table.columns if col.name not in pk_names}
+    )
+
+
+def _restore_table(conn, table, path, files, batch_size):
+    """逐个文件、逐批恢复一张表，返回恢复的行数"""
+    stmt = _upsert_statement(table, conn.dialect.name)
+    restored = 0
+    for filename in files:
+        batch = []
+        with gzip.open(os.path.join(path, filename), 'rt', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                batch.append({
+                    col.name: _from_json_value(col, record.get(col.name))
+                    for col in table.columns if col.name in record
+                })
+                if len(batch) >= batch_size:
+                    conn.execute(stmt, batch)
+                    restored += len(batch)
+                    batch = []
+        if batch:
+            conn.execute(stmt, batch)
+            restored += len(batch)
+    return restored
+
+
+def restore_database(path, batch_size=RESTORE_BATCH_SIZE, backup_dir=BACKUP_DIR):
+    """
+    从备份目录恢复数据（增量备份会先递归恢复它依赖的备份）
+
+    已存在的行按主键覆盖，可以重复执行
+
+    Parameters
+    ----------
+    path : str
+        备份目录（包含 manifest.json）
+    batch_size : int
+        每批写入的行数
+    """
+    with open(os.path.join(path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    if manifest.get('base'):
+        restore_database(os.path.join(backup_dir, manifest['base']), batch_size, backup_dir)
+
+    print(f"📦 恢复备份: {path} ({manifest['mode']})")
+    with engine.begin() as conn:
+        for model, _ in BACKUP_TABLES:
+            table = model.__table__
+            info = manifest['tables'].get(table.name)
+            if not info:
+                continue
+            if not info.get('restorable', True):
+                print(f"   {table.name}: 跳过（备份中的参数已截断）")
+                continue
+            restored = _restore_table(conn, table, path, info['files'], batch_size)
+            print(f"   {table.name}: 恢复 {restored} 行")
+
+            # PostgreSQL 按指定ID插入后需要同步自增序列
+            if conn.dialect.name == 'postgresql' and 'id' in table.c and restored:
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                    f"(SELECT MAX(id) FROM {table.name}))"
+                ))
+
+    print(f"✅ 恢复完成: {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数据库备份/恢复')
+    subparsers = parser.add_subparsers(dest='command')
+    parser.add_argument('--incremental', action='store_true', help='增量备份（基于最近一次备份）')
+    parser.add_argument('--with-contents', action='store_true', help='同时备份HTML正文')
+    restore_parser = subparsers.add_parser('restore', help='从备份目录恢复')
+    restore_parser.add_argument('path', help='备份目录，例如 backup/20250101_120000')
+    restore_parser.add_argument('--batch-size', type=int, default=RESTORE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.command == 'restore':
+        restore_database(args.path, args.batch_size)
+    else:
+        backup_database(incremental=args.incremental, with_contents=args.with_contents)
+
 
 if __name__ == '__main__':
-    backup_to_json()
+    main()
@@ -11,17 +11,27 @@ import urllib.parse
 from datetime import datetime
 from wechatarticles.proxy import ReqIntercept, RspIntercept, MitmProxy, ProxyHandle
 
+# 文章页面中的统计数据：直接在响应体字节上匹配，不需要解码整篇HTML
+READ_NUM_PATTERN = re.compile(rb'"read_num"\s*:\s*(\d+)')
+LIKE_NUM_PATTERN = re.compile(rb'"like_num"\s*:\s*(\d+)')
+APPMSGSTAT_PATTERN = re.compile(rb'appmsgstat\s*=\s*({[^}]+})')
+
 
 class NewPCWeChatProxyHandle(ProxyHandle):
     """新版本 PC 微信代理处理器"""
     
     def hook_init(self):
         self.filter_url_lst = ["mp.weixin.qq.com"]
+        # 只解密公众号页面所在的主机，图片CDN、上报等其他https流量直接转发
+        self.intercept_host_lst = ["mp.weixin.qq.com"]
 
 
 class NewPCWeChatCapture(ReqIntercept, RspIntercept):
     """新版本 PC 微信参数捕获器"""
     
+    # 只有文章页面的响应需要完整读取（deal_response），其余响应直接流式转发
+    url_filters = ["mp.weixin.qq.com/s"]
+    
     def __init__(self, server):
         super().__init__(server)
         self.params_dir = "params"
@@ -119,27 +129,27 @@ class NewPCWeChatCapture(ReqIntercept, RspIntercept):
             # 如果是文章页面
             if "mp.weixin.qq.com/s" in url:
                 try:
-                    text = response.get_text()
-                    
                     # 尝试从 HTML 中提取阅读数和点赞数
                     # 新版本可能直接在 HTML 中包含这些数据
+                    # 直接匹配字节，只有匹配到的片段才解码
                     
                     # 查找 read_num
-                    read_num_match = re.search(r'"read_num"\s*:\s*(\d+)', text)
+                    read_num_match = response.search(READ_NUM_PATTERN)
                     if read_num_match:
-                        read_num = read_num_match.group(1)
+                        read_num = read_num_match.group(1).decode()
                         print(f"📊 在 HTML 中发现阅读数: {read_num}")
                     
                     # 查找 like_num
-                    like_num_match = re.search(r'"like_num"\s*:\s*(\d+)', text)
+                    like_num_match = response.search(LIKE_NUM_PATTERN)
                     if like_num_match:
-                        like_num = like_num_match.group(1)
+                        like_num = like_num_match.group(1).decode()
                         print(f"👍 在 HTML 中发现点赞数: {like_num}")
                     
                     # 查找其他可能的数据格式
-                    appmsgstat_match = re.search(r'appmsgstat\s*=\s*({[^}]+})', text)
+                    appmsgstat_match = response.search(APPMSGSTAT_PATTERN)
                     if appmsgstat_match:
-                        print(f"📈 在 HTML 中发现统计数据: {appmsgstat_match.group(1)}")
+                        appmsgstat = appmsgstat_match.group(1).decode(response.encoding or "utf-8", errors="replace")
+                        print(f"📈 在 HTML 中发现统计数据: {appmsgstat}")
                 
                 except Exception as e:
                     pass
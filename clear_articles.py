@@ -3,7 +3,7 @@
 清空数据库中的所有文章数据
 """
 from database import get_db_session
-from models import Article
+from models import Article, FetchCoverage, ArticleStatSnapshot, ListingCursor
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -34,7 +34,11 @@ def clear_all_articles():
             
             # 删除所有文章
             logger.info("🗑️  正在删除文章...")
+            session.query(ArticleStatSnapshot).delete()
             deleted = session.query(Article).delete()
+            # 列表覆盖记录也要清空，否则已清空的日期范围不会重新抓取
+            session.query(FetchCoverage).delete()
+            session.query(ListingCursor).delete()
             session.commit()
             
             logger.info(f"✅ 成功删除 {deleted} 篇文章")
@@ -0,0 +1,303 @@
+# coding: utf-8
+"""
+文章留言获取
+原来获取留言只发一次 appmsg_comment?action=getcomment&limit=100：精选留言超过一页的文章会被悄悄截断，
+留言下面的回复也只有接口顺带返回的前几条；get_comments_with_params 还要为了找 comment_id
+再下载一遍整篇文章。
+
+CommentsClient 直接使用已下载页面中的 comment_id（PageMetadata.comment_id）：
+- 先取第一页，得到精选留言总数和每页条数，其余各页并发获取
+- 回复没有取全的留言，用 action=getcommentreply 分页获取全部回复（同样并发）
+- 请求都走 http_client，频率由共享的限流器按 (uin, appmsg_comment) 控制（见 rate_limiter），
+  这里的线程数只决定同时有多少个请求在排队
+
+    comment_set = CommentsClient(credentials).fetch(article_url, meta.comment_id)
+    html = apply_transforms(html, [inject_comments(comment_set.to_dict())])
+"""
+import logging
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import http_client
+
+logger = logging.getLogger(__name__)
+
+COMMENT_API_URL = "https://mp.weixin.qq.com/mp/appmsg_comment"
+# 每页请求的条数（服务端可能返回更少，以第一页实际返回的条数为准）
+PAGE_SIZE = 100
+# 同时在途的留言请求数
+COMMENT_CONCURRENCY = 4
+COMMENT_TIMEOUT = 15
+
+
+@dataclass
+class CommentReply:
+    """留言下的一条回复"""
+    reply_id: Optional[int]
+    nick_name: str
+    content: str
+    create_time: int = 0
+    like_num: int = 0
+    is_from_publisher: bool = False  # 作者回复
+    raw: Dict = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def from_api(cls, data: Dict) -> 'CommentReply':
+        return cls(
+            reply_id=data.get('reply_id'),
+            nick_name=data.get('nick_name', ''),
+            content=data.get('content', ''),
+            create_time=data.get('create_time') or 0,
+            like_num=data.get('reply_like_num', data.get('like_num')) or 0,
+            is_from_publisher=data.get('is_from_publisher', 0) == 1 or data.get('type', 0) == 1,
+            raw=data
+        )
+
+
+@dataclass
+class Comment:
+    """一条精选留言及其全部回复"""
+    content_id: str
+    nick_name: str
+    content: str
+    logo_url: str = ''
+    create_time: int = 0
+    like_num: int = 0
+    is_top: bool = False
+    reply_total: int = 0  # 接口给出的回复总数
+    max_reply_id: Optional[int] = None
+    replies: List[CommentReply] = field(default_factory=list)
+    raw: Dict = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def from_api(cls, data: Dict) -> 'Comment':
+        # 新接口的回复在 reply_new 中，旧接口在 reply 中
+        reply_info = data.get('reply_new') or data.get('reply') or {}
+        replies = [CommentReply.from_api(reply) for reply in reply_info.get('reply_list') or []]
+        return cls(
+            content_id=str(data.get('content_id', '')),
+            nick_name=data.get('nick_name', ''),
+            content=data.get('content', ''),
+            logo_url=data.get('logo_url', ''),
+            create_time=data.get('create_time') or 0,
+            like_num=data.get('like_num') or 0,
+            is_top=bool(data.get('is_top')),
+            reply_total=reply_info.get('reply_total_cnt', len(replies)) or 0,
+            max_reply_id=reply_info.get('max_reply_id'),
+            replies=replies,
+            raw=data
+        )
+
+    @property
+    def replies_complete(self) -> bool:
+        return len(self.replies) >= self.reply_total
+
+    def to_dict(self) -> Dict:
+        """接口格式的留言（回复合并到 reply_new.reply_list，供 inject_comments_dom 渲染）"""
+        return {
+            **self.raw,
+            'reply_new': {
+                **(self.raw.get('reply_new') or {}),
+                'reply_total_cnt': self.reply_total,
+                'reply_list': [reply.raw for reply in self.replies]
+            }
+        }
+
+
+@dataclass
+class CommentSet:
+    """一篇文章的全部精选留言"""
+    comment_id: str
+    total: int = 0  # 接口给出的精选留言总数
+    comments: List[Comment] = field(default_factory=list)
+    requests: int = 0  # 本次获取发出的留言接口请求数
+    errors: int = 0  # 失败的页数
+
+    @property
+    def complete(self) -> bool:
+        """留言和回复是否都已取全"""
+        return len(self.comments) >= self.total and all(comment.replies_complete for comment in self.comments)
+
+    @property
+    def reply_count(self) -> int:
+        return sum(len(comment.replies) for comment in self.comments)
+
+    def to_dict(self) -> Dict:
+        """接口格式（elected_comment / elected_comment_total_cnt），与原来单页请求的返回值兼容"""
+        return {
+            'elected_comment_total_cnt': self.total,
+            'elected_comment': [comment.to_dict() for comment in self.comments]
+        }
+
+
+class CommentsClient:
+    """分页并发获取留言和回复"""
+
+    def __init__(self, credentials: Dict[str, str], concurrency: int = COMMENT_CONCURRENCY,
+                 page_size: int = PAGE_SIZE):
+        """
+        Parameters
+        ----------
+        credentials : dict
+            uin、key、pass_ticket、appmsg_token、cookie（没有的可以省略）
+        concurrency : int
+            同时在途的请求数
+        page_size : int
+            每页请求的条数
+        """
+        self.auth_params = {name: credentials[name]
+                            for name in ('uin', 'key', 'pass_ticket', 'appmsg_token') if credentials.get(name)}
+        self.headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+            'Cookie': credentials.get('cookie', '')
+        }
+        self.concurrency = max(1, concurrency)
+        self.page_size = page_size
+
+    def _request(self, params: Dict) -> Optional[Dict]:
+        """请求留言接口，失败（非200、空响应、非JSON、ret 非0）时返回 None"""
+        url = f"{COMMENT_API_URL}?{urllib.parse.urlencode({**params, **self.auth_params})}"
+        try:
+            response = http_client.get(url, headers=self.headers, proxies={"http": None, "https": None},
+                                       timeout=COMMENT_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"⚠️  留言接口请求失败: {e}")
+            return None
+        if response.status_code != 200 or not response.text.strip():
+            logger.warning(f"⚠️  留言接口返回状态码 {response.status_code}")
+            return None
+        try:
+            data = response.json()
+        except ValueError:
+            logger.warning(f"⚠️  留言接口返回非JSON: {response.text[:200]}")
+            return None
+        ret = (data.get('base_resp') or {}).get('ret', 0)
+        if ret != 0:
+            logger.warning(f"⚠️  留言接口返回 ret={ret}")
+            return None
+        return data
+
+    def _map(self, func, items: List) -> List:
+        """并发执行（结果按输入顺序返回）"""
+        if len(items) <= 1 or self.concurrency == 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(items)),
+                                thread_name_prefix='comments') as pool:
+            return list(pool.map(func, items))
+
+    def fetch(self, article_url: str, comment_id: str, with_replies: bool = True) -> CommentSet:
+        """
+        获取文章的全部精选留言（及回复）
+
+        Parameters
+        ----------
+        article_url : str
+            文章URL（用于取 __biz、mid、idx）
+        comment_id : str
+            页面中的 comment_id（PageMetadata.comment_id）
+        with_replies : bool
+            是否分页获取留言下的全部回复
+
+        Returns
+        -------
+        CommentSet
+            获取结果；部分页面失败时 errors > 0，complete 为 False
+        """
+        comment_set = CommentSet(comment_id=str(comment_id or ''))
+        if not comment_id:
+            return comment_set
+
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(article_url).query)
+        article_params = {
+            '__biz': query.get('__biz', [''])[0],
+            'appmsgid': query.get('mid', [''])[0],
+            'idx': query.get('idx', ['1'])[0],
+            'comment_id': comment_id
+        }
+
+        def fetch_page(offset: int) -> Optional[Dict]:
+            return self._request({'action': 'getcomment', **article_params,
+                                  'offset': offset, 'limit': self.page_size})
+
+        first = fetch_page(0)
+        comment_set.requests += 1
+        if first is None:
+            comment_set.errors += 1
+            return comment_set
+
+        comment_set.total = first.get('elected_comment_total_cnt') or 0
+        pages = [first]
+        step = len(first.get('elected_comment') or [])
+        if step and comment_set.total > step:
+            offsets = list(range(step, comment_set.total, step))
+            for page in self._map(fetch_page, offsets):
+                comment_set.requests += 1
+                if page is None:
+                    comment_set.errors += 1
+                else:
+                    pages.append(page)
+
+        # 合并各页（按 content_id 去重，保持接口顺序）
+        seen = set()
+        for page in pages:
+            for item in page.get('elected_comment') or []:
+                comment = Comment.from_api(item)
+                key = comment.content_id or id(item)
+                if key not in seen:
+                    seen.add(key)
+                    comment_set.comments.append(comment)
+        comment_set.total = max(comment_set.total, len(comment_set.comments))
+
+        if with_replies:
+            incomplete = [comment for comment in comment_set.comments
+                          if comment.content_id and not comment.replies_complete]
+            for requests, errors in self._map(lambda comment: self._fetch_replies(article_params, comment),
+                                              incomplete):
+                comment_set.requests += requests
+                comment_set.errors += errors
+        return comment_set
+
+    def _fetch_replies(self, article_params: Dict, comment: Comment):
+        """分页获取一条留言的全部回复（替换 comment.replies），返回 (请求数, 失败数)"""
+        replies = []
+        seen = set()
+        requests = errors = 0
+        offset = 0
+        while True:
+            params = {'action': 'getcommentreply', **article_params,
+                      'content_id': comment.content_id, 'offset': offset, 'limit': self.page_size}
+            if comment.max_reply_id is not None:
+                params['max_reply_id'] = comment.max_reply_id
+            data = self._request(params)
+            requests += 1
+            if data is None:
+                errors += 1
+                break
+            # reply_list 可能直接是列表，也可能是 {'reply_list': [...]}
+            reply_list = data.get('reply_list') or []
+            if isinstance(reply_list, dict):
+                reply_list = reply_list.get('reply_list') or []
+            if not reply_list:
+                break
+            for item in reply_list:
+                reply = CommentReply.from_api(item)
+                key = reply.reply_id if reply.reply_id is not None else id(item)
+                if key not in seen:
+                    seen.add(key)
+                    replies.append(reply)
+            offset += len(reply_list)
+            if offset >= comment.reply_total or not data.get('continue_flag', 1):
+                break
+
+        if len(replies) >= len(comment.replies):
+            comment.replies = replies
+        comment.reply_total = max(comment.reply_total, len(comment.replies))
+        return requests, errors
+
+
+def fetch_comments(article_url: str, comment_id: str, credentials: Dict[str, str],
+                   with_replies: bool = True) -> CommentSet:
+    """CommentsClient(credentials).fetch(...) 的简写"""
+    return CommentsClient(credentials).fetch(article_url, comment_id, with_replies=with_replies)
@@ -0,0 +1,112 @@
+# coding: utf-8
+"""
+统计数据快照压缩脚本
+对 article_stat_snapshots 中较旧的快照降采样，控制表的增长：
+- 最近 2 天：保留全部快照
+- 2 ~ 30 天：每篇文章每小时保留最后一个快照
+- 30 ~ 180 天：每篇文章每天保留最后一个快照
+- 180 天以前：每篇文章每周保留最后一个快照
+
+统计数据只增不减，时间段内最后一个快照就代表该时间段的值。
+按主键顺序分批扫描并删除，可重复执行（已压缩的数据不会再变化），适合定时运行
+"""
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import select, tuple_
+from database import engine
+from models import ArticleStatSnapshot
+from db_operations import stat_bucket_start
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 5000
+
+# (快照早于多久, 保留粒度)，按时间从近到远排列
+COMPACTION_TIERS = [
+    (timedelta(days=2), 'hour'),
+    (timedelta(days=30), 'day'),
+    (timedelta(days=180), 'week'),
+]
+
+
+def _bucket_for(captured_at: datetime, now: datetime):
+    """快照应归入的 (粒度, 时间段起点)；不需要压缩时返回 None"""
+    bucket = None
+    for age, granularity in COMPACTION_TIERS:
+        if now - captured_at > age:
+            bucket = granularity
+    if bucket is None:
+        return None
+    return bucket, stat_bucket_start(captured_at, bucket)
+
+
+def compact_stat_snapshots(now: datetime = None, batch_size: int = BATCH_SIZE) -> dict:
+    """
+    降采样旧快照
+
+    Parameters
+    ----------
+    now : datetime, optional
+        计算快照年龄的基准时间，默认当前时间
+    batch_size : int
+        每批扫描的行数
+
+    Returns
+    -------
+    dict
+        {'scanned': int, 'deleted': int}
+    """
+    now = now or datetime.now()
+    cutoff = now - COMPACTION_TIERS[0][0]
+    stats = {'scanned': 0, 'deleted': 0}
+    table = ArticleStatSnapshot.__table__
+    key_columns = (table.c.article_id, table.c.captured_at)
+
+    last_key = None
+    previous = None  # 上一行的 (主键, 所属时间段)，跨批次保留
+    while True:
+        stmt = select(*key_columns).where(table.c.captured_at < cutoff)
+        if last_key:
+            stmt = stmt.where(tuple_(*key_columns) > last_key)
+        stmt = stmt.order_by(*key_columns).limit(batch_size)
+
+        with engine.begin() as conn:
+            rows = conn.execute(stmt).all()
+            if not rows:
+                break
+            last_key = tuple(rows[-1])
+
+            # 按 (article_id, captured_at) 升序扫描：同一时间段内后面还有快照时，前一个就可以删掉
+            to_delete = []
+            for row in rows:
+                key = tuple(row)
+                group = (row.article_id, _bucket_for(row.captured_at, now))
+                if previous and previous[1] == group:
+                    to_delete.append(previous[0])
+                previous = (key, group)
+
+            if to_delete:
+                conn.execute(table.delete().where(tuple_(*key_columns).in_(to_delete)))
+            stats['scanned'] += len(rows)
+            stats['deleted'] += len(to_delete)
+        logger.info(f"   已扫描 {stats['scanned']} 个快照，删除 {stats['deleted']} 个")
+
+    return stats
+
+
+def main():
+    logger.info("开始压缩统计数据快照...")
+    try:
+        stats = compact_stat_snapshots()
+        logger.info("\n✅ 压缩完成！")
+        logger.info(f"  - 扫描: {stats['scanned']} 个快照")
+        logger.info(f"  - 删除: {stats['deleted']} 个快照")
+    except Exception as e:
+        logger.error(f"❌ 压缩失败: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == '__main__':
+    main()
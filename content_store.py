@@ -0,0 +1,95 @@
+# coding: utf-8
+"""
+文章HTML压缩存储
+HTML正文单独存放在 article_contents 表中并压缩保存，articles 表只保留窄字段
+
+压缩算法：安装了 zstandard 时使用 zstd，否则使用标准库的 gzip
+每行记录自己的压缩算法，两种数据可以共存
+"""
+import codecs
+import zlib
+from typing import Iterator, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ENCODING_GZIP = 'gzip'
+ENCODING_ZSTD = 'zstd'
+DEFAULT_ENCODING = ENCODING_ZSTD if zstandard else ENCODING_GZIP
+
+# 流式解压时每次读取的压缩数据大小
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def compress_html(html: str, encoding: str = DEFAULT_ENCODING) -> Tuple[bytes, str]:
+    """
+    压缩HTML
+
+    Parameters
+    ----------
+    html : str
+        HTML文本
+    encoding : str
+        压缩算法（gzip / zstd）
+
+    Returns
+    -------
+    (bytes, str)
+        压缩后的数据、实际使用的压缩算法
+    """
+    raw = html.encode('utf-8')
+    if encoding == ENCODING_ZSTD and zstandard:
+        return zstandard.ZstdCompressor(level=3).compress(raw), ENCODING_ZSTD
+    gzip_compress = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    return gzip_compress.compress(raw) + gzip_compress.flush(), ENCODING_GZIP
+
+
+def iter_decompressed_html(data: bytes, encoding: str,
+                           chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[str]:
+    """
+    流式解压HTML，逐块返回文本，避免一次性生成完整的大字符串
+
+    Parameters
+    ----------
+    data : bytes
+        压缩数据
+    encoding : str
+        压缩算法（gzip / zstd）
+    chunk_size : int
+        每次送入解压器的压缩数据大小
+
+    Yields
+    ------
+    str
+        解压后的文本块
+    """
+    if encoding == ENCODING_ZSTD:
+        if not zstandard:
+            raise RuntimeError("该文章使用 zstd 压缩，请先安装 zstandard: pip install zstandard")
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+        flush = None
+    elif encoding == ENCODING_GZIP:
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        flush = decompressor.flush
+    else:
+        raise ValueError(f"未知的压缩算法: {encoding}")
+
+    # 多字节的UTF-8字符可能被切在两块之间，用增量解码器拼接
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    view = memoryview(data)
+    for start in range(0, len(view), chunk_size):
+        text = decoder.decode(decompressor.decompress(view[start:start + chunk_size]))
+        if text:
+            yield text
+    tail = decoder.decode(flush() if flush else b'', final=True)
+    if tail:
+        yield tail
+
+
+def decompress_html(data: Optional[bytes], encoding: str) -> Optional[str]:
+    """解压完整HTML"""
+    if data is None:
+        return None
+    return ''.join(iter_decompressed_html(data, encoding))
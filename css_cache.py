@@ -0,0 +1,239 @@
+# coding: utf-8
+"""
+外部CSS缓存
+下载文章HTML时要把 <link rel=stylesheet> 内联进去，而所有文章引用的都是同样几个微信CSS文件，
+批量抓取时同一个CSS会被重复下载成千上万次。这里按URL缓存CSS：
+- 内容按 SHA-256 存在磁盘上（cache/css/objects/<sha256>.css），不同URL内容相同时只存一份；
+  URL -> 内容摘要、ETag、Last-Modified、上次验证时间 记录在 cache/css/index.json
+- 进程内 LRU 缓存最近使用的CSS文本
+- 上次验证后 REVALIDATE_SECONDS 秒内直接使用缓存；超过后带 If-None-Match / If-Modified-Since
+  重新请求，304 时继续使用缓存（网络失败时也使用旧的缓存）
+- 同一URL同时只有一个线程在下载，其他线程等待后直接读缓存
+
+这样一次批量抓取中，每个CSS在每个验证周期内只请求一次
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import http_client
+
+logger = logging.getLogger(__name__)
+
+CSS_CACHE_DIR = os.path.join('cache', 'css')
+REVALIDATE_SECONDS = 3600
+MEMORY_CACHE_SIZE = 64
+CSS_TIMEOUT = 10
+
+_lock = threading.Lock()
+_url_locks = {}
+_memory = OrderedDict()  # url -> CSS文本
+_index = None  # url -> {'sha256', 'encoding', 'etag', 'last_modified', 'checked_at'}
+_stats = {'lookups': 0, 'memory_hits': 0, 'disk_hits': 0, 'revalidated': 0,
+          'downloads': 0, 'stale': 0, 'failures': 0}
+
+
+def _count(field: str):
+    with _lock:
+        _stats[field] += 1
+
+
+def _index_path() -> str:
+    return os.path.join(CSS_CACHE_DIR, 'index.json')
+
+
+def _object_path(digest: str) -> str:
+    return os.path.join(CSS_CACHE_DIR, 'objects', f"{digest}.css")
+
+
+def _load_index() -> Dict[str, Dict]:
+    """读取磁盘上的URL索引（只读一次，之后在内存中维护）"""
+    global _index
+    with _lock:
+        if _index is None:
+            try:
+                with open(_index_path(), 'r', encoding='utf-8') as f:
+                    _index = json.load(f)
+            except (OSError, ValueError):
+                _index = {}
+        return _index
+
+
+def _save_index():
+    """原子地写回URL索引"""
+    with _lock:
+        data = json.dumps(_index, ensure_ascii=False, indent=1)
+    os.makedirs(CSS_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{_index_path()}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(data)
+    os.replace(tmp_path, _index_path())
+
+
+def _remember(url: str, text: str):
+    with _lock:
+        _memory[url] = text
+        _memory.move_to_end(url)
+        while len(_memory) > MEMORY_CACHE_SIZE:
+            _memory.popitem(last=False)
+
+
+def _read_cached(url: str, entry: Dict, count_hit: bool = True) -> Optional[str]:
+    """取缓存的CSS文本（先查内存，再读磁盘）；count_hit 为真时记为缓存命中"""
+    with _lock:
+        text = _memory.get(url)
+        if text is not None:
+            _memory.move_to_end(url)
+            if count_hit:
+                _stats['memory_hits'] += 1
+            return text
+    try:
+        with open(_object_path(entry['sha256']), 'rb') as f:
+            text = f.read().decode(entry.get('encoding') or 'utf-8', errors='replace')
+    except OSError:
+        return None
+    _remember(url, text)
+    if count_hit:
+        _count('disk_hits')
+    return text
+
+
+def _store(url: str, response) -> str:
+    """保存下载到的CSS，返回文本"""
+    content = response.content
+    digest = hashlib.sha256(content).hexdigest()
+    path = _object_path(digest)
+    if not os.path.isfile(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    # 微信的CSS不带 charset，按 UTF-8 解码（requests 默认会当作 ISO-8859-1）
+    encoding = response.encoding if 'charset' in response.headers.get('Content-Type', '') else 'utf-8'
+    with _lock:
+        _index[url] = {
+            'sha256': digest,
+            'encoding': encoding,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'checked_at': time.time()
+        }
+    _save_index()
+    text = content.decode(encoding, errors='replace')
+    _remember(url, text)
+    return text
+
+
+def _url_lock(url: str) -> threading.Lock:
+    with _lock:
+        return _url_locks.setdefault(url, threading.Lock())
+
+
+def get_css(url: str, headers: Dict = None, proxies: Dict = None) -> Optional[str]:
+    """
+    获取CSS文本（优先使用缓存）
+
+    Parameters
+    ----------
+    url : str
+        CSS的完整URL
+    headers : dict, optional
+        请求头（需要下载或重新验证时使用）
+    proxies : dict, optional
+        代理设置
+
+    Returns
+    -------
+    str or None
+        CSS文本，下载失败且没有缓存时返回 None
+    """
+    index = _load_index()
+    _count('lookups')
+    with _url_lock(url):
+        with _lock:
+            entry = dict(index[url]) if url in index else None
+
+        if entry and time.time() - entry.get('checked_at', 0) < REVALIDATE_SECONDS:
+            text = _read_cached(url, entry)
+            if text is not None:
+                return text
+            entry = None  # 磁盘上的内容丢失，重新下载
+
+        request_headers = dict(headers or {})
+        if entry:
+            if entry.get('etag'):
+                request_headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                request_headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            response = http_client.get(url, headers=request_headers, proxies=proxies, timeout=CSS_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"⚠️  下载CSS失败: {url[:50]}... - {e}")
+            response = None
+
+        if response is not None and response.status_code == 304 and entry:
+            text = _read_cached(url, entry, count_hit=False)
+            if text is not None:
+                with _lock:
+                    index[url]['checked_at'] = time.time()
+                    _stats['revalidated'] += 1
+                _save_index()
+                return text
+        elif response is not None and response.status_code == 200:
+            _count('downloads')
+            return _store(url, response)
+
+        # 下载失败：有旧缓存就继续使用
+        if entry:
+            text = _read_cached(url, entry, count_hit=False)
+            if text is not None:
+                _count('stale')
+                return text
+        _count('failures')
+        return None
+
+
+def normalize_css_url(href: str) -> Optional[str]:
+    """把 <link> 的 href 补全为完整URL，无法处理的返回 None"""
+    if not href:
+        return None
+    if href.startswith('//'):
+        return 'https:' + href
+    if href.startswith('/'):
+        return 'https://mp.weixin.qq.com' + href
+    if href.startswith('http'):
+        return href
+    return None
+
+
+def css_cache_stats() -> Dict:
+    """
+    CSS缓存统计
+
+    Returns
+    -------
+    dict
+        lookups（查询次数）、memory_hits / disk_hits（未发请求）、revalidated（304）、
+        downloads（完整下载）、stale（下载失败时使用旧缓存）、failures，
+        hit_rate 为未重新下载内容的比例
+    """
+    with _lock:
+        stats = dict(_stats)
+    served = stats['memory_hits'] + stats['disk_hits'] + stats['revalidated'] + stats['stale']
+    stats['network_requests'] = stats['revalidated'] + stats['downloads'] + stats['stale'] + stats['failures']
+    stats['hit_rate'] = round(served / stats['lookups'], 3) if stats['lookups'] else None
+    return stats
+
+
+def reset_css_cache_stats():
+    """清零统计（批量任务开始前调用）"""
+    with _lock:
+        for field in _stats:
+            _stats[field] = 0
@@ -45,7 +45,7 @@ def get_db_session():
         session.close()
 def init_db():
     """初始化数据库（创建所有表）"""
-    from models import Account, Parameter, Article
+    from models import Account, Parameter, Article, ArticleContent, FetchCoverage, ArticleStatSnapshot, ListingCursor
     Base.metadata.create_all(bind=engine)
     logger.info("✅ 数据库表已创建")
 def test_connection():
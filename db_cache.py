@@ -0,0 +1,190 @@
+# coding: utf-8
+"""
+数据库查询缓存
+在 db_operations 前面加一层进程内的 LRU + TTL 缓存，用于单篇文章接口的热路径：
+- 公众号名称 -> BIZ
+- BIZ -> 有效参数（只缓存查到的参数；save_parameters / invalidate_parameters 会清除）
+- 文章 -> 元数据和获取时间（用于判断是否新鲜；保存文章时会清除）
+
+参数可能被其他进程（抓包进程）更新，所以缓存有效期都比较短
+"""
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from database import get_db_session
+from models import Account
+from db_operations import (
+    get_valid_parameters,
+    get_or_create_account,
+    get_article_with_freshness,
+    get_article_html
+)
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """线程安全的 LRU + TTL 缓存"""
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl_seconds: float = 300):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """读取缓存，过期或不存在时返回 default"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at = entry
+                if expires_at > datetime.now():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        """写入缓存，超过容量时淘汰最久未使用的条目"""
+        with self._lock:
+            self._data[key] = (value, datetime.now() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """删除一个条目"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        """删除所有 predicate(key, value) 为真的条目"""
+        with self._lock:
+            for key in [key for key, (value, _) in self._data.items() if predicate(key, value)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / total, 3) if total else None
+            }
+
+
+parameters_cache = TTLCache('parameters', maxsize=256, ttl_seconds=60)
+account_biz_cache = TTLCache('account_biz', maxsize=1024, ttl_seconds=600)
+account_name_cache = TTLCache('account_name', maxsize=1024, ttl_seconds=600)
+article_meta_cache = TTLCache('article_meta', maxsize=2048, ttl_seconds=300)
+
+_ALL_CACHES = (parameters_cache, account_biz_cache, account_name_cache, article_meta_cache)
+
+
+def cache_stats() -> Dict[str, Dict]:
+    """各缓存的命中/未命中计数"""
+    return {cache.name: cache.stats() for cache in _ALL_CACHES}
+
+
+def clear_caches():
+    """清空所有缓存"""
+    for cache in _ALL_CACHES:
+        cache.clear()
+
+
+def evict_parameters(biz: str):
+    """参数变化时清除该BIZ的缓存"""
+    parameters_cache.invalidate(biz)
+
+
+def evict_articles(article_ids):
+    """文章更新后清除对应的元数据缓存（同一篇文章可能以短链接、完整URL等多个键缓存）"""
+    article_ids = set(article_ids)
+    if article_ids:
+        article_meta_cache.invalidate_where(lambda url, article: article and article.get('id') in article_ids)
+
+
+def get_cached_parameters(biz: str) -> Optional[Dict]:
+    """get_valid_parameters 的缓存版本（查不到时不缓存，抓包进程随时可能写入新参数）"""
+    params = parameters_cache.get(biz)
+    if params is None:
+        params = get_valid_parameters(biz)
+        if params:
+            parameters_cache.set(biz, params)
+    return params
+
+
+def get_cached_biz_by_account_name(account_name: str) -> Tuple[Optional[str], Optional[Dict]]:
+    """
+    db_helpers.get_biz_by_account_name 的缓存版本
+
+    Returns
+    -------
+    tuple
+        (biz, params)，公众号不存在时返回 (None, None)
+    """
+    biz = account_biz_cache.get(account_name)
+    if biz is None:
+        with get_db_session() as session:
+            account = session.query(Account.biz).filter(Account.name == account_name).first()
+        if not account:
+            logger.warning(f"⚠️  未找到公众号: {account_name}")
+            return None, None
+        biz = account.biz
+        account_biz_cache.set(account_name, biz)
+        account_name_cache.set(biz, account_name)
+    return biz, get_cached_parameters(biz)
+
+
+def ensure_account(biz: str, name: str = None):
+    """
+    get_or_create_account 的缓存版本：账号已知且名称没变时不访问数据库
+    """
+    cached_name = account_name_cache.get(biz, _MISSING)
+    if cached_name is not _MISSING and (not name or name == cached_name):
+        return
+    account = get_or_create_account(biz, name)
+    account_name_cache.set(biz, account['name'])
+    if account['name']:
+        account_biz_cache.set(account['name'], biz)
+
+
+def get_cached_article_with_freshness(url: str, max_age_hours: int = 24,
+                                      include_html: bool = False) -> Tuple[Optional[Dict], bool]:
+    """
+    get_article_with_freshness 的缓存版本
+
+    元数据命中缓存时不访问数据库；需要HTML正文且文章新鲜时再读一次正文
+    """
+    article = article_meta_cache.get(url)
+    if article is None:
+        article, is_fresh = get_article_with_freshness(url, max_age_hours, include_html)
+        if not article:
+            return None, False
+        article_meta_cache.set(url, {key: value for key, value in article.items() if key != 'html_content'})
+        return article, is_fresh
+
+    fetched_at = article.get('fetched_at')
+    is_fresh = bool(fetched_at) and \
+        datetime.now() - datetime.fromisoformat(fetched_at) < timedelta(hours=max_age_hours)
+    if include_html and is_fresh:
+        article = {**article, 'html_content': get_article_html(article['url'])}
+    return article, is_fresh
@@ -3,14 +3,79 @@
 数据库操作函数
 提供账号、参数、文章的CRUD操作
 """
-from datetime import datetime, timedelta
-from typing import Optional, List, Dict
-from sqlalchemy import and_, or_
+from datetime import datetime, timedelta, date
+from typing import Optional, List, Dict, Iterator, Tuple, Set
+from sqlalchemy import and_, or_, func, select, insert, update, tuple_, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from database import get_db_session
-from models import Account, Parameter, Article
+from models import Account, Parameter, Article, ArticleContent, FetchCoverage, ArticleStatSnapshot, ListingCursor
+from content_store import compress_html, iter_decompressed_html, STREAM_CHUNK_SIZE
+from article_key import canonical_article_key
+import base64
+import hashlib
+import json
 import logging
 import re
 logger = logging.getLogger(__name__)
+# 批量保存时参与脏检查的统计字段
+ARTICLE_STAT_FIELDS = ('read_count', 'old_like_count', 'like_count', 'share_count', 'comment_count')
+# 批量保存时"新值为空则保留旧值"的字段
+ARTICLE_MERGE_FIELDS = ('title', 'url', 'short_url', 'content_hash',
+                        'publish_date', 'local_html_path') + ARTICLE_STAT_FIELDS
+# 列表查询可返回的字段（与 Article.to_dict 一致，不含HTML正文）
+ARTICLE_LIST_FIELDS = ('id', 'biz', 'url', 'short_url', 'title', 'publish_date') + ARTICLE_STAT_FIELDS + \
+    ('local_html_path', 'fetched_at')
+# 统计曲线支持的时间粒度
+STAT_CURVE_BUCKETS = ('hour', 'day', 'week')
+# 已列出的日期区间在多少小时内视为新鲜（超过后会重新从微信API列出）
+COVERAGE_MAX_AGE_HOURS = 24
+def normalize_publish_date(value) -> Optional[date]:
+    """
+    将各种形式的发布日期统一为 date
+    
+    支持 date / datetime / 时间戳 / 'YYYY-MM-DD' 开头的字符串，无法解析返回None
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value).date()
+    try:
+        return date.fromisoformat(str(value).strip()[:10])
+    except ValueError:
+        logger.warning(f"⚠️  无法解析发布日期: {value}")
+        return None
+def _content_hash(html_content: Optional[str]) -> Optional[str]:
+    """计算HTML内容的SHA-256，内容为空返回None"""
+    if not html_content:
+        return None
+    return hashlib.sha256(html_content.encode('utf-8')).hexdigest()
+def _article_content_hash(article_data: Dict) -> Optional[str]:
+    """文章数据的内容哈希：调用方已算好（article_data['content_hash']，如 ArticleDocument 写文件时）就直接使用"""
+    if not article_data.get('html_content'):
+        return None
+    return article_data.get('content_hash') or _content_hash(article_data['html_content'])
+def _article_lookup_clause(url: str, biz: str = None):
+    """
+    构造按URL查找文章的过滤条件：精确URL 或 规范化键 (biz, mid, idx, sn)
+    
+    两个分支分别命中 url 唯一索引和 uq_articles_biz_mid_idx_sn 索引
+    """
+    conditions = [Article.url == url]
+    article_key = canonical_article_key(url)
+    if article_key:
+        key_biz, mid, idx, sn = article_key
+        conditions.append(and_(
+            Article.biz == (biz or key_biz),
+            Article.mid == mid,
+            Article.idx == idx,
+            Article.sn == sn
+        ))
+    return or_(*conditions)
 def get_or_create_account(biz: str, name: str = None) -> Dict:
     """
     获取或创建公众号
@@ -99,12 +164,16 @@ def save_parameters(biz: str, params: Dict) -> Dict:
         session.flush()
         
         logger.info(f"✅ 保存参数: {biz}")
-        return {
+        result = {
             'id': parameter.id,
             'biz': parameter.biz,
             'is_valid': parameter.is_valid,
             'captured_at': parameter.captured_at
         }
+    
+    from db_cache import evict_parameters
+    evict_parameters(biz)
+    return result
 def get_valid_parameters(biz: str) -> Optional[Dict]:
     """
     获取有效参数
@@ -157,6 +226,9 @@ def invalidate_parameters(biz: str):
         ).update({'is_valid': False})
         
         logger.info(f"✅ 使{count}个参数失效: {biz}")
+    
+    from db_cache import evict_parameters
+    evict_parameters(biz)
 def save_article(article_data: Dict) -> Dict:
     """
     保存文章数据
@@ -173,51 +245,13 @@ def save_article(article_data: Dict) -> Dict:
     """
     with get_db_session() as session:
         # 检查文章是否已存在
-        # 微信文章URL中的chksm等参数会变化，需要用核心参数匹配
-        # 核心参数：__biz + mid + idx + sn
+        # 微信文章URL中的chksm等参数会变化，按精确URL或规范化键 (biz, mid, idx, sn) 匹配，走索引一次查询
         logger.debug(f"查询文章: BIZ={article_data['biz']}, title={article_data.get('title')}, url={article_data['url'][:50] if article_data.get('url') else 'None'}...")
         
-        # 提取URL核心参数
-        def extract_core_params(url):
-            """提取URL的核心参数 (biz, mid, idx, sn)"""
-            if not url:
-                return None
-            import re
-            params = {}
-            # 提取__biz, mid, idx, sn
-            for key in ['__biz', 'mid', 'idx', 'sn']:
-                if key == '__biz':
-                    pattern = r'__biz=([^&]+)'
-                else:
-                    pattern = rf'{key}=([^&]+)'
-                match = re.search(pattern, url)
-                if match:
-                    params[key] = match.group(1)
-            return params if len(params) >= 3 else None  # 至少要有3个参数
-        
-        new_params = extract_core_params(article_data['url'])
-        
-        # 先尝试精确URL匹配
         article = session.query(Article).filter(
-            Article.biz == article_data['biz'],
-            Article.url == article_data['url']
+            _article_lookup_clause(article_data['url'], article_data['biz'])
         ).first()
         
-        # 如果没找到，尝试核心参数匹配
-        if not article and new_params:
-            existing_articles = session.query(Article).filter(
-                Article.biz == article_data['biz']
-            ).all()
-            
-            for existing in existing_articles:
-                existing_params = extract_core_params(existing.url)
-                if existing_params and all(
-                    existing_params.get(k) == v for k, v in new_params.items()
-                ):
-                    article = existing
-                    logger.debug(f"  通过核心参数匹配到文章: mid={new_params.get('mid')}")
-                    break
-        
         logger.debug(f"查询结果: {'找到现有文章' if article else '未找到,将创建新文章'}")
         
         if article:
@@ -225,8 +259,15 @@ def save_article(article_data: Dict) -> Dict:
             article.title = article_data.get('title') or article.title
             article.url = article_data.get('url') or article.url
             article.short_url = article_data.get('short_url') or article.short_url
-            article.html_content = article_data.get('html_content') or article.html_content
-            article.publish_date = article_data.get('publish_date') or article.publish_date
+            new_hash = _article_content_hash(article_data)
+            if new_hash and new_hash != article.content_hash:
+                # 只有HTML确实变化时才重新压缩写入
+                if article.content:
+                    article.content.set_html(article_data['html_content'])
+                else:
+                    article.content = ArticleContent.from_html(article_data['html_content'])
+                article.content_hash = new_hash
+            article.publish_date = normalize_publish_date(article_data.get('publish_date')) or article.publish_date
             article.read_count = article_data.get('read_count', article.read_count)
             article.old_like_count = article_data.get('old_like_count', article.old_like_count)
             article.like_count = article_data.get('like_count', article.like_count)
@@ -242,8 +283,8 @@ def save_article(article_data: Dict) -> Dict:
                 url=article_data['url'],
                 short_url=article_data.get('short_url'),
                 title=article_data.get('title'),
-                html_content=article_data.get('html_content'),
-                publish_date=article_data.get('publish_date'),
+                content_hash=_article_content_hash(article_data),
+                publish_date=normalize_publish_date(article_data.get('publish_date')),
                 read_count=article_data.get('read_count'),
                 old_like_count=article_data.get('old_like_count'),
                 like_count=article_data.get('like_count'),
@@ -251,6 +292,8 @@ def save_article(article_data: Dict) -> Dict:
                 comment_count=article_data.get('comment_count'),
                 local_html_path=article_data.get('local_html_path')
             )
+            if article_data.get('html_content'):
+                article.content = ArticleContent.from_html(article_data['html_content'])
             session.add(article)
             logger.info(f"✅ 保存新文章: {article.title}")
         
@@ -261,6 +304,14 @@ def save_article(article_data: Dict) -> Dict:
         article_id = article.id
         logger.info(f"文章ID: {article_id}")
         
+        if any(article_data.get(field) is not None for field in ARTICLE_STAT_FIELDS):
+            _append_stat_snapshots(session, [{
+                'article_id': article_id,
+                'biz': article.biz,
+                'captured_at': article.fetched_at or datetime.now(),
+                **{field: getattr(article, field) for field in ARTICLE_STAT_FIELDS}
+            }])
+        
         # 在返回前再次查询确认
         verify = session.query(Article).filter(Article.id == article_id).first()
         if verify:
@@ -272,18 +323,325 @@ def save_article(article_data: Dict) -> Dict:
         try:
             result = article.to_dict()
             logger.debug(f"✓ to_dict() 成功")
-            return result
         except Exception as e:
             logger.error(f"✗ to_dict() 失败: {e}")
             import traceback
             traceback.print_exc()
             # 即使to_dict失败，也返回基本信息
-            return {
+            result = {
                 'id': article.id,
                 'title': article.title,
                 'biz': article.biz
             }
-def get_article(url: str) -> Optional[Dict]:
+    
+    # 事务提交后再清除缓存，避免并发请求在提交前把旧数据重新缓存
+    from db_cache import evict_articles
+    evict_articles([article_id])
+    return result
+def _bulk_article_row(article_data: Dict) -> Dict:
+    """将文章数据字典转换为批量写入用的行（补齐规范化键和内容哈希）"""
+    article_key = canonical_article_key(article_data['url'])
+    mid, idx, sn = article_key[1:] if article_key else (None, None, None)
+    return {
+        'biz': article_data['biz'],
+        'url': article_data['url'],
+        'mid': mid,
+        'idx': idx,
+        'sn': sn,
+        'short_url': article_data.get('short_url'),
+        'title': article_data.get('title'),
+        'content_hash': _article_content_hash(article_data),
+        'publish_date': normalize_publish_date(article_data.get('publish_date')),
+        'read_count': article_data.get('read_count'),
+        'old_like_count': article_data.get('old_like_count'),
+        'like_count': article_data.get('like_count'),
+        'share_count': article_data.get('share_count'),
+        'comment_count': article_data.get('comment_count'),
+        'local_html_path': article_data.get('local_html_path'),
+        'fetched_at': datetime.now()
+    }
+def _bulk_row_identity(row: Dict):
+    """批量写入时用于去重和回填结果的标识：有规范化键用键，否则用URL"""
+    if row['mid'] is not None:
+        return ('key', row['biz'], row['mid'], row['idx'], row['sn'])
+    return ('url', row['url'])
+def _upsert_articles_postgres(session, rows: List[Dict]) -> Dict:
+    """
+    PostgreSQL: INSERT ... ON CONFLICT DO UPDATE ... WHERE <有变化>
+    
+    统计数据和内容哈希都没变的行不会被改写，也不会出现在 RETURNING 中
+    """
+    statuses = {}
+    keyed_rows = [row for row in rows if row['mid'] is not None]
+    url_rows = [row for row in rows if row['mid'] is None]
+    
+    for batch, conflict_columns in ((keyed_rows, ['biz', 'mid', 'idx', 'sn']), (url_rows, ['url'])):
+        if not batch:
+            continue
+        stmt = pg_insert(Article).values(batch)
+        excluded = stmt.excluded
+        set_values = {
+            field: func.coalesce(getattr(excluded, field), getattr(Article, field))
+            for field in ARTICLE_MERGE_FIELDS
+        }
+        set_values['fetched_at'] = excluded.fetched_at
+        changed = or_(*[
+            getattr(Article, field).is_distinct_from(
+                func.coalesce(getattr(excluded, field), getattr(Article, field))
+            )
+            for field in ARTICLE_STAT_FIELDS + ('content_hash',)
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=conflict_columns,
+            set_=set_values,
+            where=changed
+        ).returning(
+            Article.id, Article.biz, Article.url, Article.mid, Article.idx, Article.sn,
+            (literal_column('xmax') == 0).label('inserted')
+        )
+        for result in session.execute(stmt):
+            identity = _bulk_row_identity(result._asdict())
+            statuses[identity] = (result.id, 'inserted' if result.inserted else 'updated')
+    return statuses
+def _upsert_articles_generic(session, rows: List[Dict]) -> Dict:
+    """
+    其他数据库（SQLite）: 一次查询取出已存在的行，在Python中做脏检查，
+    再分别批量 INSERT / UPDATE
+    """
+    statuses = {}
+    keys = [(row['biz'], row['mid'], row['idx'], row['sn']) for row in rows if row['mid'] is not None]
+    urls = [row['url'] for row in rows]
+    conditions = [Article.url.in_(urls)]
+    if keys:
+        conditions.append(tuple_(Article.biz, Article.mid, Article.idx, Article.sn).in_(keys))
+    
+    columns = [Article.id, Article.biz, Article.mid, Article.idx, Article.sn] + \
+        [getattr(Article, field) for field in ARTICLE_MERGE_FIELDS]
+    existing_by_identity = {}
+    existing_by_url = {}
+    for existing in session.query(*columns).filter(or_(*conditions)):
+        existing = existing._asdict()
+        existing_by_identity[_bulk_row_identity(existing)] = existing
+        existing_by_url[existing['url']] = existing
+    
+    new_rows = []
+    changed_rows = []
+    for row in rows:
+        identity = _bulk_row_identity(row)
+        existing = existing_by_identity.get(identity) or existing_by_url.get(row['url'])
+        if not existing:
+            new_rows.append(row)
+            continue
+        merged = {
+            field: row[field] if row[field] is not None else existing.get(field)
+            for field in ARTICLE_MERGE_FIELDS
+        }
+        if all(merged[field] == existing[field] for field in ARTICLE_STAT_FIELDS + ('content_hash',)):
+            statuses[identity] = (existing['id'], 'unchanged')
+            continue
+        changed_rows.append({'id': existing['id'], **merged, 'fetched_at': row['fetched_at']})
+        statuses[identity] = (existing['id'], 'updated')
+    
+    if new_rows:
+        inserted = session.execute(
+            insert(Article).returning(Article.id, sort_by_parameter_order=True),
+            new_rows
+        )
+        for row, article_id in zip(new_rows, inserted.scalars()):
+            statuses[_bulk_row_identity(row)] = (article_id, 'inserted')
+    if changed_rows:
+        session.execute(update(Article), changed_rows)
+    return statuses
+def _append_stat_snapshots(session, snapshots: List[Dict]):
+    """
+    批量追加统计数据快照（同一篇文章同一时刻已有快照时跳过）
+    
+    Parameters
+    ----------
+    session : Session
+        数据库会话
+    snapshots : List[dict]
+        {'article_id', 'biz', 'captured_at', 'read_count', ...}
+    """
+    if not snapshots:
+        return
+    dialect = session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        dialect_insert = pg_insert if dialect == 'postgresql' else sqlite_insert
+        session.execute(dialect_insert(ArticleStatSnapshot).on_conflict_do_nothing(), snapshots)
+    else:
+        session.execute(insert(ArticleStatSnapshot), snapshots)
+def _store_article_contents(session, contents: Dict[int, str]):
+    """
+    批量写入（或替换）文章HTML正文
+    
+    Parameters
+    ----------
+    session : Session
+        数据库会话
+    contents : dict
+        {article_id: html}
+    """
+    if not contents:
+        return
+    rows = []
+    for article_id, html in contents.items():
+        data, encoding = compress_html(html)
+        rows.append({
+            'article_id': article_id,
+            'encoding': encoding,
+            'data': data,
+            'raw_size': len(html.encode('utf-8')),
+            'updated_at': datetime.now()
+        })
+    
+    dialect = session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        dialect_insert = pg_insert if dialect == 'postgresql' else sqlite_insert
+        stmt = dialect_insert(ArticleContent).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['article_id'],
+            set_={field: getattr(stmt.excluded, field) for field in ('encoding', 'data', 'raw_size', 'updated_at')}
+        )
+        session.execute(stmt)
+    else:
+        for row in rows:
+            session.merge(ArticleContent(**row))
+def save_articles_bulk(articles_data: List[Dict]) -> List[Dict]:
+    """
+    批量保存文章（一次事务、一次往返写入整页文章）
+    
+    - PostgreSQL 使用 INSERT ... ON CONFLICT (biz, mid, idx, sn) DO UPDATE
+    - 其他数据库（SQLite）使用等价的"查询 + 批量插入/更新"
+    - 统计数据和内容哈希都没有变化的行不会被改写
+    - 字段为空时保留数据库中的旧值（与 save_article 一致）
+    
+    Parameters
+    ----------
+    articles_data : List[dict]
+        文章数据字典列表，格式同 save_article
+    
+    Returns
+    -------
+    List[dict]
+        与输入顺序一致的结果列表：{'id': int, 'url': str, 'status': 'inserted' | 'updated' | 'unchanged'}
+    """
+    if not articles_data:
+        return []
+    
+    rows = [_bulk_article_row(article_data) for article_data in articles_data]
+    
+    # 同一批中重复的文章只保留最后一条（ON CONFLICT 不允许同一行被更新两次）
+    unique_rows = {}
+    html_by_identity = {}
+    for row, article_data in zip(rows, articles_data):
+        identity = _bulk_row_identity(row)
+        unique_rows[identity] = row
+        if article_data.get('html_content'):
+            html_by_identity[identity] = article_data['html_content']
+        else:
+            html_by_identity.pop(identity, None)
+    
+    with get_db_session() as session:
+        # HTML正文单独存放：先取出已有的内容哈希，只有哈希变化的文章才重新压缩写入
+        stored_hashes = {}
+        if html_by_identity:
+            for existing in session.query(Article.biz, Article.url, Article.mid, Article.idx, Article.sn, Article.content_hash).filter(
+                or_(*[_article_lookup_clause(unique_rows[identity]['url'], unique_rows[identity]['biz']) for identity in html_by_identity])
+            ):
+                existing = existing._asdict()
+                stored_hashes[_bulk_row_identity(existing)] = existing['content_hash']
+                stored_hashes[('url', existing['url'])] = existing['content_hash']
+        
+        if session.get_bind().dialect.name == 'postgresql':
+            statuses = _upsert_articles_postgres(session, list(unique_rows.values()))
+        else:
+            statuses = _upsert_articles_generic(session, list(unique_rows.values()))
+        
+        # ON CONFLICT 的 WHERE 不成立时不返回行：这些就是未变化的已存在文章
+        missing = [row for row in unique_rows.values() if _bulk_row_identity(row) not in statuses]
+        if missing:
+            for existing in session.query(Article.id, Article.biz, Article.url, Article.mid, Article.idx, Article.sn).filter(
+                or_(*[_article_lookup_clause(row['url'], row['biz']) for row in missing])
+            ):
+                existing = existing._asdict()
+                for identity in (_bulk_row_identity(existing), ('url', existing['url'])):
+                    statuses.setdefault(identity, (existing['id'], 'unchanged'))
+        
+        contents = {}
+        for identity, html in html_by_identity.items():
+            article_id, status = statuses.get(identity, (None, 'unchanged'))
+            if article_id is None or status == 'unchanged':
+                continue
+            row = unique_rows[identity]
+            old_hash = stored_hashes.get(identity, stored_hashes.get(('url', row['url'])))
+            if status == 'inserted' or old_hash != row['content_hash']:
+                contents[article_id] = html
+        _store_article_contents(session, contents)
+        
+        # 每次获取到统计数据都追加一个快照（即使数值没变，也是曲线上的一个点）
+        snapshots = []
+        for identity, row in unique_rows.items():
+            article_id = statuses.get(identity, (None, None))[0]
+            if article_id is None or all(row[field] is None for field in ARTICLE_STAT_FIELDS):
+                continue
+            snapshots.append({
+                'article_id': article_id,
+                'biz': row['biz'],
+                'captured_at': row['fetched_at'],
+                **{field: row[field] for field in ARTICLE_STAT_FIELDS}
+            })
+        _append_stat_snapshots(session, snapshots)
+    
+    results = []
+    for row in rows:
+        article_id, status = statuses.get(_bulk_row_identity(row), (None, 'unchanged'))
+        results.append({'id': article_id, 'url': row['url'], 'status': status})
+    
+    # 事务已提交：清除所有写入过的文章的缓存
+    from db_cache import evict_articles
+    evict_articles(r['id'] for r in results if r['id'] is not None and r['status'] != 'unchanged')
+    
+    counts = {status: sum(1 for r in results if r['status'] == status) for status in ('inserted', 'updated', 'unchanged')}
+    logger.info(f"✅ 批量保存 {len(results)} 篇文章: 新增 {counts['inserted']}, 更新 {counts['updated']}, 未变化 {counts['unchanged']}")
+    return results
+def new_save_counts() -> Dict[str, int]:
+    """save_articles_with_fallback 的计数：新增/更新/未变化（批量写入），逐篇保存/失败（整批失败时）"""
+    return {'inserted': 0, 'updated': 0, 'unchanged': 0, 'saved_individually': 0, 'failed': 0}
+def save_articles_with_fallback(articles_data: List[Dict], save_counts: Dict[str, int] = None) -> Dict[str, int]:
+    """
+    批量保存文章，整批失败（如其中一篇数据有问题）时逐篇 save_article，不连累同批的其它文章
+    
+    Parameters
+    ----------
+    articles_data : List[dict]
+        文章数据字典列表（同 save_articles_bulk）
+    save_counts : dict, optional
+        累加结果的计数（new_save_counts()），不传时新建
+    
+    Returns
+    -------
+    dict
+        save_counts
+    """
+    if save_counts is None:
+        save_counts = new_save_counts()
+    if not articles_data:
+        return save_counts
+    try:
+        for saved in save_articles_bulk(articles_data):
+            save_counts[saved['status']] += 1
+    except Exception as e:
+        logger.warning(f"   ⚠️  批量保存 {len(articles_data)} 篇文章失败，改为逐篇保存: {e}")
+        for article_data in articles_data:
+            try:
+                save_article(article_data)
+                save_counts['saved_individually'] += 1
+            except Exception as e:
+                save_counts['failed'] += 1
+                logger.warning(f"   ⚠️  保存文章失败: {article_data.get('title')}: {e}")
+    return save_counts
+def get_article(url: str, include_html: bool = False) -> Optional[Dict]:
     """
     根据URL获取文章（支持短链接和完整URL）
     
@@ -291,6 +649,8 @@ def get_article(url: str) -> Optional[Dict]:
     ----------
     url : str
         文章URL（短链接或完整URL）
+    include_html : bool
+        是否同时读取并解压HTML正文（默认只读取窄字段）
     
     Returns
     -------
@@ -298,23 +658,122 @@ def get_article(url: str) -> Optional[Dict]:
         文章字典，如果不存在返回None
     """
     with get_db_session() as session:
-        # 同时查找完整URL和短链接
+        # 同时查找完整URL、规范化键和短链接
         article = session.query(Article).filter(
             or_(
-                Article.url == url,
+                _article_lookup_clause(url),
                 Article.short_url == url
             )
         ).first()
-        return article.to_dict() if article else None
+        return article.to_dict(include_html=include_html) if article else None
+def _get_article_content_blob(url: str):
+    """查询文章的压缩HTML，返回 (data, encoding)，不存在返回 None"""
+    with get_db_session() as session:
+        row = session.query(ArticleContent.data, ArticleContent.encoding).join(
+            Article, Article.id == ArticleContent.article_id
+        ).filter(
+            or_(
+                _article_lookup_clause(url),
+                Article.short_url == url
+            )
+        ).first()
+        return (row.data, row.encoding) if row else None
+def iter_article_html(url: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[str]:
+    """
+    流式读取文章HTML正文（逐块解压，适合直接写入文件或HTTP响应）
+    
+    Parameters
+    ----------
+    url : str
+        文章URL（短链接或完整URL）
+    chunk_size : int
+        每次解压的压缩数据大小
+    
+    Yields
+    ------
+    str
+        HTML文本块；文章或正文不存在时不产生任何数据
+    """
+    blob = _get_article_content_blob(url)
+    if not blob:
+        return
+    data, encoding = blob
+    yield from iter_decompressed_html(data, encoding, chunk_size)
+def get_article_html(url: str) -> Optional[str]:
+    """
+    读取文章完整HTML正文
+    
+    Parameters
+    ----------
+    url : str
+        文章URL（短链接或完整URL）
+    
+    Returns
+    -------
+    str or None
+        HTML正文，不存在返回None
+    """
+    blob = _get_article_content_blob(url)
+    if not blob:
+        return None
+    return ''.join(iter_decompressed_html(*blob))
+def _encode_article_cursor(publish_date, article_id: int) -> str:
+    """把 (publish_date, id) 编码为不透明的分页游标"""
+    raw = json.dumps([publish_date.isoformat() if publish_date else None, article_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+def decode_article_cursor(cursor: str):
+    """解析分页游标，返回 (publish_date, id)；格式错误抛出 ValueError"""
+    try:
+        publish_date, article_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return (date.fromisoformat(publish_date) if publish_date else None), int(article_id)
+    except Exception:
+        raise ValueError(f"无效的分页游标: {cursor}")
+def _serialize_article_value(value):
+    """与 Article.to_dict 保持一致：日期时间转为ISO字符串"""
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+def get_known_article_keys(biz: str, keys: List[Tuple[int, int]]) -> Set[Tuple[int, int]]:
+    """
+    查询一批 (mid, idx) 中已入库的部分
+    
+    走 (biz, mid, idx, sn) 唯一索引的前缀，查询代价只与传入的键数量有关
+    
+    Parameters
+    ----------
+    biz : str
+        公众号BIZ
+    keys : List[Tuple[int, int]]
+        待查询的 (mid, idx) 列表
+    
+    Returns
+    -------
+    Set[Tuple[int, int]]
+        已存在的 (mid, idx)
+    """
+    if not keys:
+        return set()
+    with get_db_session() as session:
+        rows = session.query(Article.mid, Article.idx).filter(
+            Article.biz == biz,
+            tuple_(Article.mid, Article.idx).in_(list(keys))
+        ).all()
+    return {(row.mid, row.idx) for row in rows}
 def get_articles_by_filters(
     biz: str,
     start_date: datetime = None,
     end_date: datetime = None,
-    min_read_count: int = None
+    min_read_count: int = None,
+    limit: int = None,
+    cursor: str = None,
+    fields: List[str] = None
 ) -> List[Dict]:
     """
     根据过滤条件获取文章列表
     
+    只查询需要的列（不加载ORM对象），按 (publish_date DESC, id DESC) 排序，
+    配合 cursor 做键集分页：每一页都是一次索引范围扫描，与偏移量无关
+    
     Parameters
     ----------
     biz : str
@@ -325,31 +784,123 @@ def get_articles_by_filters(
         结束日期
     min_read_count : int, optional
         最小阅读数
+    limit : int, optional
+        最多返回的文章数（默认不限制）
+    cursor : str, optional
+        上一页返回的 next_cursor，从该位置之后继续
+    fields : List[str], optional
+        需要返回的字段（取值见 ARTICLE_LIST_FIELDS，默认全部）
     
     Returns
     -------
     List[dict]
         文章字典列表
     """
+    return get_articles_page(biz, start_date, end_date, min_read_count,
+                             limit=limit, cursor=cursor, fields=fields)['articles']
+def get_articles_page(
+    biz: str,
+    start_date: datetime = None,
+    end_date: datetime = None,
+    min_read_count: int = None,
+    limit: int = None,
+    cursor: str = None,
+    fields: List[str] = None
+) -> Dict:
+    """
+    分页获取文章列表（参数同 get_articles_by_filters）
+    
+    Returns
+    -------
+    dict
+        {'articles': List[dict], 'next_cursor': str or None}
+        next_cursor 为空表示没有更多数据
+    """
+    fields = list(fields) if fields else list(ARTICLE_LIST_FIELDS)
+    unknown = [field for field in fields if field not in ARTICLE_LIST_FIELDS]
+    if unknown:
+        raise ValueError(f"不支持的字段: {', '.join(unknown)}")
+    
+    # 游标需要 publish_date 和 id，即使调用方没有请求这两个字段也要查询
+    columns = [Article.id, Article.publish_date] + \
+        [getattr(Article, field) for field in fields if field not in ('id', 'publish_date')]
+    stmt = select(*columns).where(Article.biz == biz)
+    
+    # publish_date 是 DATE 类型，配合 (biz, publish_date DESC) 索引做范围扫描
+    if start_date:
+        stmt = stmt.where(Article.publish_date >= normalize_publish_date(start_date))
+    if end_date:
+        stmt = stmt.where(Article.publish_date <= normalize_publish_date(end_date))
+    if min_read_count is not None:
+        stmt = stmt.where(Article.read_count >= min_read_count)
+    
+    if cursor:
+        cursor_date, cursor_id = decode_article_cursor(cursor)
+        if cursor_date is None:
+            # 没有发布日期的文章排在最后
+            stmt = stmt.where(Article.publish_date.is_(None), Article.id < cursor_id)
+        else:
+            stmt = stmt.where(or_(
+                Article.publish_date < cursor_date,
+                and_(Article.publish_date == cursor_date, Article.id < cursor_id),
+                Article.publish_date.is_(None)
+            ))
+    
+    stmt = stmt.order_by(Article.publish_date.desc().nullslast(), Article.id.desc())
+    if limit is not None:
+        # 多取一行用于判断是否还有下一页
+        stmt = stmt.limit(limit + 1)
+    
     with get_db_session() as session:
-        query = session.query(Article).filter(Article.biz == biz)
-        
-        # publish_date在数据库中是字符串，需要转换为字符串比较
-        if start_date:
-            start_date_str = start_date.strftime('%Y-%m-%d')
-            query = query.filter(Article.publish_date >= start_date_str)
-        
-        if end_date:
-            end_date_str = end_date.strftime('%Y-%m-%d')
-            query = query.filter(Article.publish_date <= end_date_str)
-        
-        if min_read_count is not None:
-            query = query.filter(Article.read_count >= min_read_count)
-        
-        articles = query.order_by(Article.publish_date.desc()).all()
+        rows = session.execute(stmt).all()
+    
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_article_cursor(rows[-1].publish_date, rows[-1].id)
+    
+    articles = [
+        {field: _serialize_article_value(getattr(row, field)) for field in fields}
+        for row in rows
+    ]
+    logger.info(f"✅ 查询到{len(articles)}篇文章")
+    return {'articles': articles, 'next_cursor': next_cursor}
+def get_article_with_freshness(url: str, max_age_hours: int = 24,
+                               include_html: bool = False) -> Tuple[Optional[Dict], bool]:
+    """
+    一次查询同时取出文章和它是否新鲜
+    
+    Parameters
+    ----------
+    url : str
+        文章URL（短链接或完整URL）
+    max_age_hours : int
+        最大年龄（小时）
+    include_html : bool
+        文章新鲜时是否同时读取HTML正文（不新鲜时调用方会重新抓取，不读取）
+    
+    Returns
+    -------
+    (dict or None, bool)
+        文章字典（不存在为None）、是否新鲜
+    """
+    with get_db_session() as session:
+        article = session.query(Article).filter(
+            or_(
+                _article_lookup_clause(url),
+                Article.short_url == url
+            )
+        ).first()
+        if not article:
+            return None, False
         
-        logger.info(f"✅ 查询到{len(articles)}篇文章")
-        return [article.to_dict() for article in articles]
+        is_fresh = bool(article.fetched_at) and \
+            datetime.now() - article.fetched_at < timedelta(hours=max_age_hours)
+        if is_fresh:
+            logger.info(f"✅ 文章数据新鲜: {url[:50]}... (获取于 {article.fetched_at})")
+        else:
+            logger.info(f"⚠️  文章数据过期: {url[:50]}... (获取于 {article.fetched_at})")
+        return article.to_dict(include_html=include_html and is_fresh), is_fresh
 def is_article_fresh(url: str, max_age_hours: int = 24) -> bool:
     """
     检查文章数据是否新鲜（最近获取过）
@@ -366,21 +917,248 @@ def is_article_fresh(url: str, max_age_hours: int = 24) -> bool:
     bool
         是否新鲜
     """
-    article = get_article(url)
-    if not article or not article.get('fetched_at'):
-        return False
+    return get_article_with_freshness(url, max_age_hours)[1]
+def record_fetch_coverage(biz: str, start_date, end_date, listed_at: datetime = None):
+    """
+    记录某公众号的一个日期区间已从 profile_ext 完整列出
     
-    # fetched_at 可能是字符串或datetime
-    fetched_at = article.get('fetched_at')
-    if isinstance(fetched_at, str):
-        fetched_at = datetime.fromisoformat(fetched_at)
+    同一公众号的区间保持互不重叠：被新区间完全覆盖的旧记录删除，
+    部分重叠的旧记录裁掉重叠部分，这样每一段都保留自己真实的列出时间
     
-    age = datetime.now() - fetched_at
-    is_fresh = age < timedelta(hours=max_age_hours)
+    Parameters
+    ----------
+    biz : str
+        公众号BIZ
+    start_date : date or datetime
+        区间起始日期（含）
+    end_date : date or datetime
+        区间结束日期（含）
+    listed_at : datetime, optional
+        列出时间，默认当前时间
+    """
+    start_date = normalize_publish_date(start_date)
+    end_date = normalize_publish_date(end_date)
+    if not start_date or not end_date or start_date > end_date:
+        return
+    listed_at = listed_at or datetime.now()
+    one_day = timedelta(days=1)
     
-    if is_fresh:
-        logger.info(f"✅ 文章数据新鲜: {url[:50]}... (获取于 {fetched_at})")
-    else:
-        logger.info(f"⚠️  文章数据过期: {url[:50]}... (获取于 {fetched_at})")
+    with get_db_session() as session:
+        overlapping = session.query(FetchCoverage).filter(
+            FetchCoverage.biz == biz,
+            FetchCoverage.start_date <= end_date,
+            FetchCoverage.end_date >= start_date
+        ).all()
+        for old in overlapping:
+            if old.start_date < start_date and old.end_date > end_date:
+                # 旧区间包住新区间：拆成左右两段
+                session.add(FetchCoverage(biz=biz, start_date=end_date + one_day,
+                                          end_date=old.end_date, listed_at=old.listed_at))
+                old.end_date = start_date - one_day
+            elif old.start_date < start_date:
+                old.end_date = start_date - one_day
+            elif old.end_date > end_date:
+                old.start_date = end_date + one_day
+            else:
+                session.delete(old)
+        session.add(FetchCoverage(biz=biz, start_date=start_date, end_date=end_date, listed_at=listed_at))
+    logger.info(f"✅ 已记录列表覆盖区间: {biz} {start_date} ~ {end_date}")
+def get_uncovered_ranges(
+    biz: str,
+    start_date,
+    end_date,
+    max_age_hours: float = COVERAGE_MAX_AGE_HOURS
+) -> List[Tuple[date, date]]:
+    """
+    计算日期范围内尚未被（新鲜的）列表覆盖的区间
+    
+    只查询与目标范围相交、且列出时间在 max_age_hours 内的区间，
+    按起始日期排序后合并相邻区间，剩下的空隙就是需要重新列出的部分。
+    今天之后的日期还不可能有文章，不计入缺口
     
-    return is_fresh
+    Parameters
+    ----------
+    biz : str
+        公众号BIZ
+    start_date : date or datetime
+        开始日期（含）
+    end_date : date or datetime
+        结束日期（含）
+    max_age_hours : float
+        覆盖记录的有效期（小时）
+    
+    Returns
+    -------
+    List[Tuple[date, date]]
+        按日期升序排列的缺口区间 (start, end)，为空表示已完整覆盖
+    """
+    start_date = normalize_publish_date(start_date)
+    end_date = min(normalize_publish_date(end_date), date.today())
+    if start_date > end_date:
+        return []
+    
+    with get_db_session() as session:
+        intervals = session.query(FetchCoverage.start_date, FetchCoverage.end_date).filter(
+            FetchCoverage.biz == biz,
+            FetchCoverage.start_date <= end_date,
+            FetchCoverage.end_date >= start_date,
+            FetchCoverage.listed_at >= datetime.now() - timedelta(hours=max_age_hours)
+        ).order_by(FetchCoverage.start_date).all()
+    
+    gaps = []
+    cursor = start_date
+    for interval_start, interval_end in intervals:
+        if interval_start > cursor:
+            gaps.append((cursor, interval_start - timedelta(days=1)))
+        cursor = max(cursor, interval_end + timedelta(days=1))
+        if cursor > end_date:
+            break
+    if cursor <= end_date:
+        gaps.append((cursor, end_date))
+    return gaps
+def get_listing_cursor(biz: str) -> Optional[Dict]:
+    """
+    读取公众号的文章列表游标
+    
+    Returns
+    -------
+    dict or None
+        run_id、mode、next_offset、last_msg_time、range_start、range_end、completed、updated_at，
+        没有游标时返回None
+    """
+    with get_db_session() as session:
+        cursor = session.get(ListingCursor, biz)
+        if cursor is None:
+            return None
+        return {column.name: getattr(cursor, column.name) for column in ListingCursor.__table__.columns}
+def save_listing_cursor(biz: str, run_id: str, mode: str, next_offset: int, last_msg_time: datetime = None,
+                        range_start=None, range_end=None, completed: bool = False):
+    """
+    保存公众号的文章列表游标（每个公众号一行，每列完一页覆盖一次）
+    
+    Parameters
+    ----------
+    biz : str
+        公众号BIZ
+    run_id : str
+        列表运行ID
+    mode : str
+        incremental / backfill
+    next_offset : int
+        下一页的 profile_ext offset
+    last_msg_time : datetime, optional
+        已列出的最早一条消息的发布时间
+    range_start, range_end : date or datetime, optional
+        本次运行的日期范围
+    completed : bool
+        是否已正常列完
+    """
+    with get_db_session() as session:
+        cursor = session.get(ListingCursor, biz)
+        if cursor is None:
+            cursor = ListingCursor(biz=biz)
+            session.add(cursor)
+        cursor.run_id = run_id
+        cursor.mode = mode
+        cursor.next_offset = next_offset
+        cursor.last_msg_time = last_msg_time
+        cursor.range_start = normalize_publish_date(range_start)
+        cursor.range_end = normalize_publish_date(range_end)
+        cursor.completed = completed
+        cursor.updated_at = datetime.now()
+def stat_bucket_start(captured_at: datetime, bucket: str) -> datetime:
+    """返回快照所在时间段的起点（bucket: hour / day / week，周从周一开始）"""
+    if bucket == 'hour':
+        return captured_at.replace(minute=0, second=0, microsecond=0)
+    day_start = captured_at.replace(hour=0, minute=0, second=0, microsecond=0)
+    if bucket == 'day':
+        return day_start
+    if bucket == 'week':
+        return day_start - timedelta(days=day_start.weekday())
+    raise ValueError(f"不支持的时间粒度: {bucket}")
+def get_article_stat_curve(article_id: int, start: datetime = None, end: datetime = None) -> List[Dict]:
+    """
+    获取单篇文章的统计数据曲线
+    
+    按主键 (article_id, captured_at) 做一次索引范围扫描
+    
+    Parameters
+    ----------
+    article_id : int
+        文章ID
+    start : datetime, optional
+        起始时间（含）
+    end : datetime, optional
+        结束时间（含）
+    
+    Returns
+    -------
+    List[dict]
+        按时间升序排列的快照 {'captured_at': str, 'read_count': int, ...}
+    """
+    stmt = select(ArticleStatSnapshot.captured_at, *[getattr(ArticleStatSnapshot, field) for field in ARTICLE_STAT_FIELDS]) \
+        .where(ArticleStatSnapshot.article_id == article_id)
+    if start:
+        stmt = stmt.where(ArticleStatSnapshot.captured_at >= start)
+    if end:
+        stmt = stmt.where(ArticleStatSnapshot.captured_at <= end)
+    
+    with get_db_session() as session:
+        rows = session.execute(stmt.order_by(ArticleStatSnapshot.captured_at)).all()
+    return [{key: _serialize_article_value(value) for key, value in row._asdict().items()} for row in rows]
+def get_account_stat_curve(biz: str, start: datetime = None, end: datetime = None,
+                           bucket: str = 'day') -> List[Dict]:
+    """
+    获取公众号的统计数据曲线（所有文章的合计）
+    
+    按 (biz, captured_at) 索引做一次范围扫描，边读边按时间段汇总：
+    每个时间段取每篇文章最后一次快照，没有新快照的文章沿用之前的值
+    
+    Parameters
+    ----------
+    biz : str
+        公众号BIZ
+    start : datetime, optional
+        起始时间（含）
+    end : datetime, optional
+        结束时间（含）
+    bucket : str
+        时间粒度：hour / day / week
+    
+    Returns
+    -------
+    List[dict]
+        按时间升序排列 {'bucket': str, 'articles': int, 'read_count': int, ...}
+    """
+    if bucket not in STAT_CURVE_BUCKETS:
+        raise ValueError(f"不支持的时间粒度: {bucket}")
+    stmt = select(ArticleStatSnapshot.article_id, ArticleStatSnapshot.captured_at,
+                  *[getattr(ArticleStatSnapshot, field) for field in ARTICLE_STAT_FIELDS]) \
+        .where(ArticleStatSnapshot.biz == biz)
+    if start:
+        stmt = stmt.where(ArticleStatSnapshot.captured_at >= start)
+    if end:
+        stmt = stmt.where(ArticleStatSnapshot.captured_at <= end)
+    stmt = stmt.order_by(ArticleStatSnapshot.captured_at)
+    
+    curve = []
+    latest = {}  # article_id -> 最近一次快照的统计数据
+    current_bucket = None
+    
+    def emit():
+        point = {'bucket': current_bucket.isoformat(), 'articles': len(latest)}
+        for field in ARTICLE_STAT_FIELDS:
+            point[field] = sum(stats[field] or 0 for stats in latest.values())
+        curve.append(point)
+    
+    with get_db_session() as session:
+        result = session.execute(stmt, execution_options={'yield_per': 1000})
+        for row in result:
+            row_bucket = stat_bucket_start(row.captured_at, bucket)
+            if current_bucket is not None and row_bucket != current_bucket:
+                emit()
+            current_bucket = row_bucket
+            latest[row.article_id] = {field: getattr(row, field) for field in ARTICLE_STAT_FIELDS}
+    if current_bucket is not None:
+        emit()
+    return curve
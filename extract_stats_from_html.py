@@ -5,9 +5,8 @@
 """
 
 import re
-import time
-import random
-import requests
+import http_client
+from page_metadata import extract_page_metadata
 from typing import Dict, Optional
 
 
@@ -34,14 +33,11 @@ def get_article_html(url: str, headers: Dict, params: Dict = None, max_retries:
     check_nums = 0
     while check_nums < max_retries:
         try:
-            # 添加随机延时，避免请求过快
-            time.sleep(random.uniform(1, 3))
-            
-            # 直接请求，不使用代理
+            # 直接请求，不使用代理（请求频率由 http_client 按凭据限流）
             if params:
-                response = requests.get(url, headers=headers, params=params, timeout=20)
+                response = http_client.get(url, headers=headers, params=params, timeout=20)
             else:
-                response = requests.get(url, headers=headers, timeout=20)
+                response = http_client.get(url, headers=headers, timeout=20)
             
             if response.status_code == 200:
                 return response.text
@@ -61,7 +57,7 @@ def extract_stats_from_html(html: str, title: str = "") -> Dict:
     """
     从 HTML 中提取统计数据
     
-    使用正则表达式从 HTML 中提取：
+    使用 page_metadata 一次扫描从 HTML 中提取：
     - title: 标题
     - nickname: 公众号名称
     - user_name: 公众号ID
@@ -106,113 +102,31 @@ def extract_stats_from_html(html: str, title: str = "") -> Dict:
         return result
     
     try:
-        # 提取标题
-        try:
-            title_match = re.findall(r"var title = '(.*?)';", html)
-            if title_match:
-                result['title'] = title_match[0]
-        except:
-            pass
-        
-        # 提取公众号名称
-        try:
-            nickname_match = re.findall(r'var nickname = htmlDecode\("(.*?)"\);', html)
-            if nickname_match:
-                result['nickname'] = nickname_match[0]
-        except:
-            pass
-        
-        # 提取公众号ID
-        try:
-            user_name_match = re.findall(r'var user_name = "(.*?)";', html)
-            if user_name_match:
-                result['user_name'] = user_name_match[0]
-        except:
-            pass
-        
-        # 提取发布时间
-        try:
-            createTime_match = re.findall(r"var createTime = '(.*?)';", html)
-            if createTime_match:
-                result['createTime'] = createTime_match[0]
-        except:
-            pass
-        
-        # 提取省份
-        try:
-            provinceName_match = re.findall(r"provinceName: '(.*?)'", html)
-            if provinceName_match:
-                result['provinceName'] = provinceName_match[0]
-        except:
-            pass
-        
-        # 提取原创标识
-        try:
-            hit_nickname_match = re.findall(r"hit_nickname: '(.*?)'", html)
-            if hit_nickname_match and hit_nickname_match[0]:
-                result['hit_nickname'] = hit_nickname_match[0]
-            else:
-                result['hit_nickname'] = '原创'
-        except:
-            result['hit_nickname'] = '原创'
-        
-        # 提取阅读数（优先使用 read_num_new）
-        try:
-            read_num_new_match = re.findall(r"var read_num_new = '(.*?)'", html)
-            if read_num_new_match:
-                result['read_num'] = int(read_num_new_match[0]) if read_num_new_match[0] else 0
-            else:
-                read_num_match = re.findall(r"var read_num = '(.*?)'", html)
-                if read_num_match:
-                    result['read_num'] = int(read_num_match[0]) if read_num_match[0] else 0
-        except:
-            result['read_num'] = 0
-        
-        # 提取点赞数（大拇指👍）
-        try:
-            old_like_count_match = re.findall(r"old_like_count: '(.*?)'", html)
-            if old_like_count_match:
-                result['old_like_count'] = int(old_like_count_match[0]) if old_like_count_match[0] else 0
-        except:
-            result['old_like_count'] = 0
-        
-        # 提取喜欢数（爱心❤️）
-        try:
-            like_count_match = re.findall(r"like_count: '(.*?)'", html)
-            if like_count_match:
-                result['like_count'] = int(like_count_match[0]) if like_count_match[0] else 0
-        except:
-            result['like_count'] = 0
-        
-        # 提取分享数
-        try:
-            share_count_match = re.findall(r"share_count: '(.*?)'", html)
-            if share_count_match:
-                result['share_count'] = int(share_count_match[0]) if share_count_match[0] else 0
-        except:
-            result['share_count'] = 0
+        # 一次扫描提取所有字段
+        meta = extract_page_metadata(html)
         
-        # 提取评论数
-        try:
-            comment_count_match = re.findall(r"comment_count: '(.*?)'", html)
-            if comment_count_match:
-                result['comment_count'] = int(comment_count_match[0]) if comment_count_match[0] else 0
-        except:
-            result['comment_count'] = 0
-        
-        # 提取视频标识
-        try:
-            is_mp_video_match = re.findall(r"is_mp_video: '(.*?)'", html)
-            if is_mp_video_match:
-                result['is_mp_video'] = is_mp_video_match[0]
-        except:
-            pass
+        if meta.title is not None:
+            result['title'] = meta.title
+        result['nickname'] = meta.nickname or ''
+        result['user_name'] = meta.user_name or ''
+        result['createTime'] = meta.create_time or ''
+        result['provinceName'] = meta.province_name or ''
+        # 原创标识
+        result['hit_nickname'] = meta.hit_nickname or '原创'
+        # 阅读数（优先使用 read_num_new）
+        result['read_num'] = meta.read_count or 0
+        # 点赞数（大拇指👍）
+        if 'old_like_count' in meta.raw:
+            result['old_like_count'] = meta.old_like_count or 0
+        # 喜欢数（爱心❤️）、分享数、评论数
+        result['like_count'] = meta.like_count or 0
+        result['share_count'] = meta.share_count or 0
+        result['comment_count'] = meta.comment_count or 0
+        if meta.is_mp_video is not None:
+            result['is_mp_video'] = meta.is_mp_video
         
         # 判断文章类型
-        if "video_id: '" in html:
-            result['article_type'] = "视频"
-        else:
-            result['article_type'] = "图文"
+        result['article_type'] = "视频" if meta.has_video else "图文"
         
         result['success'] = True
         
@@ -5,8 +5,8 @@
 """
 import os
 import re
-from bs4 import BeautifulSoup
 import logging
+from html_transforms import add_referrer_meta, apply_transforms
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -35,31 +35,15 @@ def fix_html_referrer(html_file):
             logger.debug(f"   已有 referrer 标签，跳过: {html_file}")
             return False
         
-        # 使用 BeautifulSoup 解析
-        soup = BeautifulSoup(html_content, 'html.parser')
-        
-        # 查找 head 标签
-        head = soup.find('head')
-        if not head:
+        results = {}
+        html_content = apply_transforms(html_content, [add_referrer_meta], results)
+        if not results['add_referrer_meta']:
             logger.warning(f"   未找到 <head> 标签: {html_file}")
             return False
         
-        # 创建 meta 标签
-        meta_tag = soup.new_tag('meta', attrs={
-            'name': 'referrer',
-            'content': 'no-referrer'
-        })
-        
-        # 插入到 head 的开头
-        if head.contents:
-            head.insert(0, meta_tag)
-            head.insert(1, soup.new_string('\n    '))
-        else:
-            head.append(meta_tag)
-        
         # 保存修改后的HTML
         with open(html_file, 'w', encoding='utf-8') as f:
-            f.write(str(soup))
+            f.write(html_content)
         
         return True
         
@@ -1,38 +1,31 @@
 # -*- coding: utf-8 -*-
 """
 改进的留言获取方法
-使用参数化请求来获取comment_id
+使用参数化请求来获取comment_id（已有 comment_id 时直接分页获取留言，见 comments_client）
 """
 
-import re
-import requests
+import urllib.parse
+
+import http_client
+from comments_client import CommentsClient
+from page_metadata import extract_page_metadata
 
 
 def get_comment_id_from_html(html_content):
     """
     从HTML中提取comment_id
-    支持多种格式
+    支持多种格式（var 声明、赋值、JsDecode、DATA），见 page_metadata
     """
-    # 尝试多种正则模式
-    patterns = [
-        r'var comment_id = [\'"](\d+)[\'"]',  # var comment_id = '4288297619342147597'
-        r'comment_id = "(\d+)"',  # 原始格式
-        r'comment_id:\s*JsDecode\([\'"](\d+)[\'"]\)',  # JsDecode格式
-        r"comment_id\.DATA['\)]\s*:\s*'(\d+)'",  # DATA格式
-    ]
-    
-    for pattern in patterns:
-        matches = re.findall(pattern, html_content)
-        if matches:
-            print(f"      ✅ 使用模式匹配到 comment_id: {pattern}")
-            return matches[0]
-    
-    return None
+    comment_id = extract_page_metadata(html_content).comment_id
+    if comment_id:
+        print(f"      ✅ 匹配到 comment_id: {comment_id}")
+    return comment_id
 
 
-def get_comments_with_params(article_url, appmsg_token, cookie, key=None, uin=None, pass_ticket=None):
+def get_comments_with_params(article_url, appmsg_token, cookie, key=None, uin=None, pass_ticket=None,
+                             comment_id=None):
     """
-    使用参数化请求获取留言
+    使用参数化请求获取全部留言（分页、并发，包括回复；见 comments_client）
     
     Parameters
     ----------
@@ -48,103 +41,60 @@ def get_comments_with_params(article_url, appmsg_token, cookie, key=None, uin=No
         用户UIN
     pass_ticket : str, optional
         通行票据
+    comment_id : str, optional
+        已下载页面中的 comment_id；传入时不再下载文章页面
         
     Returns
     -------
     dict
-        留言数据
+        留言数据（elected_comment / elected_comment_total_cnt，回复在每条留言的 reply_new.reply_list 中）
     """
     try:
-        # 1. 使用参数化请求获取HTML
-        print(f"      🔧 使用参数化请求获取comment_id...")
-        
-        # 提取URL参数
-        import urllib.parse
-        parsed = urllib.parse.urlparse(article_url)
-        params = urllib.parse.parse_qs(parsed.query)
-        
-        __biz = params.get('__biz', [''])[0]
-        mid = params.get('mid', [''])[0]
-        idx = params.get('idx', [''])[0]
-        sn = params.get('sn', [''])[0]
-        
-        # 构建参数化URL
-        if key and uin and pass_ticket:
-            full_url = f"{article_url}&key={key}&uin={uin}&pass_ticket={urllib.parse.quote(pass_ticket)}"
-        else:
-            full_url = article_url
-        
-        # 请求HTML
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Cookie': cookie
-        }
-        
-        response = requests.get(full_url, headers=headers)
-        html_content = response.text
-        
-        # 2. 提取comment_id
-        comment_id = get_comment_id_from_html(html_content)
-        
         if not comment_id:
-            print(f"      ⚠️  未找到 comment_id")
-            return {}
+            # 1. 没有 comment_id 时才使用参数化请求获取HTML
+            print(f"      🔧 使用参数化请求获取comment_id...")
+            
+            # 构建参数化URL
+            if key and uin and pass_ticket:
+                full_url = f"{article_url}&key={key}&uin={uin}&pass_ticket={urllib.parse.quote(pass_ticket)}"
+            else:
+                full_url = article_url
+            
+            # 请求HTML
+            headers = {
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+                'Cookie': cookie
+            }
+            
+            response = http_client.get(full_url, headers=headers)
+            
+            # 2. 提取comment_id
+            comment_id = get_comment_id_from_html(response.text)
+            
+            if not comment_id:
+                print(f"      ⚠️  未找到 comment_id")
+                return {}
         
         print(f"      ✅ comment_id: {comment_id}")
         
-        # 3. 请求留言数据（需要带上认证参数）
-        import urllib.parse
-        
-        # 构建留言API URL，带上所有必要参数
-        comment_params = {
-            'action': 'getcomment',
-            '__biz': __biz,
-            'idx': idx,
-            'comment_id': comment_id,
-            'limit': '100'
-        }
-        
-        # 添加认证参数
-        if appmsg_token:
-            comment_params['appmsg_token'] = appmsg_token
-        if key:
-            comment_params['key'] = key
-        if uin:
-            comment_params['uin'] = uin
-        if pass_ticket:
-            comment_params['pass_ticket'] = pass_ticket
-        
-        comment_url = "https://mp.weixin.qq.com/mp/appmsg_comment?" + urllib.parse.urlencode(comment_params)
-        
+        # 3. 分页获取全部留言和回复（需要带上认证参数）
         print(f"      🔧 正在获取留言列表...")
+        credentials = {
+            'appmsg_token': appmsg_token,
+            'key': key,
+            'uin': uin,
+            'pass_ticket': pass_ticket,
+            'cookie': cookie
+        }
+        comment_set = CommentsClient(credentials).fetch(article_url, comment_id)
         
-        # 禁用代理
-        proxies = {"http": None, "https": None}
-        comment_response = requests.get(comment_url, headers=headers, proxies=proxies, timeout=15)
-        
-        # 检查响应
-        if comment_response.status_code != 200:
-            print(f"      ⚠️  留言API返回状态码: {comment_response.status_code}")
-            return {}
-        
-        # 检查响应内容
-        response_text = comment_response.text
-        if not response_text or response_text.strip() == '':
-            print(f"      ⚠️  留言API返回空响应")
-            return {}
-        
-        try:
-            comment_data = comment_response.json()
-        except Exception as json_err:
-            print(f"      ⚠️  留言API返回非JSON: {response_text[:200]}")
+        if not comment_set.comments:
+            print(f"      ⚠️  未获取到留言（失败 {comment_set.errors} 次请求）")
             return {}
         
-        if comment_data.get('elected_comment'):
-            count = len(comment_data.get('elected_comment', []))
-            total = comment_data.get('elected_comment_total_cnt', 0)
-            print(f"      ✅ 成功获取 {count}/{total} 条留言")
-        
-        return comment_data
+        print(f"      ✅ 成功获取 {len(comment_set.comments)}/{comment_set.total} 条留言、"
+              f"{comment_set.reply_count} 条回复")
+        return comment_set.to_dict()
         
     except Exception as e:
         print(f"      ❌ 获取留言失败: {e}")
@@ -152,7 +102,6 @@ def get_comments_with_params(article_url, appmsg_token, cookie, key=None, uin=No
         traceback.print_exc()
         return {}
 
-
 if __name__ == '__main__':
     # 测试
     from params.new_wechat_config import COOKIE, KEY, UIN, PASS_TICKET
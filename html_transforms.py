@@ -0,0 +1,176 @@
+# coding: utf-8
+"""
+文章HTML后处理
+保存文章HTML前要做几步处理：内联外部CSS、把图片的 data-src 换到 src、注入留言区、添加 referrer meta。
+原来每一步都各自用 BeautifulSoup 解析一遍、序列化一遍（留言注入和 referrer 修复还要重新读写文件），
+一篇 1~3 MB 的文章要解析三次。
+
+这里把每一步写成作用在同一棵 lxml 树上的变换（transform），整篇文章只解析一次、序列化一次：
+
+    html = apply_transforms(html, [inline_stylesheets(headers), swap_lazy_images, add_referrer_meta])
+
+变换是 transform(doc) -> 结果 的可调用对象，结果（如处理的数量）记录在 doc.results[变换名称] 中，
+需要参数的变换用工厂函数生成
+"""
+import logging
+from typing import Callable, Dict, Iterable, Optional
+
+import lxml.html
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+Transform = Callable[['HtmlDocument'], object]
+
+
+class HtmlDocument:
+    """解析一次的HTML文档，变换直接修改 tree"""
+
+    def __init__(self, html: str):
+        self.tree = lxml.html.document_fromstring(html)
+        self.doctype = self.tree.getroottree().docinfo.doctype
+        self.results = {}
+
+    @property
+    def head(self):
+        return self.tree.find('head')
+
+    @property
+    def body(self):
+        return self.tree.find('body')
+
+    def serialize(self) -> str:
+        html = lxml.html.tostring(self.tree, encoding='unicode', method='html')
+        return f"{self.doctype}\n{html}" if self.doctype else html
+
+
+def transform_name(transform: Transform) -> str:
+    return getattr(transform, 'transform_name', getattr(transform, '__name__', type(transform).__name__))
+
+
+def apply_transforms(html: str, transforms: Iterable[Transform], results: Dict = None) -> str:
+    """
+    解析一次HTML，依次执行变换，再序列化一次
+
+    Parameters
+    ----------
+    html : str
+        原始HTML
+    transforms : Iterable[callable]
+        变换列表
+    results : dict, optional
+        传入时会写入每个变换的结果（键为变换名称）
+
+    Returns
+    -------
+    str
+        处理后的HTML
+    """
+    doc = HtmlDocument(html)
+    for transform in transforms:
+        doc.results[transform_name(transform)] = transform(doc)
+    if results is not None:
+        results.update(doc.results)
+    return doc.serialize()
+
+
+def _named(name: str, func: Transform) -> Transform:
+    func.transform_name = name
+    return func
+
+
+def inline_stylesheets(headers: Dict = None, proxies: Dict = None,
+                       fetch: Optional[Callable[[str], Optional[str]]] = None) -> Transform:
+    """
+    内联外部CSS：所有 <link rel=stylesheet> 的内容合并为 head 末尾的一个 <style>，并删除这些 <link>
+
+    Parameters
+    ----------
+    headers, proxies : dict, optional
+        下载CSS用的请求头和代理
+    fetch : callable, optional
+        fetch(url) -> CSS文本，默认从 css_cache 读取
+
+    结果为内联的CSS文件数（没有成功获取任何CSS时为 0，<link> 保持不变）
+    """
+    from css_cache import get_css, normalize_css_url
+    if fetch is None:
+        def fetch(url):
+            return get_css(url, headers=headers, proxies=proxies)
+
+    def transform(doc: HtmlDocument) -> int:
+        links = [link for link in doc.tree.iter('link')
+                 if 'stylesheet' in (link.get('rel') or '').lower().split()]
+        if not links:
+            return 0
+        all_css = []
+        for link in links:
+            css_url = normalize_css_url(link.get('href'))
+            if css_url:
+                css_text = fetch(css_url)
+                if css_text is not None:
+                    all_css.append(f"\n/* CSS from: {css_url} */\n")
+                    all_css.append(css_text)
+                    all_css.append("\n")
+        if not all_css or doc.head is None:
+            return 0
+        style = etree.SubElement(doc.head, 'style')
+        style.text = ''.join(all_css)
+        for link in links:
+            link.drop_tree()
+        return len(links)
+
+    return _named('inline_stylesheets', transform)
+
+
+def swap_lazy_images(doc: HtmlDocument) -> int:
+    """把图片的 data-src 设置为 src（微信图片懒加载，离线打开时没有 src）；结果为替换的数量"""
+    replaced = 0
+    for img in doc.tree.iter('img'):
+        data_src = img.get('data-src')
+        if data_src:
+            img.set('src', data_src)
+            replaced += 1
+    return replaced
+
+
+def add_referrer_meta(doc: HtmlDocument) -> bool:
+    """在 head 开头添加 <meta name="referrer" content="no-referrer">（微信图片防盗链）；已有时不重复添加"""
+    head = doc.head
+    if head is None or head.find('meta[@name="referrer"]') is not None:
+        return False
+    meta = etree.Element('meta', name='referrer', content='no-referrer')
+    meta.tail = '\n    '
+    head.insert(0, meta)
+    if head.text is None:
+        head.text = '\n    '
+    return True
+
+
+def inject_comments(comments_data: Dict) -> Transform:
+    """
+    注入留言区：head 末尾加留言区样式，body 末尾加留言区DOM（样式和DOM由 inject_comments_dom 生成）
+
+    结果为注入的留言条数（没有留言或缺少 head/body 时为 0）
+    """
+    from inject_comments_dom import generate_wechat_style_comments, get_comments_css
+
+    def transform(doc: HtmlDocument) -> int:
+        comments_html = generate_wechat_style_comments(comments_data or {})
+        head, body = doc.head, doc.body
+        if not comments_html or head is None or body is None:
+            return 0
+        style = etree.SubElement(head, 'style')
+        style.text = get_comments_css()
+        for fragment in lxml.html.fragments_fromstring(comments_html):
+            if isinstance(fragment, str):
+                # 开头的文本节点接在 body 最后一个元素之后
+                if len(body):
+                    body[-1].tail = (body[-1].tail or '') + fragment
+                else:
+                    body.text = (body.text or '') + fragment
+            else:
+                body.append(fragment)
+        return len(comments_data.get('elected_comment', []))
+
+    return _named('inject_comments', transform)
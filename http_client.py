@@ -0,0 +1,224 @@
+# coding: utf-8
+"""
+共享的HTTP客户端
+所有访问微信（mp.weixin.qq.com、res.wx.qq.com 等）的请求都通过这里发出：
+- 进程内只有一个 requests.Session，按主机分别挂载连接池，连接保持 keep-alive 复用，
+  同一篇文章的 HTML、CSS、留言、统计数据请求不再每次重新握手
+- 默认超时（连接 5 秒 / 读取 15 秒），调用方可以覆盖
+- 请求头模板（桌面浏览器 / 微信内置浏览器 / JSON接口），调用方传入的请求头优先
+- 统计每个主机的请求数和新建连接数（= TCP+TLS 握手次数），用于衡量连接复用效果
+- 微信接口（profile_ext / getappmsgext / 文章页面 / 留言）按凭据自动限流，见 rate_limiter
+
+不使用系统代理（抓包时系统代理指向本地的 MITM 代理），也不在会话中保存 Cookie：
+Cookie 由调用方按公众号放在请求头中，避免不同公众号的凭据混在一起
+"""
+import threading
+from collections import defaultdict
+from http.cookiejar import DefaultCookiePolicy
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+
+from rate_limiter import classify_url, extract_uin, limiter, throttle_reason
+
+# 默认超时：(连接, 读取) 秒
+DEFAULT_TIMEOUT = (5, 15)
+
+# 每个主机保持的空闲连接数（文章详情会并发请求 mp.weixin.qq.com，其他主机只有少量CSS/图片）
+HOST_POOL_SIZES = {
+    'https://mp.weixin.qq.com': 16,
+    'https://res.wx.qq.com': 4,
+    'https://mmbiz.qpic.cn': 4,
+}
+DEFAULT_POOL_SIZE = 4
+
+HEADER_PROFILES = {
+    # 桌面浏览器：下载文章HTML、CSS
+    'desktop': {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+        'Accept-Encoding': 'gzip, deflate',
+        'Upgrade-Insecure-Requests': '1',
+    },
+    # 微信内置浏览器：profile_ext 等接口只认微信的 User-Agent
+    'wechat': {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36 MicroMessenger/3.4.0',
+        'Accept': 'application/json, text/javascript, */*; q=0.01',
+        'X-Requested-With': 'XMLHttpRequest',
+    },
+    # 移动端：getappmsgext 统计数据接口
+    'mobile': {
+        'User-Agent': 'Mozilla/5.0 AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0Chrome/57.0.2987.132 MQQBrowser/6.2 Mobile',
+    },
+}
+
+_stats_lock = threading.Lock()
+_host_stats = defaultdict(lambda: {'requests': 0, 'new_connections': 0})
+
+
+def _count(host: str, field: str):
+    with _stats_lock:
+        _host_stats[host][field] += 1
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        _count(self.host, 'new_connections')
+        return super()._new_conn()
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        _count(self.host, 'new_connections')
+        return super()._new_conn()
+
+
+class _PooledAdapter(HTTPAdapter):
+    """连接池会记录新建连接数的 HTTPAdapter"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _CountingHTTPConnectionPool,
+            'https': _CountingHTTPSConnectionPool,
+        }
+
+    def send(self, request, **kwargs):
+        _count(urlsplit(request.url).hostname or '', 'requests')
+        return super().send(request, **kwargs)
+
+
+def _create_session() -> requests.Session:
+    session = requests.Session()
+    session.trust_env = False
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    for prefix in ('http://', 'https://'):
+        session.mount(prefix, _PooledAdapter(pool_connections=16, pool_maxsize=DEFAULT_POOL_SIZE))
+    for prefix, size in HOST_POOL_SIZES.items():
+        session.mount(prefix, _PooledAdapter(pool_connections=1, pool_maxsize=size))
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """进程内共享的 Session（第一次调用时创建）"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _create_session()
+    return _session
+
+
+def build_headers(profile: str = 'desktop', cookie: str = None, **extra) -> Dict[str, str]:
+    """
+    按模板生成请求头
+
+    Parameters
+    ----------
+    profile : str
+        模板名称：desktop / wechat / mobile
+    cookie : str, optional
+        Cookie
+    **extra
+        额外的请求头（下划线会转换为连字符，如 X_Requested_With）
+
+    Returns
+    -------
+    dict
+        请求头
+    """
+    headers = dict(HEADER_PROFILES[profile])
+    if cookie:
+        headers['Cookie'] = cookie
+    for name, value in extra.items():
+        headers[name.replace('_', '-')] = value
+    return headers
+
+
+def request(method: str, url: str, profile: Optional[str] = None, headers: Dict = None,
+            timeout=DEFAULT_TIMEOUT, rate_limit: bool = True, **kwargs) -> requests.Response:
+    """
+    通过共享连接池发送请求
+
+    Parameters
+    ----------
+    method : str
+        GET / POST
+    url : str
+        请求地址
+    profile : str, optional
+        请求头模板，与 headers 合并（headers 优先）
+    headers : dict, optional
+        请求头
+    timeout : float or tuple
+        超时时间，默认 DEFAULT_TIMEOUT
+    rate_limit : bool
+        微信接口是否经过限流（默认是），按 (uin, 接口类别) 取令牌，并根据响应调整速率
+    **kwargs
+        传给 requests 的其他参数（params、data、proxies、allow_redirects 等）
+    """
+    if profile:
+        headers = {**HEADER_PROFILES[profile], **(headers or {})}
+    endpoint = classify_url(url) if rate_limit else None
+    if endpoint is None:
+        return get_session().request(method, url, headers=headers, timeout=timeout, **kwargs)
+
+    uin = extract_uin(url, kwargs.get('params'), kwargs.get('data'), headers)
+    limiter.acquire(uin, endpoint)
+    try:
+        response = get_session().request(method, url, headers=headers, timeout=timeout, **kwargs)
+    except (requests.Timeout, requests.ConnectionError) as e:
+        limiter.report(uin, endpoint, type(e).__name__)
+        raise
+    limiter.report(uin, endpoint, throttle_reason(response))
+    return response
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    """GET 请求，参数同 request"""
+    return request('GET', url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    """POST 请求，参数同 request"""
+    return request('POST', url, **kwargs)
+
+
+def connection_stats() -> Dict:
+    """
+    连接复用统计
+
+    Returns
+    -------
+    dict
+        {'requests', 'new_connections', 'reused', 'reuse_rate', 'by_host': {host: {...}}}
+        new_connections 即 TCP+TLS 握手次数，reused 为复用已有连接的请求数
+    """
+    with _stats_lock:
+        by_host = {host: dict(stats) for host, stats in _host_stats.items()}
+    total_requests = sum(stats['requests'] for stats in by_host.values())
+    total_connections = sum(stats['new_connections'] for stats in by_host.values())
+    for stats in by_host.values():
+        stats['reused'] = max(stats['requests'] - stats['new_connections'], 0)
+    reused = max(total_requests - total_connections, 0)
+    return {
+        'requests': total_requests,
+        'new_connections': total_connections,
+        'reused': reused,
+        'reuse_rate': round(reused / total_requests, 3) if total_requests else None,
+        'by_host': by_host
+    }
+
+
+def reset_connection_stats():
+    """清零统计（批量任务开始前调用，便于单独统计一次运行）"""
+    with _stats_lock:
+        _host_stats.clear()
@@ -0,0 +1,96 @@
+# coding: utf-8
+"""
+增量列表同步
+逐页列出公众号文章时判断哪些文章已入库、何时可以停止
+
+- 用URL中的 (mid, idx) 判断文章是否已存在（标题会重复，不能用来判断）
+- 每列出一页只对这一页的文章做一次索引查询，不需要预先加载该公众号的全部历史
+- 可以指定"缺口区间"：缺口内遇到已存在的文章只跳过、不停止，保证缺口被完整列出
+"""
+from datetime import date
+from typing import Iterable, List, Optional, Tuple
+from article_key import extract_core_params
+from db_operations import get_known_article_keys, normalize_publish_date
+
+# (mid, idx) 压缩为一个整数：idx 是多图文中的序号，不会超过 8 位
+_IDX_BITS = 8
+
+
+def _pack_key(url: str) -> Optional[int]:
+    """URL -> 压缩后的 (mid, idx) 整数键，无法解析返回None"""
+    params = extract_core_params(url)
+    if not params:
+        return None
+    return (int(params['mid']) << _IDX_BITS) | int(params['idx'])
+
+
+def iter_page_article_urls(msg_list: list) -> Iterable[str]:
+    """遍历 profile_ext 一页消息中的所有文章URL（主文章 + 多图文）"""
+    for msg in msg_list:
+        app_msg_ext_info = msg.get('app_msg_ext_info') or {}
+        if app_msg_ext_info.get('content_url'):
+            yield app_msg_ext_info['content_url']
+        for item in app_msg_ext_info.get('multi_app_msg_item_list') or []:
+            if item.get('content_url'):
+                yield item['content_url']
+
+
+class IncrementalSync:
+    """
+    某公众号的增量同步状态
+
+    使用方法:
+        sync = IncrementalSync(biz)
+        for page in pages:
+            sync.prefetch(page_msg_list)
+            for article in page:
+                if sync.is_known(article):
+                    if sync.can_stop_at(article):
+                        停止
+                    跳过
+    """
+
+    def __init__(self, biz: str, uncovered_ranges: List[Tuple[date, date]] = None):
+        """
+        Parameters
+        ----------
+        biz : str
+            公众号BIZ
+        uncovered_ranges : List[Tuple[date, date]], optional
+            尚未完整列出的日期区间（见 db_operations.get_uncovered_ranges），
+            区间内遇到已存在的文章不会停止
+        """
+        self.biz = biz
+        self.uncovered_ranges = uncovered_ranges or []
+        # 只保存已经查询过的键，内存只与列过的页数有关
+        self._probed = set()
+        self._known = set()
+
+    def prefetch(self, msg_list: list):
+        """对一页消息中尚未查询过的文章做一次批量查询"""
+        self._probe(iter_page_article_urls(msg_list))
+
+    def _probe(self, urls: Iterable[str]):
+        packed_keys = {key for key in map(_pack_key, urls) if key is not None and key not in self._probed}
+        if not packed_keys:
+            return
+        mask = (1 << _IDX_BITS) - 1
+        known = get_known_article_keys(self.biz, [(key >> _IDX_BITS, key & mask) for key in packed_keys])
+        self._probed.update(packed_keys)
+        self._known.update((mid << _IDX_BITS) | idx for mid, idx in known)
+
+    def is_known(self, article: dict) -> bool:
+        """文章是否已入库（短链接等无法解析的URL视为未入库）"""
+        key = _pack_key(article.get('url', ''))
+        if key is None:
+            return False
+        if key not in self._probed:
+            self._probe([article['url']])
+        return key in self._known
+
+    def can_stop_at(self, article: dict) -> bool:
+        """遇到这篇已存在的文章时能否停止列出（缺口区间内不能停止）"""
+        publish_date = normalize_publish_date(article.get('publish_date'))
+        if not publish_date:
+            return True
+        return not any(start <= publish_date <= end for start, end in self.uncovered_ranges)
@@ -6,13 +6,13 @@
 
 import re
 import json
-from bs4 import BeautifulSoup
 
 
 def inject_comments_direct_render(html_file, comments_data):
     """
-    直接在HTML中渲染留言区DOM元素
+    直接在HTML文件中渲染留言区DOM元素
     不依赖Ajax拦截，100%可靠
+    （下载文章时应直接在 html_transforms 处理链中使用 inject_comments，避免再读写一次文件）
     
     Parameters
     ----------
@@ -31,35 +31,21 @@ def inject_comments_direct_render(html_file, comments_data):
         return False
     
     try:
+        from html_transforms import apply_transforms, inject_comments
+
         # 读取HTML
         with open(html_file, 'r', encoding='utf-8') as f:
             html_content = f.read()
         
-        soup = BeautifulSoup(html_content, 'html.parser')
-        
-        # 查找head和body标签
-        head = soup.find('head')
-        body = soup.find('body')
-        
-        if not head or not body:
-            print("      ❌ 未找到head或body标签")
+        results = {}
+        html_content = apply_transforms(html_content, [inject_comments(comments_data)], results)
+        if not results['inject_comments']:
+            print("      ❌ 没有可渲染的留言，或未找到head/body标签")
             return False
         
-        # 1. 先在head中注入CSS样式
-        style_tag = soup.new_tag('style')
-        style_tag.string = get_comments_css()
-        head.append(style_tag)
-        
-        # 2. 生成留言区HTML
-        comments_html = generate_wechat_style_comments(comments_data)
-        
-        # 3. 在body结束前插入
-        comments_section = BeautifulSoup(comments_html, 'html.parser')
-        body.append(comments_section)
-        
         # 保存
         with open(html_file, 'w', encoding='utf-8') as f:
-            f.write(str(soup))
+            f.write(html_content)
         
         comment_count = len(comments_data.get('elected_comment', []))
         total_count = comments_data.get('elected_comment_total_cnt', 0)
@@ -0,0 +1,128 @@
+# coding: utf-8
+"""
+文章HTML正文拆表迁移脚本
+1. 创建 article_contents 表
+2. 分批把 articles.html_content 压缩后搬到 article_contents（同时补齐 content_hash）
+3. 全部搬完后删除 articles.html_content 字段
+
+可重复执行：每批搬完即清空原字段，中断后重新运行会从剩下的行继续。
+已有 article_contents 行的文章（迁移期间新代码已写入新正文）不覆盖，也不清空其原字段
+"""
+import hashlib
+import logging
+from datetime import datetime
+from sqlalchemy import inspect, text
+from database import engine
+from models import ArticleContent
+from content_store import compress_html
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 200
+
+
+def create_contents_table():
+    """创建 article_contents 表（已存在则跳过）"""
+    ArticleContent.__table__.create(bind=engine, checkfirst=True)
+    logger.info("✅ article_contents 表已就绪")
+
+
+def move_html_contents(batch_size: int = BATCH_SIZE) -> dict:
+    """
+    分批搬移HTML正文
+
+    Parameters
+    ----------
+    batch_size : int
+        每批处理的行数（HTML较大，批次不宜过大）
+
+    Returns
+    -------
+    dict
+        {'moved': int, 'raw_bytes': int, 'stored_bytes': int}
+    """
+    stats = {'moved': 0, 'raw_bytes': 0, 'stored_bytes': 0}
+    if 'html_content' not in {col['name'] for col in inspect(engine).get_columns('articles')}:
+        logger.info("✅ articles.html_content 字段已不存在，无需搬移")
+        return stats
+
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(text(
+                "SELECT id, html_content FROM articles "
+                "WHERE html_content IS NOT NULL AND id > :last_id "
+                "AND NOT EXISTS (SELECT 1 FROM article_contents WHERE article_id = articles.id) "
+                "ORDER BY id LIMIT :limit"
+            ), {'last_id': last_id, 'limit': batch_size}).fetchall()
+
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            contents = []
+            hashes = []
+            for row in rows:
+                raw = row.html_content.encode('utf-8')
+                data, encoding = compress_html(row.html_content)
+                contents.append({
+                    'article_id': row.id,
+                    'encoding': encoding,
+                    'data': data,
+                    'raw_size': len(raw),
+                    'updated_at': datetime.now()
+                })
+                hashes.append({'id': row.id, 'content_hash': hashlib.sha256(raw).hexdigest()})
+                stats['raw_bytes'] += len(raw)
+                stats['stored_bytes'] += len(data)
+
+            conn.execute(ArticleContent.__table__.insert(), contents)
+            conn.execute(text(
+                "UPDATE articles SET html_content = NULL, content_hash = :content_hash WHERE id = :id"
+            ), hashes)
+
+            stats['moved'] += len(rows)
+            logger.info(f"   已处理到 ID {last_id}，累计搬移 {stats['moved']} 篇")
+
+    return stats
+
+
+def drop_html_column():
+    """删除 articles.html_content 字段（仍有未搬移的数据时不删除；已有新正文的行视为已搬移）"""
+    if 'html_content' not in {col['name'] for col in inspect(engine).get_columns('articles')}:
+        return
+    with engine.begin() as conn:
+        remaining = conn.execute(text(
+            "SELECT COUNT(*) FROM articles WHERE html_content IS NOT NULL "
+            "AND NOT EXISTS (SELECT 1 FROM article_contents WHERE article_id = articles.id)"
+        )).scalar()
+        if remaining:
+            logger.warning(f"⚠️  仍有 {remaining} 篇文章未搬移，保留 html_content 字段")
+            return
+        conn.execute(text("ALTER TABLE articles DROP COLUMN html_content"))
+    logger.info("✅ 已删除 articles.html_content 字段")
+
+
+def migrate_article_contents():
+    """执行完整迁移"""
+    logger.info("开始迁移文章HTML正文...")
+    try:
+        create_contents_table()
+        stats = move_html_contents()
+        drop_html_column()
+
+        logger.info("\n✅ 迁移完成！")
+        logger.info(f"  - 搬移: {stats['moved']} 篇")
+        if stats['raw_bytes']:
+            ratio = stats['stored_bytes'] / stats['raw_bytes'] * 100
+            logger.info(f"  - 原始大小: {stats['raw_bytes'] / 1024 / 1024:.1f} MB，"
+                        f"压缩后: {stats['stored_bytes'] / 1024 / 1024:.1f} MB ({ratio:.0f}%)")
+    except Exception as e:
+        logger.error(f"❌ 迁移失败: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == '__main__':
+    migrate_article_contents()
@@ -0,0 +1,130 @@
+# coding: utf-8
+"""
+文章规范化键迁移脚本
+1. 为 articles 表添加 mid, idx, sn 字段
+2. 分批回填已有文章的规范化键（由 article_key.canonical_article_key 计算）
+3. 创建 (biz, mid, idx, sn) 唯一索引
+
+可重复执行：已回填的行不会再处理，索引已存在时跳过
+"""
+import logging
+from sqlalchemy import inspect, text, update
+from database import engine, get_db_session
+from models import Article
+from article_key import canonical_article_key
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+KEY_COLUMNS = [
+    ('mid', 'BIGINT'),
+    ('idx', 'INTEGER'),
+    ('sn', 'VARCHAR(64)'),
+]
+
+
+def add_key_columns():
+    """添加规范化键字段（已存在则跳过）"""
+    existing = {col['name'] for col in inspect(engine).get_columns('articles')}
+    with engine.begin() as conn:
+        for name, sql_type in KEY_COLUMNS:
+            if name in existing:
+                logger.info(f"✅ {name} 字段已存在")
+                continue
+            logger.info(f"添加 {name} 字段...")
+            conn.execute(text(f"ALTER TABLE articles ADD COLUMN {name} {sql_type}"))
+            logger.info(f"✅ 已添加 {name} 字段")
+
+
+def backfill_article_keys(batch_size: int = BATCH_SIZE) -> dict:
+    """
+    分批回填规范化键
+
+    同一篇文章因URL参数不同被保存了多次时，只有第一条（id最小）获得规范化键，
+    其余记录保持为空并计入 duplicates，避免唯一索引创建失败
+
+    Parameters
+    ----------
+    batch_size : int
+        每批处理的行数
+
+    Returns
+    -------
+    dict
+        {'filled': int, 'unparsable': int, 'duplicates': int}
+    """
+    stats = {'filled': 0, 'unparsable': 0, 'duplicates': 0}
+
+    with get_db_session() as session:
+        seen_keys = set(
+            session.query(Article.biz, Article.mid, Article.idx, Article.sn)
+            .filter(Article.mid != None)
+            .all()
+        )
+    logger.info(f"📚 已有规范化键的文章: {len(seen_keys)} 篇")
+
+    last_id = 0
+    while True:
+        with get_db_session() as session:
+            rows = session.query(Article.id, Article.biz, Article.url).filter(
+                Article.id > last_id,
+                Article.mid == None
+            ).order_by(Article.id).limit(batch_size).all()
+
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            updates = []
+            for row in rows:
+                article_key = canonical_article_key(row.url)
+                if not article_key:
+                    stats['unparsable'] += 1
+                    continue
+                _, mid, idx, sn = article_key
+                key = (row.biz, mid, idx, sn)
+                if key in seen_keys:
+                    stats['duplicates'] += 1
+                    logger.warning(f"   ⚠️  重复文章 (ID: {row.id}, mid={mid}, idx={idx})，跳过")
+                    continue
+                seen_keys.add(key)
+                updates.append({'id': row.id, 'mid': mid, 'idx': idx, 'sn': sn})
+
+            if updates:
+                session.execute(update(Article), updates)
+            stats['filled'] += len(updates)
+            logger.info(f"   已处理到 ID {last_id}，累计回填 {stats['filled']} 篇")
+
+    return stats
+
+
+def create_key_index():
+    """创建 (biz, mid, idx, sn) 唯一索引"""
+    for index in Article.__table__.indexes:
+        if index.name == 'uq_articles_biz_mid_idx_sn':
+            index.create(bind=engine, checkfirst=True)
+            logger.info(f"✅ 唯一索引已就绪: {index.name}")
+
+
+def migrate_article_key():
+    """执行完整迁移"""
+    logger.info("开始迁移文章规范化键...")
+    try:
+        add_key_columns()
+        stats = backfill_article_keys()
+        create_key_index()
+
+        logger.info("\n✅ 迁移完成！")
+        logger.info(f"  - 回填: {stats['filled']} 篇")
+        logger.info(f"  - 无法解析的URL（短链接等）: {stats['unparsable']} 篇")
+        logger.info(f"  - 重复文章（未回填）: {stats['duplicates']} 篇")
+    except Exception as e:
+        logger.error(f"❌ 迁移失败: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == '__main__':
+    migrate_article_key()
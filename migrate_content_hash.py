@@ -0,0 +1,33 @@
+# coding: utf-8
+"""
+文章内容哈希迁移脚本
+为 articles 表添加 content_hash 字段（批量保存时用于脏检查）
+
+已有文章的 content_hash 为空，下次刷新时会被写入一次，之后内容不变的行不再改写
+"""
+import logging
+from sqlalchemy import inspect, text
+from database import engine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def migrate_content_hash():
+    """添加 content_hash 字段（已存在则跳过）"""
+    try:
+        existing = {col['name'] for col in inspect(engine).get_columns('articles')}
+        if 'content_hash' in existing:
+            logger.info("✅ content_hash 字段已存在")
+            return
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE articles ADD COLUMN content_hash VARCHAR(64)"))
+        logger.info("✅ 已添加 content_hash 字段")
+    except Exception as e:
+        logger.error(f"❌ 迁移失败: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == '__main__':
+    migrate_content_hash()
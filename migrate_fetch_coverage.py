@@ -0,0 +1,28 @@
+# coding: utf-8
+"""
+列表覆盖区间迁移脚本
+创建 fetch_coverage 表（记录每个公众号哪些日期区间已从 profile_ext 完整列出）
+
+已有文章无法推断出覆盖区间，迁移后每个日期范围第一次请求时会重新列出一次，之后在有效期内不再重复请求
+"""
+import logging
+from database import engine
+from models import FetchCoverage
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def migrate_fetch_coverage():
+    """创建 fetch_coverage 表（已存在则跳过）"""
+    try:
+        FetchCoverage.__table__.create(bind=engine, checkfirst=True)
+        logger.info("✅ fetch_coverage 表已就绪")
+    except Exception as e:
+        logger.error(f"❌ 迁移失败: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == '__main__':
+    migrate_fetch_coverage()
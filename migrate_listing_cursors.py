@@ -0,0 +1,28 @@
+# coding: utf-8
+"""
+列表游标迁移脚本
+创建 listing_cursors 表（每个公众号的文章列表游标：下一页 offset、最早消息时间、run_id）
+
+迁移前没有游标，之后的列表从第一页开始，每列完一页保存一次游标
+"""
+import logging
+from database import engine
+from models import ListingCursor
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def migrate_listing_cursors():
+    """创建 listing_cursors 表（已存在则跳过）"""
+    try:
+        ListingCursor.__table__.create(bind=engine, checkfirst=True)
+        logger.info("✅ listing_cursors 表已就绪")
+    except Exception as e:
+        logger.error(f"❌ 迁移失败: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == '__main__':
+    migrate_listing_cursors()
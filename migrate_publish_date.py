@@ -0,0 +1,111 @@
+# coding: utf-8
+"""
+发布日期类型迁移脚本
+1. 把 articles.publish_date 统一为真正的 DATE 类型
+   - PostgreSQL: 列类型不是 DATE 时用 ALTER COLUMN ... TYPE DATE USING 一次转换
+   - 其他数据库（SQLite）: 分批把字符串/时间戳形式的值改写为 'YYYY-MM-DD'
+2. 创建 (biz, publish_date DESC) 复合索引
+
+可重复执行：已是 DATE 类型、已规范化的值、已存在的索引都会跳过
+"""
+import logging
+from sqlalchemy import inspect, text
+from sqlalchemy.types import Date
+from database import engine
+from models import Article
+from db_operations import normalize_publish_date
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+
+def convert_postgres_column():
+    """PostgreSQL: 将 publish_date 列转换为 DATE（无法解析的值置为NULL）"""
+    column = next(col for col in inspect(engine).get_columns('articles') if col['name'] == 'publish_date')
+    if isinstance(column['type'], Date):
+        logger.info("✅ publish_date 已是 DATE 类型")
+        return
+    logger.info(f"转换 publish_date 类型: {column['type']} -> DATE ...")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "ALTER TABLE articles ALTER COLUMN publish_date TYPE DATE USING "
+            "CASE WHEN publish_date::text ~ '^\\d{4}-\\d{2}-\\d{2}' "
+            "THEN substring(publish_date::text from 1 for 10)::date END"
+        ))
+    logger.info("✅ publish_date 已转换为 DATE 类型")
+
+
+def normalize_generic_values(batch_size: int = BATCH_SIZE) -> dict:
+    """
+    其他数据库: 分批规范化 publish_date 的值
+
+    Returns
+    -------
+    dict
+        {'normalized': int, 'unparsable': int}
+    """
+    stats = {'normalized': 0, 'unparsable': 0}
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            # 直接读取原始值，绕过ORM的Date类型转换
+            rows = conn.execute(text(
+                "SELECT id, publish_date FROM articles "
+                "WHERE publish_date IS NOT NULL AND id > :last_id ORDER BY id LIMIT :limit"
+            ), {'last_id': last_id, 'limit': batch_size}).fetchall()
+
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            updates = []
+            for row in rows:
+                publish_date = normalize_publish_date(row.publish_date)
+                value = publish_date.isoformat() if publish_date else None
+                if value == row.publish_date:
+                    continue
+                if value is None:
+                    stats['unparsable'] += 1
+                updates.append({'id': row.id, 'publish_date': value})
+
+            if updates:
+                conn.execute(text("UPDATE articles SET publish_date = :publish_date WHERE id = :id"), updates)
+            stats['normalized'] += len(updates)
+            logger.info(f"   已处理到 ID {last_id}，累计规范化 {stats['normalized']} 篇")
+
+    return stats
+
+
+def create_date_index():
+    """创建 (biz, publish_date DESC) 复合索引"""
+    for index in Article.__table__.indexes:
+        if index.name == 'ix_articles_biz_publish_date':
+            index.create(bind=engine, checkfirst=True)
+            logger.info(f"✅ 复合索引已就绪: {index.name}")
+
+
+def migrate_publish_date():
+    """执行完整迁移"""
+    logger.info("开始迁移发布日期类型...")
+    try:
+        if engine.dialect.name == 'postgresql':
+            convert_postgres_column()
+        else:
+            stats = normalize_generic_values()
+            logger.info(f"  - 规范化: {stats['normalized']} 篇（其中无法解析置空: {stats['unparsable']} 篇）")
+        create_date_index()
+
+        if engine.dialect.name == 'postgresql':
+            with engine.begin() as conn:
+                conn.execute(text("ANALYZE articles"))
+        logger.info("\n✅ 迁移完成！")
+    except Exception as e:
+        logger.error(f"❌ 迁移失败: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == '__main__':
+    migrate_publish_date()
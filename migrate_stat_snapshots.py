@@ -0,0 +1,74 @@
+# coding: utf-8
+"""
+统计数据快照迁移脚本
+1. 创建 article_stat_snapshots 表
+2. 用 articles 中现有的统计数据为每篇文章写入第一个快照（时间取 fetched_at）
+
+可重复执行：已存在的表跳过，已有快照的文章不会重复写入
+"""
+import logging
+from datetime import datetime
+from sqlalchemy import select, exists
+from database import engine
+from models import Article, ArticleStatSnapshot
+from db_operations import ARTICLE_STAT_FIELDS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+
+def create_snapshots_table():
+    """创建 article_stat_snapshots 表（已存在则跳过）"""
+    ArticleStatSnapshot.__table__.create(bind=engine, checkfirst=True)
+    logger.info("✅ article_stat_snapshots 表已就绪")
+
+
+def seed_initial_snapshots(batch_size: int = BATCH_SIZE) -> int:
+    """为还没有快照、但有统计数据的文章写入第一个快照，返回写入数量"""
+    seeded = 0
+    last_id = 0
+    columns = [Article.id, Article.biz, Article.fetched_at] + [getattr(Article, field) for field in ARTICLE_STAT_FIELDS]
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(*columns)
+                .where(Article.id > last_id)
+                .where(~exists().where(ArticleStatSnapshot.article_id == Article.id))
+                .order_by(Article.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            snapshots = [{
+                'article_id': row.id,
+                'biz': row.biz,
+                'captured_at': row.fetched_at or datetime.now(),
+                **{field: getattr(row, field) for field in ARTICLE_STAT_FIELDS}
+            } for row in rows if any(getattr(row, field) is not None for field in ARTICLE_STAT_FIELDS)]
+            if snapshots:
+                conn.execute(ArticleStatSnapshot.__table__.insert(), snapshots)
+            seeded += len(snapshots)
+            logger.info(f"   已处理到 ID {last_id}，累计写入 {seeded} 个快照")
+    return seeded
+
+
+def migrate_stat_snapshots():
+    """执行完整迁移"""
+    logger.info("开始迁移统计数据快照...")
+    try:
+        create_snapshots_table()
+        seeded = seed_initial_snapshots()
+        logger.info("\n✅ 迁移完成！")
+        logger.info(f"  - 初始快照: {seeded} 篇")
+    except Exception as e:
+        logger.error(f"❌ 迁移失败: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == '__main__':
+    migrate_stat_snapshots()
@@ -2,10 +2,12 @@
 """
 SQLAlchemy ORM 模型定义
 """
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Date, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Boolean, DateTime, Date, ForeignKey, Index, LargeBinary, desc
+from sqlalchemy.orm import relationship, validates
 from datetime import datetime
 from database import Base
+from article_key import canonical_article_key
+from content_store import compress_html, decompress_html
 class Account(Base):
     """公众号表"""
     __tablename__ = 'accounts'
@@ -46,13 +48,22 @@ class Parameter(Base):
 class Article(Base):
     """文章表"""
     __tablename__ = 'articles'
+    __table_args__ = (
+        # 规范化文章键：微信URL中chksm/scene会变化，只有这四个参数能唯一确定文章
+        Index('uq_articles_biz_mid_idx_sn', 'biz', 'mid', 'idx', 'sn', unique=True),
+        # 按公众号查询日期范围并按发布日期倒序排列时走这个索引，无需额外排序
+        Index('ix_articles_biz_publish_date', 'biz', desc('publish_date')),
+    )
     
     id = Column(Integer, primary_key=True)
     biz = Column(String(100), ForeignKey('accounts.biz'), nullable=False, index=True)
     url = Column(Text, unique=True, nullable=False)  # 完整URL
+    mid = Column(BigInteger)  # 规范化键：消息ID（由url自动填充）
+    idx = Column(Integer)  # 规范化键：多图文中的序号（由url自动填充）
+    sn = Column(String(64))  # 规范化键：文章签名（由url自动填充）
     short_url = Column(Text, index=True)  # 短链接（用于快速查找）
     title = Column(Text)
-    html_content = Column(Text)  # HTML内容
+    content_hash = Column(String(64))  # HTML内容的SHA-256（批量保存时用于脏检查）
     publish_date = Column(Date, index=True)
     read_count = Column(Integer, index=True)  # 阅读量
     old_like_count = Column(Integer)  # 点赞数（大拇指👍）
@@ -64,12 +75,38 @@ class Article(Base):
     
     # 关系
     account = relationship("Account", back_populates="articles")
+    # HTML正文单独存放，只有显式访问时才会加载
+    content = relationship("ArticleContent", back_populates="article", uselist=False,
+                           cascade="all, delete-orphan", passive_deletes=True)
+    # 统计数据历史快照（只追加，由数据库级联删除）
+    stat_snapshots = relationship("ArticleStatSnapshot", back_populates="article", lazy="dynamic",
+                                  cascade="all, delete-orphan", passive_deletes=True)
     
     def __repr__(self):
         return f"<Article(title='{self.title}', read_count={self.read_count})>"
     
-    def to_dict(self):
-        """转换为字典"""
+    @validates('url')
+    def _fill_canonical_key(self, key, url):
+        """设置url时同步填充规范化键（短链接无法解析时保留原有键）"""
+        article_key = canonical_article_key(url)
+        if article_key:
+            _, self.mid, self.idx, self.sn = article_key
+        return url
+    
+    @property
+    def html_content(self):
+        """解压后的HTML内容（会触发一次 article_contents 查询）"""
+        return self.content.get_html() if self.content else None
+    
+    def to_dict(self, include_html=False):
+        """
+        转换为字典
+        
+        Parameters
+        ----------
+        include_html : bool
+            是否包含 html_content（需要额外查询并解压，默认不包含）
+        """
         # 处理 publish_date 可能是字符串或 datetime
         if self.publish_date:
             if isinstance(self.publish_date, str):
@@ -88,13 +125,12 @@ class Article(Base):
         else:
             fetched_at_str = None
             
-        return {
+        result = {
             'id': self.id,
             'biz': self.biz,
             'url': self.url,
             'short_url': self.short_url,
             'title': self.title,
-            'html_content': self.html_content,
             'publish_date': publish_date_str,
             'read_count': self.read_count,
             'old_like_count': self.old_like_count,
@@ -104,3 +140,90 @@ class Article(Base):
             'local_html_path': self.local_html_path,
             'fetched_at': fetched_at_str
         }
+        if include_html:
+            result['html_content'] = self.html_content
+        return result
+class ArticleContent(Base):
+    """文章HTML正文表（压缩存储）"""
+    __tablename__ = 'article_contents'
+    
+    article_id = Column(Integer, ForeignKey('articles.id', ondelete='CASCADE'), primary_key=True)
+    encoding = Column(String(16), nullable=False)  # 压缩算法：gzip / zstd
+    data = Column(LargeBinary, nullable=False)  # 压缩后的HTML
+    raw_size = Column(Integer)  # 压缩前的字节数
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    # 关系
+    article = relationship("Article", back_populates="content")
+    
+    def __repr__(self):
+        return f"<ArticleContent(article_id={self.article_id}, encoding='{self.encoding}', raw_size={self.raw_size})>"
+    
+    @classmethod
+    def from_html(cls, html, **kwargs):
+        """由HTML文本创建（自动压缩）"""
+        data, encoding = compress_html(html)
+        return cls(encoding=encoding, data=data, raw_size=len(html.encode('utf-8')), **kwargs)
+    
+    def set_html(self, html):
+        """替换HTML内容（自动压缩）"""
+        self.data, self.encoding = compress_html(html)
+        self.raw_size = len(html.encode('utf-8'))
+    
+    def get_html(self):
+        """解压HTML内容"""
+        return decompress_html(self.data, self.encoding)
+class FetchCoverage(Base):
+    """文章列表覆盖区间表：记录某公众号哪些日期区间已从 profile_ext 完整列出"""
+    __tablename__ = 'fetch_coverage'
+    __table_args__ = (
+        Index('ix_fetch_coverage_biz_end_date', 'biz', 'end_date'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    biz = Column(String(100), ForeignKey('accounts.biz'), nullable=False)
+    start_date = Column(Date, nullable=False)  # 区间起始日期（含）
+    end_date = Column(Date, nullable=False)  # 区间结束日期（含）
+    listed_at = Column(DateTime, nullable=False, default=datetime.now)  # 列出时间
+    
+    def __repr__(self):
+        return f"<FetchCoverage(biz='{self.biz}', {self.start_date} ~ {self.end_date}, listed_at={self.listed_at})>"
+class ListingCursor(Base):
+    """文章列表游标表：每个公众号最近一次列表运行列到了哪里，中断后可以从这里继续"""
+    __tablename__ = 'listing_cursors'
+    
+    biz = Column(String(100), ForeignKey('accounts.biz'), primary_key=True)
+    run_id = Column(String(32), nullable=False)  # 写入游标的列表运行
+    mode = Column(String(20), nullable=False)  # incremental（从最新开始）/ backfill（向更早的历史回填）
+    next_offset = Column(Integer, nullable=False, default=0)  # 下一页的 profile_ext offset
+    last_msg_time = Column(DateTime)  # 已列出的最早一条消息的发布时间
+    range_start = Column(Date)  # 本次运行的日期范围（为空表示不限）
+    range_end = Column(Date)
+    completed = Column(Boolean, nullable=False, default=False)  # 是否已正常列完
+    updated_at = Column(DateTime, nullable=False, default=datetime.now, onupdate=datetime.now)
+    
+    def __repr__(self):
+        return f"<ListingCursor(biz='{self.biz}', mode='{self.mode}', next_offset={self.next_offset}, completed={self.completed})>"
+class ArticleStatSnapshot(Base):
+    """文章统计数据快照表：每次获取统计数据时追加一行，用于绘制增长曲线"""
+    __tablename__ = 'article_stat_snapshots'
+    __table_args__ = (
+        # 按公众号查询一段时间内所有文章的快照时走这个索引
+        Index('ix_article_stat_snapshots_biz_captured_at', 'biz', 'captured_at'),
+    )
+    
+    # 主键 (article_id, captured_at) 本身就是单篇文章曲线查询用的索引
+    article_id = Column(Integer, ForeignKey('articles.id', ondelete='CASCADE'), primary_key=True)
+    captured_at = Column(DateTime, primary_key=True)  # 获取时间
+    biz = Column(String(100), nullable=False)  # 冗余存放，便于按公众号查询
+    read_count = Column(Integer)  # 阅读量
+    old_like_count = Column(Integer)  # 点赞数（大拇指👍）
+    like_count = Column(Integer)  # 喜欢数/收藏数（爱心❤️）
+    share_count = Column(Integer)  # 分享数
+    comment_count = Column(Integer)  # 评论数
+    
+    # 关系
+    article = relationship("Article", back_populates="stat_snapshots")
+    
+    def __repr__(self):
+        return f"<ArticleStatSnapshot(article_id={self.article_id}, captured_at={self.captured_at}, read_count={self.read_count})>"
@@ -0,0 +1,200 @@
+# coding: utf-8
+"""
+文章页面元数据提取
+文章HTML（1~3 MB）中的标题、公众号、统计数据、comment_id、msg_link 等都写在内联 <script> 的变量里，
+原来各模块分别用十几个 re.findall 提取，每个都要把整篇HTML从头扫一遍。
+
+这里先定位所有内联脚本（只用 str.find，正文部分不进正则），再用一个预编译的正则把
+需要的 "var 名称 = '值'" 和 "名称: '值'" 形式的赋值一次扫完，按名称分发到各字段；
+og:title 和 <h1> 标题在各自的小范围内查找。所有需要从文章页面取数据的地方都应使用 extract_page_metadata
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+# 所有需要的赋值语句合成一个正则：每个分支都以固定字符开头，正则引擎可以按首字符快速跳过，
+# 不会在每个标识符上都尝试匹配
+_ASSIGNMENT_PATTERN = re.compile(r"""
+    (?P<head>
+        var\s+(?:title|nickname|user_name|createTime|read_num_new|read_num|msg_link|biz|comment_id)
+      | window\.msg_link
+      | provinceName | hit_nickname | old_like_count | like_count | share_count | comment_count | is_mp_video
+      | video_id | url | comment_id\.DATA | comment_id | "biz"
+    )
+    (?P<sep>\s*=\s*|\s*:\s*|['\)]+\s*:\s*)
+    (?:htmlDecode\(|JsDecode\()?
+    (?:'(?P<sq>[^'\n]*)'|"(?P<dq>[^"\n]*)")
+""", re.VERBOSE)
+_IDENTIFIER_CHARS = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_$')
+
+_OG_TITLE_PATTERN = re.compile(r'<meta\s+property="og:title"\s+content="([^"]+)"')
+_H1_TITLE_PATTERN = re.compile(r'<h1[^>]*class="rich_media_title[^"]*"[^>]*>([^<]+)</h1>')
+
+# "var 名称 = '值'" 形式的变量 -> 字段
+_VAR_FIELDS = {
+    'title': 'title',
+    'nickname': 'nickname',
+    'user_name': 'user_name',
+    'createTime': 'create_time',
+    'read_num': 'read_num',
+    'read_num_new': 'read_num_new',
+    'msg_link': 'msg_link',
+    'biz': 'biz',
+}
+# "名称: '值'" 形式的对象属性 -> 字段
+_PROPERTY_FIELDS = {
+    'provinceName': 'province_name',
+    'hit_nickname': 'hit_nickname',
+    'old_like_count': 'old_like_count',
+    'like_count': 'like_count',
+    'share_count': 'share_count',
+    'comment_count': 'comment_count',
+    'is_mp_video': 'is_mp_video',
+}
+_INT_FIELDS = ('read_num', 'read_num_new', 'old_like_count', 'like_count', 'share_count', 'comment_count')
+
+
+@dataclass
+class PageMetadata:
+    """文章页面元数据（页面中没有的字段为 None）"""
+    title: Optional[str] = None  # var title
+    og_title: Optional[str] = None  # <meta property="og:title">
+    h1_title: Optional[str] = None  # <h1 class="rich_media_title">
+    nickname: Optional[str] = None  # 公众号名称
+    user_name: Optional[str] = None  # 公众号ID（gh_xxx）
+    biz: Optional[str] = None
+    create_time: Optional[str] = None
+    province_name: Optional[str] = None
+    hit_nickname: Optional[str] = None  # 原创标识
+    is_mp_video: Optional[str] = None
+    has_video: bool = False  # 页面中有 video_id
+    read_num: Optional[int] = None
+    read_num_new: Optional[int] = None
+    old_like_count: Optional[int] = None  # 点赞（大拇指👍）
+    like_count: Optional[int] = None  # 喜欢（爱心❤️）
+    share_count: Optional[int] = None
+    comment_count: Optional[int] = None
+    comment_id: Optional[str] = None
+    msg_link: Optional[str] = None  # 文章长链接（已去掉 \/ 和 &amp; 转义）
+    raw: Dict[str, str] = field(default_factory=dict, repr=False)  # 各字段的原始字符串
+
+    @property
+    def read_count(self) -> Optional[int]:
+        """阅读数（优先使用 read_num_new）"""
+        return self.read_num_new if self.read_num_new is not None else self.read_num
+
+    @property
+    def display_title(self) -> Optional[str]:
+        """页面标题：h1 > og:title > var title"""
+        return self.h1_title or self.og_title or self.title
+
+    @property
+    def has_stats(self) -> bool:
+        """页面是否带统计数据（需要带 key/uin/pass_ticket 请求才会有）"""
+        return self.read_count is not None or self.old_like_count is not None
+
+
+def _script_text(html: str) -> str:
+    """拼接所有内联脚本的内容"""
+    parts = []
+    pos = 0
+    while True:
+        start = html.find('<script', pos)
+        if start == -1:
+            break
+        open_end = html.find('>', start)
+        if open_end == -1:
+            break
+        end = html.find('</script>', open_end)
+        if end == -1:
+            parts.append(html[open_end + 1:])
+            break
+        if end > open_end + 1:
+            parts.append(html[open_end + 1:end])
+        pos = end + 9
+    return '\n'.join(parts)
+
+
+def _to_int(value: str) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def extract_page_metadata(html: str) -> PageMetadata:
+    """
+    一次扫描提取文章页面的元数据
+
+    Parameters
+    ----------
+    html : str
+        文章HTML
+
+    Returns
+    -------
+    PageMetadata
+        提取结果；同一字段出现多次时取第一次出现的值
+    """
+    meta = PageMetadata()
+    if not html:
+        return meta
+
+    raw = meta.raw
+    # comment_id 有多种写法，按可靠程度取：var 声明 > 赋值 > JsDecode > DATA
+    comment_ids = {}
+    script = _script_text(html)
+    for match in _ASSIGNMENT_PATTERN.finditer(script):
+        if match.start() and script[match.start() - 1] in _IDENTIFIER_CHARS:
+            continue  # 更长的标识符的一部分（如 xxx_like_count）
+        head = match.group('head')
+        is_declared = head.startswith(('var', 'window.'))
+        key = head.split()[-1].replace('window.', '').strip('"')
+        value = match.group('sq')
+        if value is None:
+            value = match.group('dq')
+        is_assignment = '=' in match.group('sep')
+
+        if key in _VAR_FIELDS:
+            if key == 'biz' and not value:
+                continue  # var biz = "" || "MzA..."
+            if is_declared and is_assignment:
+                raw.setdefault(_VAR_FIELDS[key], value)
+            elif key == 'biz' and head.startswith('"'):
+                raw.setdefault('json_biz', value)
+        elif key in _PROPERTY_FIELDS:
+            if not is_assignment:
+                raw.setdefault(_PROPERTY_FIELDS[key], value)
+        elif key == 'video_id':
+            meta.has_video = True
+        elif key == 'url':
+            if '/s?' in value:
+                raw.setdefault('url', value)
+
+        if key == 'comment_id' and value.isdigit():
+            priority = 0 if is_declared else (1 if is_assignment else 2)
+            comment_ids.setdefault(priority, value)
+        elif key == 'comment_id.DATA' and value.isdigit():
+            comment_ids.setdefault(3, value)
+
+    for name in ('title', 'nickname', 'user_name', 'create_time', 'province_name', 'hit_nickname', 'is_mp_video'):
+        setattr(meta, name, raw.get(name))
+    for name in _INT_FIELDS:
+        setattr(meta, name, _to_int(raw.get(name)))
+    meta.biz = raw.get('biz') or raw.get('json_biz')
+    if comment_ids:
+        meta.comment_id = comment_ids[min(comment_ids)]
+    msg_link = raw.get('msg_link') or raw.get('url')
+    if msg_link:
+        meta.msg_link = msg_link.replace('\\/', '/').replace('&amp;', '&')
+
+    head_end = html.find('</head>')
+    og_match = _OG_TITLE_PATTERN.search(html, 0, head_end if head_end != -1 else len(html))
+    if og_match:
+        meta.og_title = og_match.group(1).strip()
+    h1_start = html.find('rich_media_title')
+    if h1_start != -1:
+        h1_match = _H1_TITLE_PATTERN.search(html, max(html.rfind('<h1', 0, h1_start), 0))
+        if h1_match:
+            meta.h1_title = h1_match.group(1).strip()
+    return meta
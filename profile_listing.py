@@ -0,0 +1,289 @@
+# coding: utf-8
+"""
+公众号文章列表（profile_ext?action=getmsg）流式读取
+原来三个地方（api_endpoints_new、api_endpoints_smart、smart_batch_fetch）各自把所有列表页
+全部列完、攒成一个列表，之后才开始获取第一篇文章的详情。
+
+ProfileListing 是一个可迭代对象：每请求到一页就逐篇产出这一页的新文章，
+交给 article_pipeline.stream_article_pipeline 放进有界队列，详情处理可以在第一页到达后立即开始；
+队列满时迭代暂停（不会请求下一页），列表不会跑到处理能力前面太远，内存也只与队列长度有关。
+
+    listing = ProfileListing(biz, credentials, start_date, end_date, incremental_sync=sync)
+    stream_article_pipeline(listing, [fetch_detail], credential=credentials['uin'])
+    if listing.error == 'no_session':
+        重新捕获参数
+
+迭代结束后 listing.error / listing.complete / listing.count 记录列表的结果；
+正常列完（到达开始日期、列完全部历史或遇到已存在文章）时把实际列过的日期区间记录到 fetch_coverage 表
+
+persist_cursor=True 时每列完一页就把游标（下一页 offset、最早消息时间、run_id）保存到 listing_cursors 表，
+中断（崩溃、参数失效 no_session）后可以接着列：
+- 同一个 run_id（例如 fetch_articles_filtered 重新捕获参数后的重试）从上次的 offset 继续
+- backfill 模式（回填历史）：同一日期范围的未完成游标在下一次请求中也会继续；
+  遇到已入库的文章只跳过、不停止，一直列到开始日期或全部历史
+- incremental 模式（默认）：从最新一页开始，遇到已入库的文章停止
+"""
+import json
+import logging
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterator, Optional
+
+import http_client
+
+logger = logging.getLogger(__name__)
+
+PROFILE_API_URL = "https://mp.weixin.qq.com/mp/profile_ext"
+# 每页消息数（profile_ext 每页最多10条）
+PAGE_SIZE = 10
+
+MODE_INCREMENTAL = 'incremental'
+MODE_BACKFILL = 'backfill'
+LISTING_MODES = (MODE_INCREMENTAL, MODE_BACKFILL)
+# 续列时往回多列的页数：游标在一页全部产出后保存，但这些文章可能还在流水线队列里没有入库
+# （队列 STREAM_QUEUE_SIZE=20 篇，约2页），回退几页后已入库的由增量判断跳过
+RESUME_OVERLAP_PAGES = 3
+
+
+def _article_from_item(item: Dict, publish_time: int, article_date: datetime) -> Dict:
+    """列表中的一条图文 -> 文章字典"""
+    return {
+        'title': item.get('title', ''),
+        'url': item.get('content_url', '').replace('\\/', '/'),
+        'digest': item.get('digest', ''),
+        'cover': item.get('cover', ''),
+        'publish_time': publish_time,
+        'publish_date': article_date.strftime('%Y-%m-%d'),
+    }
+
+
+class ProfileListing:
+    """逐页列出公众号文章的可迭代对象（只能迭代一次）"""
+
+    def __init__(self, biz: str, credentials: Dict[str, str], start_date: datetime = None,
+                 end_date: datetime = None, incremental_sync=None,
+                 should_stop_func: Callable[[Dict], bool] = None, max_pages: int = None,
+                 record_coverage: bool = True, mode: str = MODE_INCREMENTAL, run_id: str = None,
+                 persist_cursor: bool = False):
+        """
+        Parameters
+        ----------
+        biz : str
+            公众号BIZ
+        credentials : dict
+            uin、key、pass_ticket、appmsg_token、cookie
+        start_date, end_date : datetime, optional
+            日期范围；遇到早于开始日期的文章时停止
+        incremental_sync : IncrementalSync, optional
+            增量同步状态（优先于 should_stop_func）：已入库的文章跳过，
+            在缺口区间外遇到已入库的主文章时停止
+        should_stop_func : callable, optional
+            接收文章字典，返回 True 表示文章已存在（跳过，主文章已存在时停止）
+        max_pages : int, optional
+            最多列出的页数
+        record_coverage : bool
+            正常列完时是否记录 fetch_coverage（需要数据库）
+        mode : str
+            incremental（从最新开始，遇到已入库的文章停止）/ backfill（回填历史，不提前停止）
+        run_id : str, optional
+            列表运行ID，同一个 run_id 的重试从游标继续；默认随机生成
+        persist_cursor : bool
+            是否每页保存游标并从未完成的游标继续（需要数据库）
+        """
+        if mode not in LISTING_MODES:
+            raise ValueError(f"不支持的列表模式: {mode}")
+        self.biz = biz
+        self.credentials = credentials
+        self.start_date = start_date
+        self.end_date = end_date
+        self.incremental_sync = incremental_sync
+        self.should_stop_func = should_stop_func
+        self.max_pages = max_pages
+        self.record_coverage = record_coverage
+        self.mode = mode
+        self.run_id = run_id or uuid.uuid4().hex
+        self.persist_cursor = persist_cursor
+        self.headers = http_client.build_headers(
+            'wechat',
+            cookie=credentials.get('cookie'),
+            Referer=f'{PROFILE_API_URL}?action=home&__biz={biz}&scene=124'
+        )
+
+        self.error: Optional[str] = None  # 'no_session'（参数失效）/ 'api_error' / 'request_failed'
+        self.message: Optional[str] = None
+        self.complete = False  # 是否正常列完
+        self.pages = 0
+        self.count = 0  # 产出的文章数
+        self.resumed_from: Optional[int] = None  # 从游标继续时的起始 offset
+        self._resume_until = 0  # 续列时回退的几页中不因已入库文章停止
+        self._started = False
+
+    def _page_url(self, offset: int) -> str:
+        return (
+            f"{PROFILE_API_URL}?"
+            f"action=getmsg&"
+            f"__biz={self.biz}&"
+            f"f=json&"
+            f"offset={offset}&"
+            f"count={PAGE_SIZE}&"
+            f"is_ok=1&"
+            f"scene=124&"
+            f"uin={self.credentials.get('uin', '')}&"
+            f"key={self.credentials.get('key', '')}&"
+            f"pass_ticket={self.credentials.get('pass_ticket', '')}&"
+            f"wxtoken=&"
+            f"appmsg_token={self.credentials.get('appmsg_token', '')}&"
+            f"x5=0"
+        )
+
+    def _is_known(self, article: Dict) -> bool:
+        if self.incremental_sync:
+            return self.incremental_sync.is_known(article)
+        return bool(self.should_stop_func and self.should_stop_func(article))
+
+    def _can_stop_at(self, article: Dict, offset: int) -> bool:
+        if self.mode == MODE_BACKFILL or offset < self._resume_until:
+            return False
+        if self.incremental_sync:
+            return self.incremental_sync.can_stop_at(article)
+        return True
+
+    def _range(self):
+        return (self.start_date.date() if self.start_date else None,
+                self.end_date.date() if self.end_date else None)
+
+    def _resume_offset(self) -> int:
+        """起始 offset：有可以继续的未完成游标时从游标继续（回退 RESUME_OVERLAP_PAGES 页），否则从0开始"""
+        if not self.persist_cursor:
+            return 0
+        from db_operations import get_listing_cursor
+        cursor = get_listing_cursor(self.biz)
+        if not cursor or cursor['completed'] or not cursor['next_offset']:
+            return 0
+        same_run = cursor['run_id'] == self.run_id
+        same_backfill = (self.mode == MODE_BACKFILL and cursor['mode'] == MODE_BACKFILL
+                         and (cursor['range_start'], cursor['range_end']) == self._range())
+        if not (same_run or same_backfill):
+            return 0
+        self._resume_until = cursor['next_offset']
+        self.resumed_from = max(0, cursor['next_offset'] - RESUME_OVERLAP_PAGES * PAGE_SIZE)
+        logger.info(f"   ↪️  从游标继续列表: offset={self.resumed_from}"
+                    f"（上次列到 {cursor['last_msg_time'] or '-'}，run_id={cursor['run_id']}）")
+        return self.resumed_from
+
+    def _save_cursor(self, next_offset: int, last_msg_time: Optional[datetime], completed: bool = False):
+        if not self.persist_cursor:
+            return
+        from db_operations import save_listing_cursor
+        range_start, range_end = self._range()
+        save_listing_cursor(self.biz, self.run_id, self.mode, next_offset, last_msg_time,
+                            range_start, range_end, completed=completed)
+
+    def _fetch_page(self, offset: int) -> Optional[list]:
+        """请求一页，返回消息列表；出错时设置 self.error 并返回 None"""
+        logger.info(f"   获取第 {offset // PAGE_SIZE + 1} 页...")
+        try:
+            data = http_client.get(self._page_url(offset), headers=self.headers, timeout=10).json()
+            general_msg_list = data.get('general_msg_list', {})
+            if isinstance(general_msg_list, str):
+                general_msg_list = json.loads(general_msg_list)
+        except Exception as e:
+            logger.error(f"   ❌ 获取失败: {e}")
+            self.error, self.message = 'request_failed', str(e)
+            return None
+
+        if data.get('ret') != 0:
+            errmsg = data.get('errmsg', 'Unknown')
+            if 'no session' in errmsg.lower():
+                logger.error(f"❌ 参数已失效: {errmsg}")
+                self.error, self.message = 'no_session', '参数已失效，需要重新捕获'
+            else:
+                logger.warning(f"   ⚠️  API返回错误: {errmsg}")
+                self.error, self.message = 'api_error', errmsg
+            return None
+
+        self.pages += 1
+        return general_msg_list.get('list', [])
+
+    def __iter__(self) -> Iterator[Dict]:
+        if self._started:
+            raise RuntimeError("ProfileListing 只能迭代一次")
+        self._started = True
+
+        offset = self._resume_offset()
+        last_msg_time = None
+        # 列表覆盖记录：只有正常结束（非出错中断）时才记录实际列过的区间
+        covered_from = self.start_date.date() if self.start_date else None
+
+        while self.max_pages is None or self.pages < self.max_pages:
+            msg_list = self._fetch_page(offset)
+            if msg_list is None:
+                return
+            if not msg_list:
+                logger.info(f"   ✅ 已获取所有文章")
+                self.complete = True
+                break
+
+            if self.incremental_sync:
+                # 整页一次查询哪些文章已入库
+                self.incremental_sync.prefetch(msg_list)
+
+            stop = False
+            for msg in msg_list:
+                comm_msg_info = msg.get('comm_msg_info', {})
+                app_msg_ext_info = msg.get('app_msg_ext_info', {})
+                if not app_msg_ext_info:
+                    continue
+
+                publish_time = comm_msg_info.get('datetime', 0)
+                article_date = datetime.fromtimestamp(publish_time)
+                last_msg_time = article_date
+
+                # 检查日期范围
+                if self.end_date and article_date > self.end_date + timedelta(days=1):
+                    # 文章太新，跳过，继续找旧的
+                    continue
+                if self.start_date and article_date < self.start_date:
+                    # 文章太旧，结束获取
+                    logger.info(f"   🛑 遇到早于开始日期的文章 ({article_date.date()})，停止获取")
+                    self.complete = stop = True
+                    break
+                if not self.start_date:
+                    covered_from = article_date.date()
+
+                # 主文章
+                article = _article_from_item(app_msg_ext_info, publish_time, article_date)
+                main_article_known = self._is_known(article)
+                if article['url'] and not main_article_known:
+                    self.count += 1
+                    yield article
+
+                # 多图文消息（即使主文章存在，也要处理多图文）
+                multi_app_msg_item_list = app_msg_ext_info.get('multi_app_msg_item_list') or []
+                if multi_app_msg_item_list:
+                    logger.info(f"   📑 发现 {len(multi_app_msg_item_list)} 篇多图文")
+                for item in multi_app_msg_item_list:
+                    sub_article = _article_from_item(item, publish_time, article_date)
+                    if sub_article['url'] and not self._is_known(sub_article):
+                        self.count += 1
+                        yield sub_article
+
+                if main_article_known and self._can_stop_at(article, offset):
+                    logger.info(f"   🛑 遇到已存在的文章，停止获取: {article['title']}")
+                    # 当天更早的消息没有列出，覆盖区间从次日开始
+                    covered_from = article_date.date() + timedelta(days=1)
+                    self.complete = stop = True
+                    break
+            if stop:
+                break
+            offset += PAGE_SIZE
+            # 这一页已全部产出，保存游标
+            self._save_cursor(offset, last_msg_time)
+
+        logger.info(f"✅ 从API新获取 {self.count} 篇文章（{self.pages} 页）")
+        if self.complete:
+            self._save_cursor(offset, last_msg_time, completed=True)
+        if self.complete and self.record_coverage:
+            from db_operations import record_fetch_coverage
+            covered_to = min(self.end_date.date(), date.today()) if self.end_date else date.today()
+            record_fetch_coverage(self.biz, covered_from or covered_to, covered_to)
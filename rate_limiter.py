@@ -0,0 +1,226 @@
+# coding: utf-8
+"""
+自适应令牌桶限流
+按 (凭据 uin, 接口类别) 分别限流，速率按 AIMD 自动调整：
+- 连续成功 SUCCESS_STREAK 次：速率加 ADDITIVE_STEP（加性增）
+- 遇到"访问过于频繁"页面、JSON 的 ret != 0、HTTP 429/5xx：速率乘以 BACKOFF_FACTOR（乘性减），
+  并暂停 THROTTLE_COOLDOWN 秒
+
+这样微信不限制时速率逐渐提高，一旦被限制立即降速，吞吐量会收敛到微信能容忍的上限。
+http_client 发出的请求会自动按 URL 识别接口类别并经过这里，调用方不需要再自己 sleep
+"""
+import base64
+import logging
+import re
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+
+logger = logging.getLogger(__name__)
+
+# 接口类别 -> (初始速率, 最大速率)，单位：请求/秒
+ENDPOINT_RATES = {
+    'profile_ext': (0.5, 2.0),  # 文章列表
+    'getappmsgext': (1.0, 4.0),  # 阅读数、点赞数
+    'article': (1.0, 4.0),  # /s 文章页面
+    'appmsg_comment': (1.0, 4.0),  # 留言
+}
+MIN_RATE = 0.05
+BURST = 2  # 令牌桶容量
+SUCCESS_STREAK = 10
+ADDITIVE_STEP = 0.1
+BACKOFF_FACTOR = 0.5
+THROTTLE_COOLDOWN = 5.0
+
+# 与 ArticlesInfo.too_frequently_text 相同
+TOO_FREQUENTLY_TEXT = "你的访问过于频繁"
+# 限流页面很小，只在响应体开头这么多字节里找（文章页面有 1~3 MB，不整篇解码、搜索）
+TOO_FREQUENTLY_BYTES = TOO_FREQUENTLY_TEXT.encode('utf-8')
+THROTTLE_SNIFF_SIZE = 64 * 1024
+# profile_ext 返回 ret=-3（no session）表示参数失效，不是限流
+SESSION_EXPIRED_RET = -3
+
+_ENDPOINT_PATTERNS = (
+    ('profile_ext', re.compile(r'^/mp/profile_ext')),
+    ('getappmsgext', re.compile(r'^/mp/getappmsgext')),
+    ('appmsg_comment', re.compile(r'^/mp/appmsg_comment')),
+    ('article', re.compile(r'^/s(/|$)')),
+)
+
+
+class AdaptiveTokenBucket:
+    """速率按 AIMD 调整的令牌桶（线程安全）"""
+
+    def __init__(self, rate: float, max_rate: float, burst: float = BURST):
+        self.rate = rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.streak = 0
+        self.requests = 0
+        self.throttled = 0
+        self.waited = 0.0
+        self.last_throttle = None
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self) -> float:
+        """取一个令牌，没有令牌时阻塞等待；返回等待的秒数"""
+        with self._lock:
+            self._refill(time.monotonic())
+            # 先预占令牌（可以为负），排在后面的调用方等待更久，不会互相抢
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.requests += 1
+            self.waited += wait
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def on_success(self):
+        """请求成功：连续成功足够多次后加性提速"""
+        with self._lock:
+            self.streak += 1
+            if self.streak >= SUCCESS_STREAK:
+                self.rate = min(self.max_rate, self.rate + ADDITIVE_STEP)
+                self.streak = 0
+
+    def on_throttle(self, reason: str):
+        """被限流：乘性降速，并清空令牌暂停一段时间"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(MIN_RATE, self.rate * BACKOFF_FACTOR)
+            self.tokens = min(self.tokens, 0) - THROTTLE_COOLDOWN * self.rate
+            self.streak = 0
+            self.throttled += 1
+            self.last_throttle = reason
+            return self.rate
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'rate': round(self.rate, 3),
+                'max_rate': self.max_rate,
+                'requests': self.requests,
+                'throttled': self.throttled,
+                'waited_seconds': round(self.waited, 1),
+                'last_throttle': self.last_throttle
+            }
+
+
+class RateLimiter:
+    """按 (uin, 接口类别) 管理令牌桶"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, uin: str, endpoint: str) -> AdaptiveTokenBucket:
+        key = (uin or '', endpoint)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                rate, max_rate = ENDPOINT_RATES[endpoint]
+                bucket = self._buckets[key] = AdaptiveTokenBucket(rate, max_rate)
+            return bucket
+
+    def acquire(self, uin: str, endpoint: str) -> float:
+        return self.bucket(uin, endpoint).acquire()
+
+    def report(self, uin: str, endpoint: str, reason: Optional[str] = None):
+        """
+        反馈请求结果
+
+        Parameters
+        ----------
+        reason : str, optional
+            被限流的原因（为空表示成功）
+        """
+        bucket = self.bucket(uin, endpoint)
+        if reason:
+            rate = bucket.on_throttle(reason)
+            logger.warning(f"⚠️  {endpoint} 被限流（{reason}），速率降为 {rate:.2f} 次/秒")
+        else:
+            bucket.on_success()
+
+    def stats(self) -> Dict[str, Dict]:
+        """各令牌桶当前的速率和计数，键为 "uin/接口类别" """
+        with self._lock:
+            buckets = dict(self._buckets)
+        return {f"{uin or '-'}/{endpoint}": bucket.stats() for (uin, endpoint), bucket in buckets.items()}
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+limiter = RateLimiter()
+
+
+def classify_url(url: str) -> Optional[str]:
+    """按URL识别接口类别，不是需要限流的微信接口时返回 None"""
+    parts = urlsplit(url)
+    if parts.hostname != 'mp.weixin.qq.com':
+        return None
+    for endpoint, pattern in _ENDPOINT_PATTERNS:
+        if pattern.match(parts.path):
+            return endpoint
+    return None
+
+
+def _normalize_uin(value: str) -> str:
+    """URL中的 uin 是数字的 base64，Cookie 中的 wxuin 是数字本身，统一为数字"""
+    value = unquote(value or '')
+    try:
+        decoded = base64.b64decode(value, validate=True).decode('ascii')
+        if decoded.isdigit():
+            return decoded
+    except Exception:
+        pass
+    return value
+
+
+def extract_uin(url: str, params: Dict = None, data: Dict = None, headers: Dict = None) -> str:
+    """从请求参数、URL、表单或 Cookie 中找出凭据 uin"""
+    for source in (params, data):
+        if isinstance(source, dict) and source.get('uin'):
+            return _normalize_uin(str(source['uin']))
+    query_uin = parse_qs(urlsplit(url).query).get('uin')
+    if query_uin and query_uin[0]:
+        return _normalize_uin(query_uin[0])
+    cookie = (headers or {}).get('Cookie', '')
+    match = re.search(r'wxuin=(\d+)', cookie)
+    return match.group(1) if match else ''
+
+
+def throttle_reason(response) -> Optional[str]:
+    """
+    判断响应是否表示被限流（每个响应都会经过这里，只看原始字节，不解码 response.text）
+
+    Returns
+    -------
+    str or None
+        限流原因（http_429 / http_5xx / too_frequently / ret=N），正常时为 None
+    """
+    if response.status_code == 429 or response.status_code >= 500:
+        return f"http_{response.status_code}"
+    content_type = response.headers.get('Content-Type', '')
+    content = response.content or b''
+    if 'json' in content_type or content[:1] == b'{':
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            ret = data.get('ret', (data.get('base_resp') or {}).get('ret', 0))
+            if ret not in (0, None, SESSION_EXPIRED_RET):
+                return f"ret={ret}"
+            return None
+    if content.find(TOO_FREQUENTLY_BYTES, 0, THROTTLE_SNIFF_SIZE) != -1:
+        return 'too_frequently'
+    return None
@@ -0,0 +1,165 @@
+# coding: utf-8
+"""
+文章HTML后处理基准测试
+对比原来的处理方式（BeautifulSoup 解析三次：内联CSS+替换图片 → 读文件注入留言 → 读文件添加 referrer）
+和 html_transforms 的单次解析处理链，输出每篇文章的 CPU 时间和内存峰值。
+
+用法：
+    python scripts/benchmark_html_transforms.py                 # 使用 articles_html 下保存的文章
+    python scripts/benchmark_html_transforms.py 某目录 --limit 20
+没有找到保存的文章时，使用生成的模拟文章（约 1.5 MB，结构与微信文章页面相似）
+
+CSS 不走网络，两种方式都使用同样的固定CSS内容
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+from html_transforms import (
+    add_referrer_meta,
+    apply_transforms,
+    inject_comments,
+    inline_stylesheets,
+    swap_lazy_images
+)
+from inject_comments_dom import generate_wechat_style_comments, get_comments_css
+
+FAKE_CSS = "body{margin:0;padding:0}\n" * 2000
+COMMENTS = {
+    'elected_comment_total_cnt': 30,
+    'elected_comment': [
+        {'nick_name': f'用户{i}', 'logo_url': '', 'content': '留言内容' * 10,
+         'create_time': 1734062400 + i, 'like_num': i}
+        for i in range(30)
+    ]
+}
+
+
+def synthetic_article(paragraphs: int = 3000) -> str:
+    """生成结构与微信文章页面相似的模拟HTML"""
+    body = ''.join(
+        f'<p style="margin:0 8px">第{i}段正文内容，用于测试解析和序列化的开销。'
+        f'<img data-src="https://mmbiz.qpic.cn/mmbiz_jpg/{i}/640" class="rich_pages"></p>\n'
+        for i in range(paragraphs)
+    )
+    script = (
+        "var nickname = htmlDecode(\"测试公众号\");\nvar user_name = \"gh_0123456789ab\";\n"
+        "var title = '测试文章';\nvar createTime = '2025-12-13 18:00';\nvar biz = \"\" || \"MzA5NjAxNTQ2MA==\";\n"
+        "var msg_link = \"http:\\/\\/mp.weixin.qq.com\\/s?__biz=MzA5NjAxNTQ2MA==&amp;mid=1&amp;idx=1\";\n"
+        "var comment_id = '4288297619342147597';\nvar read_num_new = '1234';\nvar read_num = '1234';\n"
+        "window.appmsg = { provinceName: '广东', hit_nickname: '', old_like_count: '56', like_count: '7',"
+        " share_count: '8', comment_count: '9', is_mp_video: '0' };\n"
+        + "function f(a, b) { var x = { key: 'value', other: \"text\" }; return a < b ? x : null; }\n" * 2000
+    )
+    return (
+        '<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>测试文章</title>\n'
+        '<link rel="stylesheet" href="//res.wx.qq.com/mmbizappmsg/zh_CN/htmledition/js/assets/appmsg.css">\n'
+        '<link rel="stylesheet" href="//res.wx.qq.com/mmbizappmsg/zh_CN/htmledition/js/assets/common.css">\n'
+        f'</head><body><div id="js_content">{body}</div><script>{script}</script></body></html>'
+    )
+
+
+def load_corpus(root: str, limit: int):
+    """读取目录下保存的文章HTML，没有时返回模拟文章"""
+    pages = []
+    if root and os.path.isdir(root):
+        for dirpath, _, filenames in os.walk(root):
+            for filename in sorted(filenames):
+                if filename.endswith('.html'):
+                    with open(os.path.join(dirpath, filename), 'r', encoding='utf-8') as f:
+                        pages.append(f.read())
+                    if len(pages) >= limit:
+                        return pages
+    if not pages:
+        pages = [synthetic_article() for _ in range(min(limit, 5))]
+    return pages
+
+
+def legacy_path(html: str, filepath: str):
+    """原来的处理方式：三次 BeautifulSoup 解析/序列化，两次重新读文件"""
+    soup = BeautifulSoup(html, 'html.parser')
+    css_links = soup.find_all('link', rel='stylesheet')
+    if css_links:
+        style_tag = soup.new_tag('style')
+        style_tag.string = ''.join(f"\n/* CSS from: {link.get('href')} */\n{FAKE_CSS}\n" for link in css_links)
+        soup.head.append(style_tag)
+        for link in css_links:
+            link.decompose()
+    for img in soup.find_all('img'):
+        if img.get('data-src'):
+            img['src'] = img['data-src']
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write(str(soup))
+
+    with open(filepath, 'r', encoding='utf-8') as f:
+        soup = BeautifulSoup(f.read(), 'html.parser')
+    style_tag = soup.new_tag('style')
+    style_tag.string = get_comments_css()
+    soup.head.append(style_tag)
+    soup.body.append(BeautifulSoup(generate_wechat_style_comments(COMMENTS), 'html.parser'))
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write(str(soup))
+
+    with open(filepath, 'r', encoding='utf-8') as f:
+        soup = BeautifulSoup(f.read(), 'html.parser')
+    soup.head.insert(0, soup.new_tag('meta', attrs={'name': 'referrer', 'content': 'no-referrer'}))
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write(str(soup))
+
+
+def transform_chain(html: str, filepath: str):
+    """html_transforms：一次解析、一次序列化、一次写文件"""
+    html = apply_transforms(html, [
+        inline_stylesheets(fetch=lambda url: FAKE_CSS),
+        swap_lazy_images,
+        inject_comments(COMMENTS),
+        add_referrer_meta
+    ])
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write(html)
+
+
+def measure(func, pages, filepath):
+    """返回 (每篇平均CPU毫秒, 最大内存峰值MB)"""
+    cpu_total = 0.0
+    peak = 0
+    for html in pages:
+        tracemalloc.start()
+        start = time.process_time()
+        func(html, filepath)
+        cpu_total += time.process_time() - start
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return cpu_total / len(pages) * 1000, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文章HTML后处理基准测试')
+    parser.add_argument('root', nargs='?', default='articles_html', help='保存的文章目录')
+    parser.add_argument('--limit', type=int, default=20, help='最多使用的文章数')
+    args = parser.parse_args()
+
+    pages = load_corpus(args.root, args.limit)
+    average_size = sum(len(page.encode('utf-8')) for page in pages) / len(pages)
+    print(f"📄 文章数: {len(pages)}，平均大小: {average_size / 1024 / 1024:.2f} MB")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filepath = os.path.join(tmp_dir, 'article.html')
+        legacy_cpu, legacy_peak = measure(legacy_path, pages, filepath)
+        chain_cpu, chain_peak = measure(transform_chain, pages, filepath)
+
+    print(f"{'方式':<24}{'CPU/篇 (ms)':>14}{'内存峰值 (MB)':>16}")
+    print(f"{'BeautifulSoup x3':<24}{legacy_cpu:>14.1f}{legacy_peak:>16.1f}")
+    print(f"{'html_transforms':<24}{chain_cpu:>14.1f}{chain_peak:>16.1f}")
+    print(f"⚡ CPU 时间降低 {1 - chain_cpu / legacy_cpu:.0%}，内存峰值降低 {1 - chain_peak / legacy_peak:.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# coding: utf-8
+"""
+文章页面元数据提取基准测试
+对比原来各模块分别执行的 re.findall（统计数据、标题、comment_id、msg_link，每个都扫描整篇HTML）
+和 page_metadata.extract_page_metadata 的一次扫描，并核对两者提取的结果是否一致。
+
+用法：
+    python scripts/benchmark_page_metadata.py                 # 使用 articles_html 下保存的文章
+    python scripts/benchmark_page_metadata.py 某目录 --limit 50 --repeat 5
+没有找到保存的文章时，使用生成的模拟文章
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark_html_transforms import load_corpus
+from page_metadata import extract_page_metadata
+
+LEGACY_PATTERNS = {
+    'title': r"var title = '(.*?)';",
+    'nickname': r'var nickname = htmlDecode\("(.*?)"\);',
+    'user_name': r'var user_name = "(.*?)";',
+    'create_time': r"var createTime = '(.*?)';",
+    'province_name': r"provinceName: '(.*?)'",
+    'hit_nickname': r"hit_nickname: '(.*?)'",
+    'read_num_new': r"var read_num_new = '(.*?)'",
+    'read_num': r"var read_num = '(.*?)'",
+    'old_like_count': r"old_like_count: '(.*?)'",
+    'like_count': r"like_count: '(.*?)'",
+    'share_count': r"share_count: '(.*?)'",
+    'comment_count': r"comment_count: '(.*?)'",
+    'is_mp_video': r"is_mp_video: '(.*?)'",
+    'comment_id_var': r'var comment_id = [\'"](\d+)[\'"]',
+    'comment_id': r'comment_id = "(\d+)"',
+    'comment_id_jsdecode': r'comment_id:\s*JsDecode\([\'"](\d+)[\'"]\)',
+    'comment_id_data': r"comment_id\.DATA['\)]\s*:\s*'(\d+)'",
+    'msg_link': r'var\s+msg_link\s*=\s*["\']([^"\']+)["\']',
+    'h1_title': r'<h1[^>]*class="rich_media_title"[^>]*>([^<]+)</h1>',
+    'og_title': r'<meta\s+property="og:title"\s+content="([^"]+)"',
+}
+# 原来的写法每次调用都传入正则字符串（依赖 re 模块的编译缓存）
+COMPARED_FIELDS = ('title', 'nickname', 'user_name', 'create_time', 'province_name', 'read_num_new',
+                   'read_num', 'old_like_count', 'share_count', 'comment_count', 'is_mp_video')
+
+
+def legacy_extract(html: str) -> dict:
+    result = {}
+    for name, pattern in LEGACY_PATTERNS.items():
+        matches = re.findall(pattern, html)
+        result[name] = matches[0] if matches else None
+    result['has_video'] = "video_id: '" in html
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文章页面元数据提取基准测试')
+    parser.add_argument('root', nargs='?', default='articles_html', help='保存的文章目录')
+    parser.add_argument('--limit', type=int, default=50, help='最多使用的文章数')
+    parser.add_argument('--repeat', type=int, default=5, help='每篇重复次数')
+    args = parser.parse_args()
+
+    pages = load_corpus(args.root, args.limit)
+    average_size = sum(len(page.encode('utf-8')) for page in pages) / len(pages)
+    print(f"📄 文章数: {len(pages)}，平均大小: {average_size / 1024 / 1024:.2f} MB")
+
+    mismatches = 0
+    for html in pages:
+        legacy = legacy_extract(html)
+        meta = extract_page_metadata(html)
+        for name in COMPARED_FIELDS:
+            if legacy[name] != meta.raw.get(name):
+                mismatches += 1
+                print(f"   ⚠️  {name}: 原方式={legacy[name]!r} 新方式={meta.raw.get(name)!r}")
+
+    timings = {}
+    for label, func in (('re.findall x20', legacy_extract), ('extract_page_metadata', extract_page_metadata)):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for html in pages:
+                func(html)
+        timings[label] = (time.perf_counter() - start) / (args.repeat * len(pages)) * 1000
+
+    print(f"{'方式':<26}{'每篇 (ms)':>12}")
+    for label, elapsed in timings.items():
+        print(f"{label:<26}{elapsed:>12.2f}")
+    legacy_ms, new_ms = timings.values()
+    print(f"⚡ 提速 {legacy_ms / new_ms:.1f} 倍，结果不一致的字段: {mismatches}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+# coding: utf-8
+"""
+MITM代理握手基准测试
+对比原来每次 CONNECT 都新建 SSLContext、从文件加载证书链（新主机还要生成 RSA 密钥），
+和 CAAuth.get_context 的主机 SSLContext 缓存 + 共用主机私钥。
+
+1. 证书/SSLContext：新主机签发证书的耗时，以及已签发主机每个连接准备 SSLContext 的耗时
+2. 端到端：本机起一个 https 服务和 MitmProxy，每次新建连接，统计 CONNECT → 代理连上游 → 客户端TLS握手
+   完成的延迟（之后的 GET 只用来确认连接可用，不计时：本机 TLS 1.3 首个请求的延迟主要是
+   NewSessionTicket 与延迟确认的交互，不经过代理直连也一样）
+
+用法：
+    python scripts/benchmark_proxy_handshake.py
+    python scripts/benchmark_proxy_handshake.py --hosts 20 --connections 200
+证书使用 test/ca.pem、test/ca.crt，主机证书写到临时目录，结束后删除
+"""
+import argparse
+import http.client
+import os
+import shutil
+import ssl
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from OpenSSL.crypto import TYPE_RSA, PKey, X509, X509Extension, FILETYPE_PEM, dump_certificate, dump_privatekey
+from wechatarticles.proxy import CAAuth, MitmProxy, ProxyHandle
+
+CA_FILE = os.path.join(ROOT_DIR, 'test', 'ca.pem')
+CERT_FILE = os.path.join(ROOT_DIR, 'test', 'ca.crt')
+BODY = b'<html>ok</html>'
+
+
+def legacy_sign(ca: CAAuth, cn: str, path: str):
+    """原来的签发方式：每个主机生成一个新的 RSA 密钥"""
+    key = PKey()
+    key.generate_key(TYPE_RSA, 2048)
+    cert = X509()
+    cert.set_version(2)
+    cert.get_subject().CN = cn
+    cert.set_serial_number(ca.serial)
+    cert.gmtime_adj_notBefore(0)
+    cert.gmtime_adj_notAfter(31536000)
+    cert.set_issuer(ca.cert.get_subject())
+    cert.add_extensions([X509Extension(b"subjectAltName", False, f"DNS:{cn}".encode())])
+    cert.set_pubkey(key)
+    cert.sign(ca.key, "sha256")
+    with open(path, 'wb') as f:
+        f.write(dump_privatekey(FILETYPE_PEM, key))
+        f.write(dump_certificate(FILETYPE_PEM, cert))
+
+
+def legacy_context(ca: CAAuth, cn: str) -> ssl.SSLContext:
+    """原来每个 CONNECT 的做法：新建 SSLContext 并从文件加载证书链"""
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certfile=ca[cn])
+    return context
+
+
+def timed(func, repeat: int) -> float:
+    """平均耗时（毫秒）"""
+    start = time.perf_counter()
+    for i in range(repeat):
+        func(i)
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def bench_certificates(cache_dir: str, hosts: int, repeat: int):
+    ca = CAAuth(ca_file=CA_FILE, cert_file=CERT_FILE, cache_dir=os.path.join(cache_dir, 'certs'))
+    legacy_dir = os.path.join(cache_dir, 'legacy')
+    os.makedirs(legacy_dir)
+
+    legacy_ms = timed(lambda i: legacy_sign(ca, f'legacy{i}.example.com',
+                                            os.path.join(legacy_dir, f'{i}.pem')), hosts)
+    ca['warmup.example.com']  # 共用私钥只生成一次
+    new_ms = timed(lambda i: ca[f'host{i}.example.com'], hosts)
+    print(f"🔑 新主机签发证书: 原方式 {legacy_ms:.1f} ms/主机，共用私钥 {new_ms:.1f} ms/主机")
+
+    legacy_ms = timed(lambda i: legacy_context(ca, f'host{i % hosts}.example.com'), repeat)
+    ca.get_context('host0.example.com')
+    new_ms = timed(lambda i: ca.get_context(f'host{i % hosts}.example.com'), repeat)
+    print(f"📦 已签发主机准备SSLContext: 原方式 {legacy_ms:.3f} ms/连接，LRU缓存 {new_ms:.4f} ms/连接")
+
+
+class UpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+class QuietProxyHandle(ProxyHandle):
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class BenchProxy(MitmProxy):
+    daemon_threads = True
+
+
+def start_servers(cache_dir: str):
+    proxy = BenchProxy(server_addr=('127.0.0.1', 0), RequestHandlerClass=QuietProxyHandle,
+                       https=True, ca_file=CA_FILE, cert_file=CERT_FILE)
+    proxy.ca = CAAuth(ca_file=CA_FILE, cert_file=CERT_FILE, cache_dir=os.path.join(cache_dir, 'proxy'))
+    upstream = ThreadingServer(('127.0.0.1', 0), UpstreamHandler)
+    upstream.socket = proxy.ca.get_context('127.0.0.1').wrap_socket(upstream.socket, server_side=True)
+    for server in (proxy, upstream):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    return proxy, upstream
+
+
+def connect_once(proxy_port: int, upstream_port: int) -> float:
+    """新建连接：CONNECT → TLS握手，返回耗时（毫秒）；之后发一个 GET 确认连接可用"""
+    conn = http.client.HTTPSConnection('127.0.0.1', proxy_port, timeout=10,
+                                       context=ssl._create_unverified_context())
+    conn.set_tunnel('127.0.0.1', upstream_port)
+    start = time.perf_counter()
+    conn.connect()
+    elapsed = (time.perf_counter() - start) * 1000
+    conn.request('GET', '/')
+    body = conn.getresponse().read()
+    conn.close()
+    assert body == BODY
+    return elapsed
+
+
+def bench_handshakes(cache_dir: str, connections: int):
+    proxy, upstream = start_servers(cache_dir)
+    proxy_port, upstream_port = proxy.server_address[1], upstream.server_address[1]
+    cached_get_context = proxy.ca.get_context
+
+    results = {}
+    for label, get_context in (('原方式（每次加载证书链）', lambda cn: legacy_context(proxy.ca, cn)),
+                               ('SSLContext缓存', cached_get_context)):
+        proxy.ca.get_context = get_context
+        connect_once(proxy_port, upstream_port)  # 预热：签发证书
+        latencies = [connect_once(proxy_port, upstream_port) for _ in range(connections)]
+        results[label] = latencies
+        print(f"🤝 {label}: 中位数 {statistics.median(latencies):.2f} ms，"
+              f"P95 {sorted(latencies)[int(len(latencies) * 0.95) - 1]:.2f} ms")
+
+    proxy.shutdown()
+    upstream.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='MITM代理握手基准测试')
+    parser.add_argument('--hosts', type=int, default=10, help='签发证书的主机数')
+    parser.add_argument('--repeat', type=int, default=200, help='准备SSLContext的次数')
+    parser.add_argument('--connections', type=int, default=100, help='端到端新建连接次数')
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp(prefix='proxy_bench_')
+    try:
+        bench_certificates(cache_dir, args.hosts, args.repeat)
+        bench_handshakes(cache_dir, args.connections)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -12,11 +12,14 @@
 """
 
 import re
-import time
 import json
 import csv
-import requests
-from datetime import datetime, timedelta
+import http_client
+import rate_limiter
+from comments_client import CommentsClient
+from css_cache import css_cache_stats
+from page_metadata import extract_page_metadata
+from datetime import datetime
 from params.new_wechat_config import COOKIE
 from wechatarticles import ArticlesInfo
 
@@ -51,7 +54,7 @@ def extract_biz_from_url(article_url):
             }
             
             # 访问短链接，获取重定向后的完整 URL
-            response = requests.get(article_url, headers=headers, allow_redirects=True, timeout=15)
+            response = http_client.get(article_url, headers=headers, allow_redirects=True, timeout=15)
             final_url = response.url
             
             print(f"   重定向后的 URL: {final_url[:120]}...")
@@ -65,12 +68,8 @@ def extract_biz_from_url(article_url):
             else:
                 # 尝试从响应内容中提取
                 print(f"   URL 中未找到 BIZ，尝试从页面内容提取...")
-                content = response.text
-                match = re.search(r'var\s+biz\s*=\s*["\']([^"\']+)["\']', content)
-                if not match:
-                    match = re.search(r'"biz"\s*:\s*"([^"]+)"', content)
-                if match:
-                    biz = match.group(1)
+                biz = extract_page_metadata(response.text).biz
+                if biz:
                     print(f"   ✅ 从页面内容提取到 BIZ: {biz}")
                     return biz
                 
@@ -90,8 +89,8 @@ def get_profile_url(biz):
 def download_article_html(article_url, title, publish_date, output_dir="articles_html"):
     """
     下载文章 HTML 内容
-    直接使用 requests，设置合适的 headers
-    下载并内联外部 CSS，使 HTML 文件可以独立显示
+    通过共享连接池（http_client）请求，设置合适的 headers
+    下载并内联外部 CSS（通过 css_cache 缓存），使 HTML 文件可以独立显示
     
     Parameters
     ----------
@@ -111,7 +110,7 @@ def download_article_html(article_url, title, publish_date, output_dir="articles
     """
     import os
     import html as html_module
-    from bs4 import BeautifulSoup
+    from html_transforms import apply_transforms, inline_stylesheets, swap_lazy_images
     
     # 创建输出目录
     os.makedirs(output_dir, exist_ok=True)
@@ -133,20 +132,13 @@ def download_article_html(article_url, title, publish_date, output_dir="articles
         article_url = html_module.unescape(article_url)
         
         # 设置 headers（模拟浏览器）
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1'
-        }
+        headers = http_client.build_headers('desktop')
         
         # 禁用代理
         proxies = {"http": None, "https": None}
         
         # 下载 HTML
-        response = requests.get(article_url, headers=headers, proxies=proxies, timeout=15)
+        response = http_client.get(article_url, headers=headers, proxies=proxies, timeout=15)
         
         if response.status_code == 200:
             html_content = response.text
@@ -156,71 +148,15 @@ def download_article_html(article_url, title, publish_date, output_dir="articles
                 print(f"      ⚠️  可能触发了验证页面（大小{len(html_content)}字节）")
                 # 仍然保存，但标记可能有问题
             
-            # 解析 HTML
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            # 查找所有外部 CSS 链接
-            css_links = soup.find_all('link', rel='stylesheet')
-            
-            if css_links:
-                print(f"      📥 发现 {len(css_links)} 个外部CSS，正在下载...")
-                
-                # 收集所有CSS内容
-                all_css = []
-                
-                for i, link in enumerate(css_links, 1):
-                    css_url = link.get('href')
-                    if css_url:
-                        # 处理相对路径
-                        if css_url.startswith('//'):
-                            css_url = 'https:' + css_url
-                        elif css_url.startswith('/'):
-                            css_url = 'https://mp.weixin.qq.com' + css_url
-                        elif not css_url.startswith('http'):
-                            continue
-                        
-                        try:
-                            # 下载 CSS
-                            css_response = requests.get(css_url, headers=headers, proxies=proxies, timeout=10)
-                            if css_response.status_code == 200:
-                                all_css.append(f"\n/* CSS from: {css_url} */\n")
-                                all_css.append(css_response.text)
-                                all_css.append("\n")
-                        except Exception as e:
-                            print(f"      ⚠️  下载CSS失败: {css_url[:50]}... - {e}")
-                
-                # 如果成功下载了CSS，替换外部链接为内联样式
-                if all_css:
-                    # 创建一个新的 style 标签
-                    style_tag = soup.new_tag('style')
-                    style_tag.string = ''.join(all_css)
-                    
-                    # 在 head 中插入
-                    if soup.head:
-                        soup.head.append(style_tag)
-                    
-                    # 移除所有外部CSS链接
-                    for link in css_links:
-                        link.decompose()
-                    
-                    print(f"      ✅ 已内联 {len(css_links)} 个CSS文件")
-            
-            # 处理图片：将 data-src 替换到 src
-            img_tags = soup.find_all('img')
-            if img_tags:
-                replaced_count = 0
-                for img in img_tags:
-                    data_src = img.get('data-src')
-                    if data_src:
-                        # 将 data-src 的值设置为 src
-                        img['src'] = data_src
-                        replaced_count += 1
-                
-                if replaced_count > 0:
-                    print(f"      ✅ 已替换 {replaced_count} 个图片的 src 属性")
-            
-            # 更新 HTML 内容
-            html_content = str(soup)
+            # 内联CSS（从CSS缓存读取）、将 data-src 替换到 src：只解析和序列化一次
+            results = {}
+            html_content = apply_transforms(
+                html_content, [inline_stylesheets(headers, proxies), swap_lazy_images], results
+            )
+            if results['inline_stylesheets']:
+                print(f"      ✅ 已内联 {results['inline_stylesheets']} 个CSS文件")
+            if results['swap_lazy_images']:
+                print(f"      ✅ 已替换 {results['swap_lazy_images']} 个图片的 src 属性")
             
             # 保存 HTML
             with open(filepath, 'w', encoding='utf-8') as f:
@@ -238,9 +174,9 @@ def download_article_html(article_url, title, publish_date, output_dir="articles
         return ""
 
 
-def fetch_articles_from_profile(biz, start_date=None, end_date=None):
+def fetch_articles_from_profile(biz, start_date=None, end_date=None, incremental_sync=None, max_pages=1):
     """
-    从公众号首页获取文章列表
+    从公众号首页获取文章列表（边迭代边请求，见 profile_listing）
     
     Parameters
     ----------
@@ -250,12 +186,17 @@ def fetch_articles_from_profile(biz, start_date=None, end_date=None):
         开始日期
     end_date : datetime, optional
         结束日期
+    incremental_sync : IncrementalSync, optional
+        增量同步状态（需要数据库）：已入库的文章跳过，遇到已入库的主文章时停止
+    max_pages : int, optional
+        最多列出的页数（默认只取第一页，None 为全部）
     
     Returns
     -------
-    list
-        文章列表
+    ProfileListing
+        文章迭代器：每列出一页就产出这一页的文章，交给 stream_article_pipeline 下载和获取统计数据
     """
+    from profile_listing import ProfileListing
     
     print(f"\n{'='*80}")
     print(f"📡 正在获取公众号文章列表...")
@@ -274,167 +215,44 @@ def fetch_articles_from_profile(biz, start_date=None, end_date=None):
         print("⚠️  警告：未找到 appmsg_token")
         appmsg_token = ""
     
-    # 构造请求头
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36 MicroMessenger/3.4.0',
-        'Cookie': COOKIE,
-        'Referer': f'https://mp.weixin.qq.com/mp/profile_ext?action=home&__biz={biz}&scene=124',
-        'Accept': 'application/json, text/javascript, */*; q=0.01',
-        'X-Requested-With': 'XMLHttpRequest',
-    }
-    
-    # ✅ 创建 ArticlesInfo 实例（用于获取留言数据）
-    try:
-        from wechatarticles import ArticlesInfo
-        articles_info = ArticlesInfo(appmsg_token, COOKIE)
-        print("✅ ArticlesInfo 实例已创建（支持留言注入）")
-    except Exception as e:
-        print(f"⚠️  ArticlesInfo 创建失败: {e}")
-        print("   留言注入功能将不可用")
-        articles_info = None
-    
-    all_articles = []
-    offset = 0
-    count = 10  # 每次获取10篇
-    
-    while True:
-        # 构造 API URL - 使用真实参数
-        api_url = (
-            f"https://mp.weixin.qq.com/mp/profile_ext?"
-            f"action=getmsg&"
-            f"__biz={biz}&"
-            f"f=json&"
-            f"offset={offset}&"
-            f"count={count}&"
-            f"is_ok=1&"
-            f"scene=124&"
-            f"uin={UIN}&"
-            f"key={KEY}&"
-            f"pass_ticket={PASS_TICKET}&"
-            f"wxtoken=&"
-            f"appmsg_token={appmsg_token}&"
-            f"x5=0"
-        )
-        
-        try:
-            print(f"   正在获取第 {offset//count + 1} 页...")
-            
-            response = requests.get(api_url, headers=headers, timeout=10)
-            data = response.json()
-            
-            if data.get('ret') != 0:
-                print(f"   ⚠️  API 返回错误: {data.get('errmsg', 'Unknown error')}")
-                print(f"   返回数据: {json.dumps(data, ensure_ascii=False)[:200]}")
-                break
-            
-            # 解析文章列表
-            general_msg_list = data.get('general_msg_list', {})
-            if isinstance(general_msg_list, str):
-                general_msg_list = json.loads(general_msg_list)
-            
-            msg_list = general_msg_list.get('list', [])
-            
-            if not msg_list:
-                print(f"   ✅ 已获取所有文章")
-                break
-            
-            # 处理每条消息
-            for msg in msg_list:
-                comm_msg_info = msg.get('comm_msg_info', {})
-                app_msg_ext_info = msg.get('app_msg_ext_info', {})
-                
-                if not app_msg_ext_info:
-                    continue
-                
-                # 获取发布时间
-                publish_time = comm_msg_info.get('datetime', 0)
-                
-                # 检查日期范围
-                if start_date and end_date:
-                    article_date = datetime.fromtimestamp(publish_time)
-                    if article_date < start_date or article_date > end_date + timedelta(days=1):
-                        continue
-                
-                # 主文章
-                article_url = app_msg_ext_info.get('content_url', '').replace('\\/', '/')
-                article_title = app_msg_ext_info.get('title', '')
-                article_date = datetime.fromtimestamp(publish_time).strftime('%Y-%m-%d')
-                
-                # 下载文章 HTML（包含统计数据的完整版本 + 留言）
-                print(f"      正在下载完整 HTML: {article_title[:30]}...")
-                from download_full_html import download_full_html_with_stats
-                full_result = download_full_html_with_stats(
-                    article_url, 
-                    article_title, 
-                    article_date, 
-                    output_dir="articles_html",
-                    inject_comments=True,  # ✅ 启用留言注入
-                    articles_info=articles_info  # ✅ 传入ArticlesInfo实例
-                )
-                html_file = full_result.get('filepath', '')
-                
-                # ✅ 直接使用下载时提取的统计数据，避免重复请求
-                extracted_stats = full_result.get('stats', {})
-                
-                time.sleep(0.5)  # 避免请求过快
-                
-                article = {
-                    'title': article_title,
-                    'url': article_url,
-                    'local_html_path': html_file,
-                    'digest': app_msg_ext_info.get('digest', ''),
-                    'cover': app_msg_ext_info.get('cover', ''),
-                    'publish_time': publish_time,
-                    'publish_date': datetime.fromtimestamp(publish_time).strftime('%Y-%m-%d'),
-                    # ✅ 保存下载时提取的统计数据
-                    '_extracted_stats': extracted_stats,
-                }
-                
-                if article['url']:
-                    all_articles.append(article)
-                
-                # 多图文消息
-                multi_app_msg_item_list = app_msg_ext_info.get('multi_app_msg_item_list', [])
-                for item in multi_app_msg_item_list:
-                    sub_article_url = item.get('content_url', '').replace('\\/', '/')
-                    sub_article_title = item.get('title', '')
-                    sub_article_date = datetime.fromtimestamp(publish_time).strftime('%Y-%m-%d')
-                    
-                    print(f"      正在下载完整 HTML: {sub_article_title[:30]}...")
-                    sub_full_result = download_full_html_with_stats(sub_article_url, sub_article_title, sub_article_date, output_dir="articles_html")
-                    sub_html_file = sub_full_result.get('filepath', '')
-                    time.sleep(0.5)  # 避免请求过快
-                    
-                    sub_article = {
-                        'title': sub_article_title,
-                        'url': sub_article_url,
-                        'local_html_path': sub_html_file,
-                        'digest': item.get('digest', ''),
-                        'cover': item.get('cover', ''),
-                        'publish_time': publish_time,
-                        'publish_date': datetime.fromtimestamp(publish_time).strftime('%Y-%m-%d'),
-                    }
-                    
-                    if sub_article['url']:
-                        all_articles.append(sub_article)
-            
-            print(f"   已获取 {len(all_articles)} 篇文章")
-            
-            # 只获取第一页，不继续循环
-            print(f"   ✅ 已获取第一页文章（如需更多，可修改代码）")
-            break
-            
-        except Exception as e:
-            print(f"   ❌ 获取失败: {e}")
-            break
+    credentials = {'uin': UIN, 'key': KEY, 'pass_ticket': PASS_TICKET, 'appmsg_token': appmsg_token, 'cookie': COOKIE}
+    return ProfileListing(biz, credentials, start_date, end_date, incremental_sync=incremental_sync,
+                          max_pages=max_pages, record_coverage=False)
+
+
+def download_article(article, articles_info=None):
+    """
+    下载文章 HTML（包含统计数据的完整版本 + 留言），返回带本地路径和已提取统计数据的文章
     
-    print(f"\n{'='*80}")
-    print(f"✅ 文章列表获取完成")
-    print(f"{'='*80}")
-    print(f"总共获取: {len(all_articles)} 篇文章")
-    print(f"{'='*80}\n")
+    Parameters
+    ----------
+    article : dict
+        列表中的文章（title、url、publish_date 等）
+    articles_info : ArticlesInfo, optional
+        用于获取留言；为 None 时不注入留言
     
-    return all_articles
+    Returns
+    -------
+    dict
+        {**article, 'local_html_path', '_extracted_stats'}
+    """
+    from download_full_html import download_full_html_with_stats
+    
+    print(f"      正在下载完整 HTML: {article['title'][:30]}...")
+    full_result = download_full_html_with_stats(
+        article['url'],
+        article['title'],
+        article['publish_date'],
+        output_dir="articles_html",
+        inject_comments=articles_info is not None,  # ✅ 启用留言注入
+        articles_info=articles_info  # ✅ 传入ArticlesInfo实例
+    )
+    return {
+        **article,
+        'local_html_path': full_result.get('filepath', ''),
+        # ✅ 保存下载时提取的统计数据，避免重复请求
+        '_extracted_stats': full_result.get('stats', {}),
+    }
 
 
 def get_article_stats(article_url, articles_info=None, use_html_extraction=True):
@@ -574,6 +392,47 @@ def get_article_stats_api(article_url, articles_info):
         }
 
 
+def collect_article_stats(article, articles_info=None):
+    """
+    获取单篇文章的统计数据并与文章信息合并
+    
+    优先使用下载时已提取的统计数据，没有时再请求一次
+    
+    Returns
+    -------
+    dict
+        {**article, **stats}
+    """
+    # ✅ 优先使用下载时已提取的统计数据（避免重复请求）
+    if article.get('_extracted_stats') and isinstance(article.get('_extracted_stats'), dict) and len(article['_extracted_stats']) > 0:
+        extracted = article['_extracted_stats']
+        stats = {
+            'read_count': int(extracted.get('read_num', 0)) if extracted.get('read_num') else 0,
+            'old_like_count': int(extracted.get('old_like_count', 0)) if extracted.get('old_like_count') else 0,  # 点赞（大拇指👍）
+            'like_count': int(extracted.get('like_count', 0)) if extracted.get('like_count') else 0,  # 喜欢/收藏（爱心❤️）
+            'comment_count': int(extracted.get('comment_count', 0)) if extracted.get('comment_count') else 0,
+            'share_count': int(extracted.get('share_count', 0)) if extracted.get('share_count') else 0,
+            'nickname': extracted.get('nickname', ''),
+            'user_name': extracted.get('user_name', ''),
+            'article_type': extracted.get('article_type', '图文'),
+            'success': True,
+            'method': 'from_download_cache'
+        }
+    else:
+        # 如果下载时没有提取到，再请求一次
+        stats = get_article_stats(article['url'], articles_info)
+    
+    # 并发处理时多篇文章的输出会交错，每篇的结果放在一行里
+    if stats['success']:
+        method_info = f" [{stats.get('method', 'unknown')}]" if 'method' in stats else ""
+        # ✅ 输出顺序：阅读量、点赞、分享、喜欢、评论
+        print(f"   ✅ {article['title'][:30]} ({article['publish_date']}) 阅读: {stats['read_count']:,} | 点赞: {stats.get('old_like_count', 0):,} | 分享: {stats['share_count']:,} | 喜欢: {stats.get('like_count', 0):,} | 评论: {stats['comment_count']}{method_info}")
+    else:
+        print(f"   ❌ {article['title'][:30]} 获取失败{': ' + stats.get('error', '') if stats.get('error') else ''}")
+    
+    return {**article, **stats}
+
+
 def parse_date_range(date_str):
     """解析日期范围"""
     if not date_str:
@@ -673,79 +532,51 @@ def main():
         print("❌ 日期格式错误")
         return
     
-    # 获取文章列表
-    articles = fetch_articles_from_profile(biz, start_date, end_date)
-    
-    if not articles:
-        print("\n⚠️  没有获取到文章")
-        return
-    
     # 提取 appmsg_token
     appmsg_token = extract_appmsg_token_from_cookie(COOKIE)
     if not appmsg_token:
         print("❌ 无法从 Cookie 中提取 appmsg_token")
         return
     
-    # 创建 ArticlesInfo 实例
-    articles_info = ArticlesInfo(appmsg_token, COOKIE)
+    # 创建 ArticlesInfo 实例（用于获取留言数据）：请求走 http_client 限流，留言分页获取
+    articles_info = ArticlesInfo(
+        appmsg_token, COOKIE,
+        client=http_client,
+        comments_client=CommentsClient({'appmsg_token': appmsg_token, 'cookie': COOKIE}),
+        timeout=http_client.DEFAULT_TIMEOUT,
+    )
+    
+    # 获取文章列表，同时下载HTML并获取统计数据：每列出一页，其中的文章立即进入流水线
+    # （流水线控制并发，请求频率由 http_client 自适应限流）
+    print(f"📊 开始列出文章并批量获取统计数据...\n")
+    articles = fetch_articles_from_profile(biz, start_date, end_date)
     
-    # 批量获取统计数据
-    print(f"📊 开始批量获取统计数据...\n")
+    from article_pipeline import stream_article_pipeline
+    from params.new_wechat_config import UIN
+    finished = {}
+    stream_article_pipeline(
+        articles,
+        [lambda article: download_article(article, articles_info),
+         lambda article: collect_article_stats(article, articles_info)],
+        credential=UIN,
+        on_result=lambda index, result: finished.__setitem__(index, result)
+    )
+    results = [finished[index] for index in sorted(finished)]
+    
+    if not results:
+        print("\n⚠️  没有获取到文章")
+        return
     
-    results = []
-    success_count = 0
-    
-    for i, article in enumerate(articles, 1):
-        print(f"[{i}/{len(articles)}] {article['title']}")
-        print(f"   发布时间: {article['publish_date']}")
-        
-        # ✅ 优先使用下载时已提取的统计数据（避免重复请求）
-        
-        if article.get('_extracted_stats') and isinstance(article.get('_extracted_stats'), dict) and len(article['_extracted_stats']) > 0:
-            print(f"   ✅ 使用下载时提取的统计数据（无需重复请求）")
-            extracted = article['_extracted_stats']
-            stats = {
-                'read_count': int(extracted.get('read_num', 0)) if extracted.get('read_num') else 0,
-                'old_like_count': int(extracted.get('old_like_count', 0)) if extracted.get('old_like_count') else 0,  # 点赞（大拇指👍）
-                'like_count': int(extracted.get('like_count', 0)) if extracted.get('like_count') else 0,  # 喜欢/收藏（爱心❤️）
-                'comment_count': int(extracted.get('comment_count', 0)) if extracted.get('comment_count') else 0,
-                'share_count': int(extracted.get('share_count', 0)) if extracted.get('share_count') else 0,
-                'nickname': extracted.get('nickname', ''),
-                'user_name': extracted.get('user_name', ''),
-                'article_type': extracted.get('article_type', '图文'),
-                'success': True,
-                'method': 'from_download_cache'
-            }
-        else:
-            # 如果下载时没有提取到，再请求一次
-            print(f"   正在获取统计数据...")
-            stats = get_article_stats(article['url'], articles_info)
-        
-        if stats['success']:
-            success_count += 1
-            share_info = f" | 分享: {stats['share_count']}" if stats.get('share_count', 0) > 0 else ""
-            method_info = f" [{stats.get('method', 'unknown')}]" if 'method' in stats else ""
-            # ✅ 输出顺序：阅读量、点赞、分享、喜欢、评论
-            print(f"   ✅ 阅读: {stats['read_count']:,} | 点赞: {stats.get('old_like_count', 0):,} | 分享: {stats['share_count']:,} | 喜欢: {stats.get('like_count', 0):,} | 评论: {stats['comment_count']}{method_info}")
-        else:
-            print(f"   ❌ 获取失败{': ' + stats.get('error', '') if stats.get('error') else ''}")
-        
-        # 合并数据
-        result = {**article, **stats}
-        results.append(result)
-        
-        # 避免请求过快
-        if i < len(articles):
-            time.sleep(2)
-        
-        print()
+    success_count = sum(1 for result in results if result and result.get('success'))
+    total_count = len(results)
+    results = [result for result in results if result]
     
     print(f"{'='*80}")
     print(f"✅ 批量获取完成")
     print(f"{'='*80}")
-    print(f"总共: {len(articles)} 篇文章")
+    print(f"总共: {total_count} 篇文章")
     print(f"成功: {success_count} 篇")
-    print(f"失败: {len(articles) - success_count} 篇")
+    print(f"失败: {total_count - success_count} 篇")
     print(f"{'='*80}\n")
     
     # 保存数据
@@ -759,6 +590,18 @@ def main():
     save_to_json(results, json_filename)
     
     print(f"\n🎉 完成！共获取 {len(results)} 篇文章的数据")
+    
+    conn_stats = http_client.connection_stats()
+    if conn_stats['requests']:
+        print(f"🔌 HTTP请求 {conn_stats['requests']} 次，新建连接（握手）{conn_stats['new_connections']} 次，"
+              f"连接复用率 {conn_stats['reuse_rate']:.0%}")
+    css_stats = css_cache_stats()
+    if css_stats['lookups']:
+        print(f"🎨 CSS缓存：查询 {css_stats['lookups']} 次，命中率 {css_stats['hit_rate']:.0%}，"
+              f"下载 {css_stats['downloads']} 次，304验证 {css_stats['revalidated']} 次")
+    for key, bucket in rate_limiter.limiter.stats().items():
+        print(f"🚦 {key}: 当前速率 {bucket['rate']} 次/秒，请求 {bucket['requests']} 次，"
+              f"被限流 {bucket['throttled']} 次，累计等待 {bucket['waited_seconds']} 秒")
 
 
 if __name__ == "__main__":
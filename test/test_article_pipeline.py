@@ -0,0 +1,91 @@
+# coding: utf-8
+"""article_pipeline：同一凭据的并发上限与 concurrency 参数校验"""
+import threading
+import time
+
+import pytest
+
+from article_pipeline import (
+    CREDENTIAL_CONCURRENCY,
+    parse_concurrency,
+    run_article_pipeline,
+    stream_article_pipeline,
+)
+
+
+class InFlight:
+    """记录同时在执行的阶段数的最大值"""
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def stage(self, article):
+        with self._lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+        time.sleep(0.02)
+        with self._lock:
+            self.current -= 1
+        return article['url']
+
+
+def articles(count, prefix):
+    return [{'title': f'{prefix}{i}', 'url': f'{prefix}{i}'} for i in range(count)]
+
+
+def test_overlapping_calls_share_credential_cap():
+    in_flight = InFlight()
+    results = {}
+
+    def run(name, concurrency):
+        results[name] = run_article_pipeline(articles(12, name), [in_flight.stage],
+                                             credential='uin-shared', concurrency=concurrency, timeout=30)
+
+    threads = [threading.Thread(target=run, args=('a', CREDENTIAL_CONCURRENCY)),
+               threading.Thread(target=run, args=('b', 1)),
+               threading.Thread(target=run, args=('c', 2))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert in_flight.peak <= CREDENTIAL_CONCURRENCY
+    assert results['a'] == [f'a{i}' for i in range(12)]
+    assert results['b'] == [f'b{i}' for i in range(12)]
+
+
+def test_stream_and_batch_share_credential_cap():
+    in_flight = InFlight()
+    thread = threading.Thread(target=run_article_pipeline, args=(articles(12, 'a'), [in_flight.stage]),
+                              kwargs={'credential': 'uin-mixed', 'concurrency': 2, 'timeout': 30})
+    thread.start()
+    produced = stream_article_pipeline(iter(articles(12, 's')), [in_flight.stage],
+                                       credential='uin-mixed', concurrency=CREDENTIAL_CONCURRENCY, timeout=30)
+    thread.join()
+
+    assert produced == 12
+    assert in_flight.peak <= CREDENTIAL_CONCURRENCY
+
+
+def test_call_concurrency_limits_single_call():
+    in_flight = InFlight()
+    run_article_pipeline(articles(8, 'x'), [in_flight.stage], credential='uin-single', concurrency=1, timeout=30)
+    assert in_flight.peak == 1
+
+
+@pytest.mark.parametrize('value, expected', [
+    (None, None),
+    (1, 1),
+    ('2', 2),
+    (CREDENTIAL_CONCURRENCY + 10, CREDENTIAL_CONCURRENCY),
+])
+def test_parse_concurrency(value, expected):
+    assert parse_concurrency(value) == expected
+
+
+@pytest.mark.parametrize('value', [0, -1, 'abc', '', 1.5, True, [3]])
+def test_parse_concurrency_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        parse_concurrency(value)
@@ -0,0 +1,173 @@
+# coding: utf-8
+"""comments_client：留言分页、回复分页与去重（http_client.get 替换为本地数据）"""
+import json
+import urllib.parse
+
+import pytest
+
+import comments_client
+from comments_client import CommentsClient
+
+ARTICLE_URL = "https://mp.weixin.qq.com/s?__biz=MzA5&mid=2650&idx=1&sn=abc"
+
+
+class FakeResponse:
+    def __init__(self, data, status_code=200):
+        self.status_code = status_code
+        self.text = json.dumps(data)
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class FakeCommentApi:
+    """
+    模拟 appmsg_comment 接口
+
+    getcomment 每页最多返回 server_page_size 条（少于请求的 limit）；
+    getcommentreply 按 replies[content_id] 分页，fail_offsets 中的留言页返回 500
+    """
+
+    def __init__(self, comments, replies=None, server_page_size=10, fail_offsets=(), reply_page_size=2,
+                 continue_flag=None):
+        self.comments = comments
+        self.replies = replies or {}
+        self.server_page_size = server_page_size
+        self.fail_offsets = set(fail_offsets)
+        self.reply_page_size = reply_page_size
+        self.continue_flag = continue_flag or (lambda content_id, offset, page: 1)
+        self.calls = []
+
+    def get(self, url, **kwargs):
+        params = {key: values[0] for key, values in urllib.parse.parse_qs(urllib.parse.urlsplit(url).query).items()}
+        self.calls.append(params)
+        offset = int(params['offset'])
+        if params['action'] == 'getcomment':
+            if offset in self.fail_offsets:
+                return FakeResponse({}, status_code=500)
+            page = self.comments[offset:offset + min(int(params['limit']), self.server_page_size)]
+            return FakeResponse({'base_resp': {'ret': 0},
+                                 'elected_comment_total_cnt': len(self.comments),
+                                 'elected_comment': page})
+        content_id = params['content_id']
+        page = self.replies.get(content_id, [])[offset:offset + self.reply_page_size]
+        return FakeResponse({'base_resp': {'ret': 0},
+                             'reply_list': {'reply_list': page},
+                             'continue_flag': self.continue_flag(content_id, offset, page)})
+
+    def offsets(self, action):
+        return sorted(int(params['offset']) for params in self.calls if params['action'] == action)
+
+
+def make_comment(content_id, reply_total=0, replies=()):
+    return {'content_id': content_id, 'nick_name': f'user{content_id}', 'content': f'留言{content_id}',
+            'reply_new': {'reply_total_cnt': reply_total, 'reply_list': list(replies)}}
+
+
+def make_reply(reply_id):
+    return {'reply_id': reply_id, 'nick_name': f'r{reply_id}', 'content': f'回复{reply_id}'}
+
+
+@pytest.fixture
+def install(monkeypatch):
+    def install(api):
+        monkeypatch.setattr(comments_client.http_client, 'get', api.get)
+        return api
+    return install
+
+
+def test_pages_follow_first_page_size(install):
+    api = install(FakeCommentApi([make_comment(str(i)) for i in range(25)], server_page_size=10))
+
+    comment_set = CommentsClient({'cookie': 'c'}, concurrency=1).fetch(ARTICLE_URL, '123')
+
+    # 请求 limit=100，服务端每页只给 10 条：按第一页的实际条数翻页
+    assert api.offsets('getcomment') == [0, 10, 20]
+    assert [comment.content_id for comment in comment_set.comments] == [str(i) for i in range(25)]
+    assert comment_set.total == 25
+    assert comment_set.requests == 3
+    assert comment_set.complete
+    assert api.calls[0]['__biz'] == 'MzA5' and api.calls[0]['appmsgid'] == '2650'
+
+
+def test_failed_page_marks_set_incomplete(install):
+    install(FakeCommentApi([make_comment(str(i)) for i in range(25)], server_page_size=10,
+                           fail_offsets={10}))
+
+    comment_set = CommentsClient({}, concurrency=2).fetch(ARTICLE_URL, '123')
+
+    assert comment_set.errors == 1
+    assert len(comment_set.comments) == 15
+    assert comment_set.total == 25
+    assert not comment_set.complete
+
+
+def test_failed_first_page_returns_empty_set(install):
+    install(FakeCommentApi([make_comment('1')], fail_offsets={0}))
+
+    comment_set = CommentsClient({}).fetch(ARTICLE_URL, '123')
+
+    assert comment_set.comments == []
+    assert comment_set.errors == 1
+    assert comment_set.to_dict() == {'elected_comment_total_cnt': 0, 'elected_comment': []}
+
+
+def test_reply_paging_stops_on_continue_flag_zero(install):
+    replies = [make_reply(i) for i in range(10)]
+    api = install(FakeCommentApi(
+        [make_comment('c1', reply_total=10, replies=replies[:1])],
+        replies={'c1': replies},
+        reply_page_size=2,
+        # 第二页之后服务端表示没有更多（虽然总数还没到）
+        continue_flag=lambda content_id, offset, page: 0 if offset >= 2 else 1
+    ))
+
+    comment_set = CommentsClient({}).fetch(ARTICLE_URL, '123')
+
+    assert api.offsets('getcommentreply') == [0, 2]
+    comment = comment_set.comments[0]
+    assert [reply.reply_id for reply in comment.replies] == [0, 1, 2, 3]
+    assert not comment_set.complete
+
+
+def test_replies_fetched_until_total(install):
+    replies = [make_reply(i) for i in range(5)]
+    api = install(FakeCommentApi([make_comment('c1', reply_total=5, replies=replies[:2])],
+                                 replies={'c1': replies}, reply_page_size=2))
+
+    comment_set = CommentsClient({}).fetch(ARTICLE_URL, '123')
+
+    assert api.offsets('getcommentreply') == [0, 2, 4]
+    assert [reply.reply_id for reply in comment_set.comments[0].replies] == [0, 1, 2, 3, 4]
+    assert comment_set.complete
+    assert comment_set.to_dict()['elected_comment'][0]['reply_new']['reply_total_cnt'] == 5
+
+
+def test_dedupes_comments_by_content_id(install):
+    # 翻页期间有新留言置顶，同一条留言出现在相邻两页
+    comments = [make_comment(str(i)) for i in range(10)] + [make_comment('9')] + \
+        [make_comment(str(i)) for i in range(10, 19)]
+    install(FakeCommentApi(comments, server_page_size=10))
+
+    comment_set = CommentsClient({}, concurrency=1).fetch(ARTICLE_URL, '123')
+
+    assert [comment.content_id for comment in comment_set.comments] == [str(i) for i in range(19)]
+
+
+def test_dedupes_replies_by_reply_id(install):
+    # 分页期间有新回复，上一页最后一条又出现在下一页开头
+    replies = [make_reply(0), make_reply(1), make_reply(1), make_reply(2)]
+    install(FakeCommentApi([make_comment('c1', reply_total=3)], replies={'c1': replies}, reply_page_size=2))
+
+    comment_set = CommentsClient({}).fetch(ARTICLE_URL, '123')
+
+    assert [reply.reply_id for reply in comment_set.comments[0].replies] == [0, 1, 2]
+
+
+def test_without_comment_id_makes_no_request(install):
+    api = install(FakeCommentApi([make_comment('1')]))
+
+    comment_set = CommentsClient({}).fetch(ARTICLE_URL, '')
+
+    assert api.calls == []
+    assert comment_set.comments == []
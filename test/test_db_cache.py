@@ -0,0 +1,197 @@
+# coding: utf-8
+"""db_cache：LRU + TTL 缓存、命中计数、保存后（事务提交之后）清除缓存（使用内存 SQLite）"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+
+import database
+import db_cache
+from db_cache import (
+    TTLCache,
+    article_meta_cache,
+    cache_stats,
+    clear_caches,
+    get_cached_article_with_freshness,
+    get_cached_parameters,
+    parameters_cache,
+)
+from db_operations import invalidate_parameters, save_article, save_articles_bulk, save_parameters
+
+BIZ = "MzA5NzQ2NjE2MQ=="
+URL = f"https://mp.weixin.qq.com/s?__biz={BIZ}&mid=2650&idx=1&sn=abcdef"
+
+
+class FakeNow:
+    """替换 db_cache.datetime，now() 返回可以推进的时间"""
+
+    def __init__(self, monkeypatch):
+        self.now = datetime(2024, 5, 1, 12, 0, 0)
+        clock = self
+
+        class FakeDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return clock.now
+
+        monkeypatch.setattr(db_cache, "datetime", FakeDatetime)
+
+    def advance(self, seconds):
+        self.now += timedelta(seconds=seconds)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    return FakeNow(monkeypatch)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """内存 SQLite，并记录事务提交和缓存清除的先后顺序"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    monkeypatch.setattr(database, "engine", engine)
+    original_bind = database.SessionLocal.kw["bind"]
+    database.SessionLocal.configure(bind=engine)
+    database.init_db()
+    clear_caches()
+
+    events = []
+    event.listen(engine, "commit", lambda conn: events.append("commit"))
+    for name in ("evict_articles", "evict_parameters"):
+        original = getattr(db_cache, name)
+
+        def recording(arg, _original=original, _name=name):
+            events.append(_name)
+            return _original(arg)
+
+        monkeypatch.setattr(db_cache, name, recording)
+
+    yield events
+    clear_caches()
+    database.SessionLocal.configure(bind=original_bind)
+    engine.dispose()
+
+
+# ---------- TTLCache ----------
+
+def test_entry_expires_after_ttl(clock):
+    cache = TTLCache("t", maxsize=10, ttl_seconds=60)
+    cache.set("a", 1)
+
+    clock.advance(59)
+    assert cache.get("a") == 1
+    clock.advance(2)
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_lru_eviction_at_capacity(clock):
+    cache = TTLCache("t", maxsize=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # a 变成最近使用
+
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_hit_and_miss_counters(clock):
+    cache = TTLCache("t", maxsize=10, ttl_seconds=60)
+    cache.get("a")
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("a")
+    clock.advance(61)
+    cache.get("a")  # 过期算未命中
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 2)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_invalidate_where(clock):
+    cache = TTLCache("t", maxsize=10, ttl_seconds=60)
+    for key in range(5):
+        cache.set(key, {"id": key})
+
+    cache.invalidate_where(lambda key, value: value["id"] % 2 == 0)
+
+    assert [key for key in range(5) if cache.get(key) is not None] == [1, 3]
+
+
+# ---------- 文章元数据缓存 ----------
+
+def test_cached_article_hits_after_first_lookup(db, monkeypatch):
+    save_article({'biz': BIZ, 'url': URL, 'title': 't', 'read_count': 10})
+
+    article, is_fresh = get_cached_article_with_freshness(URL)
+    assert article['read_count'] == 10 and is_fresh
+
+    def no_db(*args, **kwargs):
+        raise AssertionError("命中缓存时不应访问数据库")
+    monkeypatch.setattr(db_cache, "get_article_with_freshness", no_db)
+
+    article, is_fresh = get_cached_article_with_freshness(URL)
+    assert article['read_count'] == 10 and is_fresh
+
+    stats = cache_stats()["article_meta"]
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_missing_article_is_not_cached(db):
+    assert get_cached_article_with_freshness(URL) == (None, False)
+    save_article({'biz': BIZ, 'url': URL, 'title': 't'})
+    assert get_cached_article_with_freshness(URL)[0]['title'] == 't'
+
+
+def test_save_article_evicts_after_commit(db):
+    save_article({'biz': BIZ, 'url': URL, 'title': 't', 'read_count': 10})
+    get_cached_article_with_freshness(URL)
+    db.clear()
+
+    save_article({'biz': BIZ, 'url': URL, 'read_count': 20})
+
+    assert db == ["commit", "evict_articles"]
+    assert article_meta_cache.get(URL) is None
+    assert get_cached_article_with_freshness(URL)[0]['read_count'] == 20
+
+
+def test_bulk_save_evicts_after_commit(db):
+    save_articles_bulk([{'biz': BIZ, 'url': URL, 'title': 't', 'read_count': 10}])
+    get_cached_article_with_freshness(URL)
+    db.clear()
+
+    save_articles_bulk([{'biz': BIZ, 'url': URL, 'title': 't', 'read_count': 30}])
+
+    assert db == ["commit", "evict_articles"]
+    assert get_cached_article_with_freshness(URL)[0]['read_count'] == 30
+
+
+# ---------- 参数缓存 ----------
+
+def test_save_parameters_evicts_after_commit(db):
+    save_parameters(BIZ, {'cookie': 'appmsg_token=old;', 'uin': '1'})
+    assert get_cached_parameters(BIZ)['appmsg_token'] == 'old'
+    db.clear()
+
+    save_parameters(BIZ, {'cookie': 'appmsg_token=new;', 'uin': '1'})
+
+    assert db == ["commit", "evict_parameters"]
+    assert parameters_cache.get(BIZ) is None
+    assert get_cached_parameters(BIZ)['appmsg_token'] == 'new'
+
+
+def test_invalidate_parameters_evicts_after_commit(db):
+    save_parameters(BIZ, {'cookie': 'appmsg_token=tok;', 'uin': '1'})
+    assert get_cached_parameters(BIZ) is not None
+    db.clear()
+
+    invalidate_parameters(BIZ)
+
+    assert db == ["commit", "evict_parameters"]
+    assert get_cached_parameters(BIZ) is None
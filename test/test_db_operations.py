@@ -0,0 +1,207 @@
+# coding: utf-8
+"""article_key 与 db_operations 的批量写入、键集分页、覆盖区间（使用内存 SQLite）"""
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+import database
+import db_operations
+from article_key import canonical_article_key, extract_core_params
+from db_operations import (
+    decode_article_cursor,
+    get_articles_page,
+    get_uncovered_ranges,
+    record_fetch_coverage,
+    save_articles_bulk,
+    save_articles_with_fallback,
+)
+
+BIZ = "MzA5NzQ2NjE2MQ=="
+
+
+def article_url(mid, idx=1, sn="abcdef", **extra):
+    query = "&".join(f"{key}={value}" for key, value in extra.items())
+    url = f"https://mp.weixin.qq.com/s?__biz={BIZ}&mid={mid}&idx={idx}&sn={sn}"
+    return f"{url}&{query}" if query else url
+
+
+def article_row(mid, idx=1, **fields):
+    return {'biz': BIZ, 'url': article_url(mid, idx), 'title': f'文章{mid}-{idx}', **fields}
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """把 database.engine / SessionLocal 换成内存 SQLite（同一连接，测试结束即丢弃）"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    monkeypatch.setattr(database, "engine", engine)
+    original_bind = database.SessionLocal.kw["bind"]
+    database.SessionLocal.configure(bind=engine)
+    database.init_db()
+    yield engine
+    database.SessionLocal.configure(bind=original_bind)
+    engine.dispose()
+
+
+# ---------- article_key ----------
+
+def test_canonical_key_ignores_volatile_params():
+    plain = canonical_article_key(article_url(2650, 2))
+    noisy = canonical_article_key(article_url(2650, 2, chksm="8d0e", scene=27) + "#rd")
+    assert plain == noisy == (BIZ, 2650, 2, "abcdef")
+
+
+def test_canonical_key_handles_escaped_urls():
+    escaped = article_url(2650, sn="ABCDEF").replace("&", "&amp;").replace("/", "\\/")
+    encoded = article_url(2650).replace("==", "%3D%3D")
+    assert canonical_article_key(escaped) == (BIZ, 2650, 1, "abcdef")
+    assert canonical_article_key(encoded) == (BIZ, 2650, 1, "abcdef")
+
+
+@pytest.mark.parametrize("url", [
+    None,
+    "",
+    "https://mp.weixin.qq.com/s/AbCdEfGhIjKlMn",  # 短链接
+    f"https://mp.weixin.qq.com/s?__biz={BIZ}&mid=2650&sn=abcdef",  # 缺 idx
+])
+def test_canonical_key_unparseable(url):
+    assert canonical_article_key(url) is None
+    assert extract_core_params(url) is None
+
+
+# ---------- save_articles_bulk ----------
+
+def test_bulk_save_statuses(db):
+    first = save_articles_bulk([article_row(1, read_count=10), article_row(2, read_count=20)])
+    assert [result['status'] for result in first] == ['inserted', 'inserted']
+
+    second = save_articles_bulk([
+        article_row(1, read_count=10),  # 没有变化
+        article_row(2, read_count=25),  # 阅读数变化
+        article_row(3),  # 新文章
+    ])
+    assert [result['status'] for result in second] == ['unchanged', 'updated', 'inserted']
+    assert second[0]['id'] == first[0]['id']
+    assert second[1]['id'] == first[1]['id']
+
+
+def test_bulk_save_matches_by_canonical_key(db):
+    [inserted] = save_articles_bulk([article_row(1, read_count=10)])
+
+    # chksm/scene 不同的同一篇文章：按 (biz, mid, idx, sn) 更新同一行
+    [updated] = save_articles_bulk([{
+        'biz': BIZ, 'url': article_url(1, chksm="ffee", scene=126), 'read_count': 11
+    }])
+    assert updated == {**updated, 'id': inserted['id'], 'status': 'updated'}
+
+
+def test_bulk_save_dedupes_rows_within_batch(db):
+    results = save_articles_bulk([article_row(1, read_count=1), article_row(1, read_count=2)])
+
+    assert len({result['id'] for result in results}) == 1
+    page = get_articles_page(BIZ, fields=['id', 'read_count'])
+    assert [article['read_count'] for article in page['articles']] == [2]
+
+
+def test_fallback_saves_rows_individually_when_bulk_fails(db, monkeypatch):
+    def broken_bulk(articles_data):
+        raise RuntimeError("bulk failed")
+    monkeypatch.setattr(db_operations, "save_articles_bulk", broken_bulk)
+
+    counts = save_articles_with_fallback([article_row(1), article_row(2), {'biz': BIZ}])  # 第三行缺少url
+
+    assert counts == {'inserted': 0, 'updated': 0, 'unchanged': 0, 'saved_individually': 2, 'failed': 1}
+    assert len(get_articles_page(BIZ, fields=['id'])['articles']) == 2
+
+
+def test_fallback_counts_bulk_statuses(db):
+    counts = save_articles_with_fallback([article_row(1)])
+    save_articles_with_fallback([article_row(1), article_row(2)], counts)
+
+    assert counts == {'inserted': 2, 'updated': 0, 'unchanged': 1, 'saved_individually': 0, 'failed': 0}
+
+
+# ---------- get_articles_page ----------
+
+def test_keyset_pages_cover_all_rows_in_order(db):
+    # 两天各3篇，另有1篇没有发布日期（排在最后）
+    rows = [article_row(mid, publish_date=f"2024-05-0{1 + mid % 2}") for mid in range(1, 7)]
+    rows.append(article_row(99))
+    save_articles_bulk(rows)
+
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        page = get_articles_page(BIZ, limit=3, cursor=cursor, fields=['id', 'publish_date'])
+        seen.extend(page['articles'])
+        pages += 1
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+
+    assert pages == 3
+    assert len({article['id'] for article in seen}) == 7
+    dated = [article for article in seen if article['publish_date']]
+    # 发布日期降序，同一天按 id 降序
+    assert [(article['publish_date'], article['id']) for article in dated] == \
+        sorted(((article['publish_date'], article['id']) for article in dated), reverse=True)
+    assert seen[-1]['publish_date'] is None
+
+
+def test_keyset_page_respects_date_range(db):
+    save_articles_bulk([article_row(mid, publish_date=f"2024-05-{mid:02d}") for mid in range(1, 11)])
+
+    page = get_articles_page(BIZ, start_date=datetime(2024, 5, 3), end_date=datetime(2024, 5, 6),
+                             limit=2, fields=['publish_date'])
+    assert [article['publish_date'] for article in page['articles']] == ['2024-05-06', '2024-05-05']
+
+    page = get_articles_page(BIZ, start_date=datetime(2024, 5, 3), end_date=datetime(2024, 5, 6),
+                             limit=2, cursor=page['next_cursor'], fields=['publish_date'])
+    assert [article['publish_date'] for article in page['articles']] == ['2024-05-04', '2024-05-03']
+    assert page['next_cursor'] is None
+
+
+def test_cursor_round_trip_and_invalid_cursor():
+    cursor = db_operations._encode_article_cursor(date(2024, 5, 1), 42)
+    assert decode_article_cursor(cursor) == (date(2024, 5, 1), 42)
+    with pytest.raises(ValueError):
+        decode_article_cursor("not-a-cursor")
+
+
+# ---------- get_uncovered_ranges ----------
+
+def test_uncovered_without_coverage_is_whole_range(db):
+    assert get_uncovered_ranges(BIZ, date(2024, 1, 1), date(2024, 1, 31)) == \
+        [(date(2024, 1, 1), date(2024, 1, 31))]
+
+
+def test_uncovered_merges_adjacent_and_overlapping_intervals(db):
+    record_fetch_coverage(BIZ, date(2024, 1, 1), date(2024, 1, 5))
+    record_fetch_coverage(BIZ, date(2024, 1, 6), date(2024, 1, 10))  # 相邻
+    record_fetch_coverage(BIZ, date(2024, 1, 8), date(2024, 1, 12))  # 重叠
+    record_fetch_coverage(BIZ, date(2024, 1, 20), date(2024, 1, 25))
+
+    assert get_uncovered_ranges(BIZ, date(2024, 1, 1), date(2024, 1, 31)) == [
+        (date(2024, 1, 13), date(2024, 1, 19)),
+        (date(2024, 1, 26), date(2024, 1, 31)),
+    ]
+    assert get_uncovered_ranges(BIZ, date(2024, 1, 2), date(2024, 1, 11)) == []
+
+
+def test_uncovered_ignores_stale_coverage(db):
+    record_fetch_coverage(BIZ, date(2024, 1, 1), date(2024, 1, 10),
+                          listed_at=datetime.now() - timedelta(hours=48))
+    record_fetch_coverage(BIZ, date(2024, 1, 4), date(2024, 1, 6))
+
+    assert get_uncovered_ranges(BIZ, date(2024, 1, 1), date(2024, 1, 10), max_age_hours=24) == [
+        (date(2024, 1, 1), date(2024, 1, 3)),
+        (date(2024, 1, 7), date(2024, 1, 10)),
+    ]
+
+
+def test_uncovered_stops_at_today(db):
+    today = date.today()
+    assert get_uncovered_ranges(BIZ, today - timedelta(days=2), today + timedelta(days=30)) == \
+        [(today - timedelta(days=2), today)]
@@ -0,0 +1,234 @@
+# coding: utf-8
+"""
+MitmProxy 长连接回环测试：本机起一个 https 上游和代理（端口都为0），客户端经 CONNECT 隧道在同一连接上发多个请求
+分别覆盖流式转发（StreamResponse）和插件订阅后的完整读取（Response）两条路径
+"""
+import http.client
+import os
+import socket
+import ssl
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from wechatarticles.proxy import CAAuth, MitmProxy, ProxyHandle, RspIntercept
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+CA_FILE = os.path.join(TEST_DIR, "ca.pem")
+CERT_FILE = os.path.join(TEST_DIR, "ca.crt")
+BODY = b"<html>keep-alive</html>"
+CHUNKS = [b"first chunk,", b"second chunk,", b"last"]
+
+
+class UpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path.endswith("/not-modified"):
+            # 没有响应体，但带着 chunked 头
+            self.send_response(304)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            return
+        if path.endswith("/chunked"):
+            self.send_response(200)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            if self.command == "HEAD":
+                return
+            for chunk in CHUNKS:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.write(b"0\r\n\r\n")
+            return
+        self.send_response(200)
+        if path.endswith("/cookies"):
+            self.send_header("Set-Cookie", "a=1; Path=/")
+            self.send_header("Set-Cookie", "b=2; Path=/")
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(BODY)
+
+    do_HEAD = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+class QuietProxyHandle(ProxyHandle):
+    def hook_init(self):
+        self.filter_url_lst = ["127.0.0.1"]
+
+    def log_message(self, *args):
+        pass
+
+
+class BufferedPlug(RspIntercept):
+    """订阅 /buffered 下的响应，这些响应走完整读取的 Response"""
+    url_filters = ["/buffered/"]
+
+    def deal_response(self, response):
+        response.get_body_data()  # 触发解压
+        return response
+
+
+class Upstream(ThreadingHTTPServer):
+    daemon_threads = True
+    connections = 0
+
+
+class Proxy(MitmProxy):
+    daemon_threads = True
+
+
+@pytest.fixture(scope="module")
+def servers(tmp_path_factory):
+    proxy = Proxy(server_addr=("127.0.0.1", 0), RequestHandlerClass=QuietProxyHandle,
+                  ca_file=CA_FILE, cert_file=CERT_FILE)
+    proxy.ca = CAAuth(ca_file=CA_FILE, cert_file=CERT_FILE, cache_dir=str(tmp_path_factory.mktemp("certs")))
+    proxy.register(BufferedPlug)
+    upstream = Upstream(("127.0.0.1", 0), UpstreamHandler)
+    upstream.socket = proxy.ca.get_context("127.0.0.1").wrap_socket(upstream.socket, server_side=True)
+    for server in (proxy, upstream):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield proxy, upstream
+    for server in (proxy, upstream):
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def connect(servers):
+    proxy, upstream = servers
+    connections = []
+
+    def connect():
+        conn = http.client.HTTPSConnection("127.0.0.1", proxy.server_address[1], timeout=5,
+                                           context=ssl._create_unverified_context())
+        conn.set_tunnel("127.0.0.1", upstream.server_address[1])
+        connections.append(conn)
+        return conn
+
+    yield connect
+    for conn in connections:
+        conn.close()
+
+
+def request(conn, method, path):
+    conn.request(method, path)
+    response = conn.getresponse()
+    return response, response.read()
+
+
+@pytest.mark.parametrize("prefix", ["/stream", "/buffered"])
+def test_upstream_socket_reused(servers, connect, prefix):
+    _, upstream = servers
+    conn = connect()
+    before = upstream.connections
+
+    for i in range(5):
+        response, body = request(conn, "GET", f"{prefix}/page?i={i}")
+        assert response.status == 200
+        assert body == BODY
+
+    # 客户端一个TLS连接，上游也只建立一个连接
+    assert upstream.connections - before == 1
+
+
+def test_chunked_response_is_rechunked_when_streaming(connect):
+    conn = connect()
+
+    response, body = request(conn, "GET", "/stream/chunked")
+    assert response.getheader("Transfer-Encoding") == "chunked"
+    assert body == b"".join(CHUNKS)
+
+    # 分块结尾正确，同一连接上的下一个请求正常
+    response, body = request(conn, "GET", "/stream/page")
+    assert body == BODY
+
+
+def test_chunked_response_gets_content_length_when_buffered(connect):
+    conn = connect()
+
+    response, body = request(conn, "GET", "/buffered/chunked")
+    assert response.getheader("Transfer-Encoding") is None
+    assert response.getheader("Content-Length") == str(len(b"".join(CHUNKS)))
+    assert body == b"".join(CHUNKS)
+
+    response, body = request(conn, "GET", "/buffered/page")
+    assert body == BODY
+
+
+@pytest.mark.parametrize("prefix", ["/stream", "/buffered"])
+def test_head_does_not_hang(connect, prefix):
+    conn = connect()
+
+    response, body = request(conn, "HEAD", f"{prefix}/page")
+    assert response.status == 200
+    assert body == b""
+    # HEAD 响应保留上游的 Content-Length（对应 GET 响应体的长度）
+    assert response.getheader("Content-Length") == str(len(BODY))
+
+    response, body = request(conn, "GET", f"{prefix}/page")
+    assert body == BODY
+
+
+def raw_bodiless_exchange(conn, method, path):
+    """
+    在隧道上直接收发（http.client 会容忍多出的结束块，遇到带chunked头的304自己也会阻塞）：
+    返回响应头，并确认响应头之后代理没有再发送任何字节
+    """
+    conn.connect()
+    conn.sock.sendall(f"{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n".encode())
+    data = b""
+    while b"\r\n\r\n" not in data:
+        data += conn.sock.recv(4096)
+    head, _, extra = data.partition(b"\r\n\r\n")
+    conn.sock.settimeout(0.3)
+    try:
+        extra += conn.sock.recv(4096)
+    except socket.timeout:
+        pass
+    conn.sock.settimeout(5)
+    assert extra == b""
+    return head
+
+
+@pytest.mark.parametrize("prefix", ["/stream", "/buffered"])
+def test_head_with_chunked_response_keeps_connection_in_sync(connect, prefix):
+    conn = connect()
+
+    head = raw_bodiless_exchange(conn, "HEAD", f"{prefix}/chunked")
+    assert head.startswith(b"HTTP/1.1 200")
+
+    # 同一连接上的下一个请求正常
+    response, body = request(conn, "GET", f"{prefix}/page")
+    assert response.status == 200
+    assert body == BODY
+
+
+@pytest.mark.parametrize("prefix", ["/stream", "/buffered"])
+def test_not_modified_with_chunked_header_does_not_block(connect, prefix):
+    conn = connect()
+
+    head = raw_bodiless_exchange(conn, "GET", f"{prefix}/not-modified")
+    assert head.startswith(b"HTTP/1.1 304")
+
+    response, body = request(conn, "GET", f"{prefix}/page")
+    assert body == BODY
+
+
+@pytest.mark.parametrize("prefix", ["/stream", "/buffered"])
+def test_both_set_cookie_headers_preserved(connect, prefix):
+    conn = connect()
+
+    response, body = request(conn, "GET", f"{prefix}/cookies")
+    assert response.msg.get_all("Set-Cookie") == ["a=1; Path=/", "b=2; Path=/"]
+    assert body == BODY
@@ -0,0 +1,158 @@
+# coding: utf-8
+"""rate_limiter：AIMD 调速与限流判断"""
+import json
+
+import pytest
+
+import rate_limiter
+from rate_limiter import (
+    ADDITIVE_STEP,
+    BACKOFF_FACTOR,
+    SUCCESS_STREAK,
+    THROTTLE_COOLDOWN,
+    THROTTLE_SNIFF_SIZE,
+    AdaptiveTokenBucket,
+    throttle_reason,
+)
+
+
+class FakeClock:
+    """替换 time.monotonic / time.sleep，sleep 只推进时间"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class FakeResponse:
+    """只有 content（字节），读取 text 视为测试失败：throttle_reason 不应解码整个响应体"""
+
+    def __init__(self, status_code=200, text="", content_type="text/html"):
+        self.status_code = status_code
+        self.content = text.encode("utf-8")
+        self.headers = {"Content-Type": content_type}
+
+    @property
+    def text(self):
+        raise AssertionError("throttle_reason 不应读取 response.text")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(rate_limiter.time, "sleep", clock.sleep)
+    return clock
+
+
+def json_response(data):
+    return FakeResponse(text=json.dumps(data), content_type="application/json")
+
+
+def test_rate_increases_after_success_streak(clock):
+    bucket = AdaptiveTokenBucket(rate=1.0, max_rate=4.0)
+    for _ in range(SUCCESS_STREAK - 1):
+        bucket.on_success()
+    assert bucket.rate == 1.0
+
+    bucket.on_success()
+    assert bucket.rate == pytest.approx(1.0 + ADDITIVE_STEP)
+    assert bucket.streak == 0
+
+
+def test_rate_never_exceeds_max_rate(clock):
+    bucket = AdaptiveTokenBucket(rate=1.95, max_rate=2.0)
+    for _ in range(SUCCESS_STREAK * 3):
+        bucket.on_success()
+    assert bucket.rate == 2.0
+
+
+def test_throttle_halves_rate_and_resets_streak(clock):
+    bucket = AdaptiveTokenBucket(rate=2.0, max_rate=4.0)
+    for _ in range(SUCCESS_STREAK - 1):
+        bucket.on_success()
+
+    assert bucket.on_throttle("http_429") == pytest.approx(2.0 * BACKOFF_FACTOR)
+    assert bucket.streak == 0
+    assert bucket.throttled == 1
+    assert bucket.last_throttle == "http_429"
+
+    # 限流后的连续成功重新计数
+    for _ in range(SUCCESS_STREAK - 1):
+        bucket.on_success()
+    assert bucket.rate == pytest.approx(2.0 * BACKOFF_FACTOR)
+
+
+def test_throttle_pauses_for_cooldown(clock):
+    bucket = AdaptiveTokenBucket(rate=2.0, max_rate=4.0)
+    assert bucket.acquire() == 0  # 初始有一个令牌
+    bucket.on_throttle("too_frequently")
+
+    # 降速后冷却 THROTTLE_COOLDOWN 秒，之后再等一个令牌
+    wait = bucket.acquire()
+    assert wait == pytest.approx(THROTTLE_COOLDOWN + 1 / bucket.rate)
+    assert clock.slept == [wait]
+
+
+def test_throttle_during_cooldown_extends_pause(clock):
+    bucket = AdaptiveTokenBucket(rate=2.0, max_rate=4.0)
+    bucket.on_throttle("http_503")
+    first_rate = bucket.rate
+    bucket.on_throttle("http_503")
+
+    wait = bucket.acquire()
+    assert wait > THROTTLE_COOLDOWN + 1 / first_rate
+
+
+@pytest.mark.parametrize("status_code", [429, 500, 502, 503])
+def test_http_429_and_5xx_are_throttling(status_code):
+    assert throttle_reason(FakeResponse(status_code=status_code)) == f"http_{status_code}"
+
+
+@pytest.mark.parametrize("status_code", [200, 301, 404])
+def test_other_status_codes_are_not_throttling(status_code):
+    assert throttle_reason(FakeResponse(status_code=status_code, text="<html></html>")) is None
+
+
+@pytest.mark.parametrize("data, reason", [
+    ({"ret": -6}, "ret=-6"),
+    ({"ret": 200013}, "ret=200013"),
+    ({"base_resp": {"ret": -1}}, "ret=-1"),
+])
+def test_nonzero_ret_is_throttling(data, reason):
+    assert throttle_reason(json_response(data)) == reason
+
+
+@pytest.mark.parametrize("data", [
+    {"ret": 0},
+    {"base_resp": {"ret": 0}},
+    {"ret": -3, "errmsg": "no session"},  # 参数失效，不是限流
+    {"appmsgstat": {"read_num": 1}},
+])
+def test_ok_or_session_expired_ret_is_not_throttling(data):
+    assert throttle_reason(json_response(data)) is None
+
+
+def test_json_body_without_json_content_type():
+    assert throttle_reason(FakeResponse(text='{"ret": -6}', content_type="text/plain")) == "ret=-6"
+
+
+def test_too_frequently_page_is_throttling():
+    html = "<html><body><p>你的访问过于频繁，请稍后再试</p></body></html>"
+    assert throttle_reason(FakeResponse(text=html)) == "too_frequently"
+
+
+def test_marker_only_searched_in_prefix():
+    # 正文很长的文章里（如引用）出现同样的文字不算限流
+    html = "<html>" + "x" * THROTTLE_SNIFF_SIZE + "你的访问过于频繁</html>"
+    assert throttle_reason(FakeResponse(text=html)) is None
@@ -4,11 +4,29 @@ import re
 import requests
 from bs4 import BeautifulSoup as bs
 
+# 页面中comment_id的几种写法（感谢@[harry7756](https://github.com/harry7756)建议）
+# 与 page_metadata.parse_page_metadata 支持的写法和优先级一致（var 声明 > 赋值 > JsDecode > DATA），修改时两边同步；
+# wechatarticles 作为独立包发布，不能导入仓库根目录的模块，所以这里保留一份
+COMMENT_ID_PATTERNS = [
+    re.compile(r"var comment_id = '(\d+)'"),
+    re.compile(r'comment_id = "(\d+)"'),
+    re.compile(r"comment_id:\s*JsDecode\(['\"](\d+)['\"]\)"),
+    re.compile(r"comment_id\.DATA'\)\s*:\s*'(\d+)'"),
+]
+
 
 class ArticlesInfo(object):
     """登录WeChat，获取更加详细的推文信息。如点赞数、阅读数、评论等"""
 
-    def __init__(self, appmsg_token, cookie, proxies={"http": None, "https": None}):
+    def __init__(
+        self,
+        appmsg_token,
+        cookie,
+        proxies={"http": None, "https": None},
+        client=None,
+        comments_client=None,
+        timeout=(5, 15),
+    ):
         """
         初始化参数
 
@@ -18,9 +36,20 @@ class ArticlesInfo(object):
             点开微信公众号文章抓包工具获取的cookie
         appmsg_token: str
             点开微信公众号文章抓包工具获取的appmsg_token
+        client: optional
+            发送请求的对象，需要有与requests.Session相同的get/post方法
+            （如共享连接池、按uin限流的客户端）；默认使用不读取系统代理的requests.Session
+        comments_client: optional
+            分页获取留言的对象，fetch(article_url, comment_id)返回带comments和to_dict()的结果；
+            默认只请求一页留言（limit=100）
+        timeout: tuple or float
+            请求超时（连接, 读取），默认 (5, 15)
         """
         self.s = requests.session()
         self.s.trust_env = False
+        self.client = client if client is not None else self.s
+        self.comments_client = comments_client
+        self.timeout = timeout
         self.appmsg_token = appmsg_token
         self.headers = {
             "User-Agent": "Mozilla/5.0 AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0Chrome/57.0.2987.132 MQQBrowser/6.2 Mobile",
@@ -86,62 +115,81 @@ class ArticlesInfo(object):
             logger.error(f"         [read_like_nums] 堆栈: {traceback.format_exc()}")
             raise Exception("params is error, please check your article_url")
 
-    def comments(self, article_url):
+    def comments(self, article_url, comment_id=None):
         """
         获取文章评论
 
+        设置了 comments_client 时分页获取全部精选留言及回复；否则只请求一次 getcomment 接口，返回其原始json（最多100条，回复不全）
+
         Parameters
         ----------
         article_url: str
             文章链接
+        comment_id: str, optional
+            已知的comment_id（如已下载页面的 PageMetadata.comment_id），传入时不再请求文章页面
 
         Returns
         -------
-        json::
-
-            {
-                "base_resp": {
-                    "errmsg": "ok",
-                    "ret": 0
-                },
-                "elected_comment": [
-                    {
-                        "content": 用户评论文字,
-                        "content_id": "6846263421277569047",
-                        "create_time": 1520098511,
-                        "id": 3,
-                        "is_from_friend": 0,
-                        "is_from_me": 0,
-                        "is_top": 0, 是否被置顶
-                        "like_id": 10001,
-                        "like_num": 3,
-                        "like_status": 0,
-                        "logo_url": "http://wx.qlogo.cn/mmhead/OibRNdtlJdkFLMHYLMR92Lvq0PicDpJpbnaicP3Z6kVcCicLPVjCWbAA9w/132",
-                        "my_id": 23,
-                        "nick_name": 评论用户的名字,
-                        "reply": {
-                            "reply_list": [ ]
+        json
+            出错、没有comment_id或没有评论时返回 {}
+
+            未设置 comments_client 时为 getcomment 接口的原始返回::
+
+                {
+                    "base_resp": {"ret": 0, "errmsg": "ok"},
+                    "elected_comment": [ 精选留言（字段同下，reply 为接口自带的少量回复） ],
+                    "elected_comment_total_cnt": 3, 评论总数
+                    "enabled": 1,
+                    "friend_comment": [ ],
+                    "is_fans": 1,
+                    "logo_url": 当前用户头像,
+                    "my_comment": [ ],
+                    "nick_name": 当前用户昵称,
+                    "only_fans_can_comment": false
+                }
+
+            设置了 comments_client 时为 CommentSet.to_dict()，包含全部分页的留言及回复::
+
+                {
+                    "elected_comment": [
+                        {
+                            "content": 用户评论文字,
+                            "content_id": "6846263421277569047",
+                            "create_time": 1520098511,
+                            "id": 3,
+                            "is_from_friend": 0,
+                            "is_from_me": 0,
+                            "is_top": 0, 是否被置顶
+                            "like_id": 10001,
+                            "like_num": 3,
+                            "like_status": 0,
+                            "logo_url": "http://wx.qlogo.cn/mmhead/OibRNdtlJdkFLMHYLMR92Lvq0PicDpJpbnaicP3Z6kVcCicLPVjCWbAA9w/132",
+                            "my_id": 23,
+                            "nick_name": 评论用户的名字,
+                            "reply_new": {
+                                "reply_total_cnt": 0,
+                                "reply_list": [ ] 全部回复
+                            }
                         }
-                    }
-                ],
-                "elected_comment_total_cnt": 3, 评论总数
-                "enabled": 1,
-                "friend_comment": [ ],
-                "is_fans": 1,
-                "logo_url": "http://wx.qlogo.cn/mmhead/Q3auHgzwzM6GAic0FAHOu9Gtv5lEu5kUqO6y6EjEFjAhuhUNIS7Y2AQ/132",
-                "my_comment": [ ],
-                "nick_name": 当前用户名,
-                "only_fans_can_comment": false
-            }
+                    ],
+                    "elected_comment_total_cnt": 3, 评论总数
+                }
         """
         __biz, _, idx, _ = self.__get_params(article_url)
         getcomment_url = "https://mp.weixin.qq.com/mp/appmsg_comment?action=getcomment&__biz={}&idx={}&comment_id={}&limit=100"
         try:
-            comment_id = self.__get_comment_id(article_url)
+            if not comment_id:
+                comment_id = self.__get_comment_id(article_url)
             if comment_id == "":
                 return {}
+            if self.comments_client is not None:
+                # 分页获取全部精选留言及回复
+                comment_set = self.comments_client.fetch(article_url, comment_id)
+                return comment_set.to_dict() if comment_set.comments else {}
             url = getcomment_url.format(__biz, idx, comment_id)
-            return self.s.get(url, headers=self.headers, proxies=self.proxies).json()
+            return self.client.get(
+                url, headers=self.headers, proxies=self.proxies, timeout=self.timeout
+            ).json()
         except Exception as e:
             print(e)
             return {}
@@ -160,14 +208,14 @@ class ArticlesInfo(object):
         str:
             comment_id获取评论必要参数
         """
-        res = self.s.get(article_url, data=self.data, proxies=self.proxies)
+        res = self.client.get(
+            article_url, data=self.data, proxies=self.proxies, timeout=self.timeout
+        )
         # 使用正则提取comment_id
-        comment_id = re.findall(r'comment_id = "(\d+)"', res.text)
-        # 增加其他情况，感谢@[harry7756](https://github.com/harry7756)建议
-        if len(comment_id) == 0:
-            comment_id = re.findall(r"(?<=comment_id.DATA\'\)\s\:\s\')[0-9]+", res.text)
-        if len(comment_id) > 0:
-            return comment_id[0]
+        for pattern in COMMENT_ID_PATTERNS:
+            comment_id = pattern.search(res.text)
+            if comment_id:
+                return comment_id.group(1)
         return ""
 
     def __get_params(self, article_url):
@@ -232,18 +280,16 @@ class ArticlesInfo(object):
         # 将params参数换到data中请求。这一步貌似不换也行
         origin_url = "https://mp.weixin.qq.com/mp/getappmsgext?"
         appmsgext_url = origin_url + "appmsg_token={}&x5=0".format(self.appmsg_token)
-        self.data["__biz"] = __biz
-        self.data["mid"] = mid
-        self.data["sn"] = sn
-        self.data["idx"] = idx
+        # 每次请求使用独立的 data，同一实例可以在多个线程中并发调用
+        data = {**self.data, "__biz": __biz, "mid": mid, "sn": sn, "idx": idx}
 
         logger.debug(f"         [__get_appmsgext] 请求 URL: {appmsgext_url[:80]}...")
-        logger.debug(f"         [__get_appmsgext] 请求 data: {self.data}")
+        logger.debug(f"         [__get_appmsgext] 请求 data: {data}")
         
         # appmsgext_url = origin_url + "__biz={}&mid={}&sn={}&idx={}&appmsg_token={}&x5=1".format(
         #     __biz, mid, sn, idx, self.appmsg_token)
-        response = requests.post(
-            appmsgext_url, headers=self.headers, data=self.data, proxies=self.proxies
+        response = self.client.post(
+            appmsgext_url, headers=self.headers, data=data, proxies=self.proxies, timeout=self.timeout
         )
         
         logger.info(f"         [__get_appmsgext] API 响应状态码: {response.status_code}")
@@ -271,7 +317,9 @@ class ArticlesInfo(object):
         return appmsgext_json
 
     def __get_content(self, url):
-        return self.s.get(url.strip(), headers=self.headers, proxies=self.proxies).text
+        return self.client.get(
+            url.strip(), headers=self.headers, proxies=self.proxies, timeout=self.timeout
+        ).text
 
     def content(self, url, html_text=None):
         if html_text == None:
@@ -1,10 +1,14 @@
 # coding:utf-8
+import codecs
+import fnmatch
 import logging
 import os
+import re
 import select
+import threading
 import zlib
+from collections import OrderedDict
 
-import chardet
 import time
 from http.client import HTTPResponse
 from http.server import BaseHTTPRequestHandler, HTTPServer
@@ -25,7 +29,6 @@ from OpenSSL.crypto import (
     dump_privatekey,
     dump_certificate,
     load_privatekey,
-    X509Req,
 )
 
 """
@@ -37,6 +40,9 @@ from OpenSSL.crypto import (
 为方便使用，在代码上进行了一定的修改，大部分内容来源于，https://github.com/qiyeboy/BaseProxy/blob/master/baseproxy/proxy.py
     1. 修改部分函数名，变量名，函数，尽量保持与mitmproxy一致
     2. 由于项目主要目的是拦截，并非篡改，增加了对链接过滤功能。若链接不包含相关字符，则不做操作，直接返回。ProxyHandle中的`self.filter_url_lst`
+    3. 增加了需要解密的主机列表。ProxyHandle中的`self.intercept_host_lst`（fnmatch通配符，按主机名完整匹配，如"mp.weixin.qq.com"、"*.qq.com"），
+       不在列表中的https连接不签发证书、直接转发。没有显式设置时解密所有主机：filter_url_lst是对完整URL的子串匹配，
+       无法从中可靠地推出主机，因此不会据此缩小解密范围
 
 
 二次引用，若有冒犯原作者之处，敬请指出，将删除该文件。
@@ -51,6 +57,7 @@ __all__ = [
     "AsyncMitmProxy",
     "Request",
     "Response",
+    "StreamResponse",
 ]
 logging.basicConfig(
     level=logging.INFO,
@@ -58,6 +65,22 @@ logging.basicConfig(
     datefmt="%Y-%m-%d %H:%M:%S",
 )
 
+# MITM长连接：客户端连接空闲超过该时间（秒）后关闭
+KEEPALIVE_TIMEOUT = 30
+# 直接转发（不解密）时每次读取的字节数
+RELAY_BUFFER_SIZE = 64 * 1024
+# 内存中缓存的主机SSLContext数量（LRU）
+CONTEXT_CACHE_SIZE = 256
+# 主机证书有效期一年，磁盘上的证书超过该时间（秒）后重新签发
+LEAF_CERT_MAX_AGE = 300 * 24 * 3600
+# 在响应体开头多少字节内查找<meta charset>
+CHARSET_SNIFF_SIZE = 4096
+# 最后才用chardet探测编码，只探测开头这么多字节
+CHARDET_SAMPLE_SIZE = 64 * 1024
+_CONTENT_TYPE_CHARSET = re.compile(r"charset\s*=\s*[\"']?([^\"';\s]+)", re.I)
+_META_CHARSET = re.compile(rb"<meta[^>]+?charset\s*=\s*[\"']?\s*([a-zA-Z0-9_.:-]+)", re.I)
+_TEXT_CONTENT_TYPES = ("text", "javascript", "json", "xml")
+
 
 class HttpTransfer(object):
     version_dict = {9: "HTTP/0.9", 10: "HTTP/1.0", 11: "HTTP/1.1"}
@@ -171,6 +194,27 @@ class Request(HttpTransfer):
 
         if self.get_header("Content-Length"):
             self.set_body_data(req.rfile.read(int(self.get_header("Content-Length"))))
+        elif "chunked" in (self.get_header("Transfer-Encoding") or "").lower():
+            # 分块上传的请求体，拼接后改用Content-Length转发
+            del self._headers["transfer-encoding"]
+            self.set_body_data(self._read_chunked(req.rfile))
+
+    @staticmethod
+    def _read_chunked(rfile):
+        """
+        读取chunked编码的请求体（读到结束块和trailer为止，不会多读下一个请求）
+        :param rfile:
+        :return:
+        """
+        chunks = []
+        while True:
+            size = int(rfile.readline(65537).split(b";", 1)[0].strip(), 16)
+            if size == 0:
+                while rfile.readline(65537) not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(chunks)
+            chunks.append(rfile.read(size))
+            rfile.readline()  # 块末尾的\r\n
 
     def to_data(self):
         # Build request
@@ -182,6 +226,16 @@ class Request(HttpTransfer):
         return req_data
 
 
+def _response_has_body(method, status):
+    """
+    响应是否可能有响应体：HEAD的响应以及1xx/204/304都没有（即使带着Transfer-Encoding: chunked）
+    :param method:
+    :param status:
+    :return:
+    """
+    return method != "HEAD" and not (100 <= status < 200 or status in (204, 304))
+
+
 class Response(HttpTransfer):
     def __init__(self, request, proxy_socket):
 
@@ -189,48 +243,154 @@ class Response(HttpTransfer):
 
         self.request = request
 
-        h = HTTPResponse(proxy_socket)
+        # 传入请求方法，HEAD请求的响应没有响应体
+        h = HTTPResponse(proxy_socket, method=request.command)
         h.begin()
         ##HTTPResponse会将所有chunk拼接到一起，因此会直接得到所有内容，所以不能有Transfer-Encoding
+        content_length = h.msg["Content-Length"]
         del h.msg["Transfer-Encoding"]
         del h.msg["Content-Length"]
 
         self.response_version = self.version_dict[h.version]
         self.status = h.status
         self.reason = h.reason
+        # 上游是否会关闭连接（Connection: close、HTTP/1.0、以关闭连接表示结束的响应），否则连接可以复用
+        self.will_close = h.will_close
         self.set_headers(h.msg)
+        # 重复的响应头（如多个Set-Cookie）在headers中只保留了最后一个，转发时按收到的全部发送
+        self._repeated_headers = {
+            k.lower(): h.msg.get_all(k) for k in h.msg.keys() if len(h.msg.get_all(k)) > 1
+        }
+
+        # 解压、判断编码、解码都推迟到第一次用到时进行，并缓存结果
+        # 收到的（可能压缩的）响应体；没有响应体的响应不读取（带chunked头的304会一直等下去）
+        self._raw_body = h.read() if _response_has_body(request.command, h.status) else b""
+        self._body = None
+        self._body_str = None
+        self._encoding = None
+        self._encoding_detected = False
+        if request.command == "HEAD" and content_length is not None:
+            # HEAD的响应没有响应体，Content-Length是对应GET响应体的长度，原样保留
+            self.set_header("Content-length", content_length)
+        else:
+            self.set_header("Content-length", str(len(self._raw_body)))
 
-        body_data = self._decode_content_body(
-            h.read(), self.get_header("Content-Encoding")
-        )
-        self.set_body_data(body_data)
-        self._text()  # 尝试将文本进行解码
-
+        # 只关闭读取用的文件对象，上游socket由ProxyHandle决定复用还是关闭
         h.close()
-        proxy_socket.close()
 
-    def _text(self):
+    def build_headers(self):
+        """
+        返回headers字符串（插件没有改动的重复响应头全部保留）
+        :return:
+        """
+        header_str = ""
+        for k, v in self._headers.items():
+            values = self._repeated_headers.get(k)
+            for value in values if values and values[-1] == v else [v]:
+                header_str += k + ": " + value + "\r\n"
+
+        return header_str
+
+    def get_body_data(self):
+        """
+        返回解压后的body内容（第一次调用时解压）
+        :return:
+        """
+        if self._body is None:
+            self.set_body_data(
+                self._decode_content_body(
+                    self._raw_body, self.get_header("Content-Encoding")
+                )
+            )
+        return self._body
+
+    def set_body_data(self, body):
+        content_length = self.get_header("Content-length")
+        HttpTransfer.set_body_data(self, body)
+        if self.request.command == "HEAD" and content_length is not None:
+            self.set_header("Content-length", content_length)
+        self._body_str = None
+
+    @property
+    def encoding(self):
+        """
+        响应体的字符编码，依次使用：Content-Type中的charset、BOM、开头几KB中的<meta charset>，
+        都没有时才对文本类型的响应用chardet探测；结果缓存
+        :return:
+        """
+        if not self._encoding_detected:
+            self._encoding = self._detect_encoding()
+            self._encoding_detected = True
+        return self._encoding
+
+    decoding = encoding  # 兼容原来的属性名
+
+    def _detect_encoding(self):
+        content_type = self.get_header("Content-Type") or ""
+        match = _CONTENT_TYPE_CHARSET.search(content_type)
+        if match and self._known_encoding(match.group(1)):
+            return match.group(1)
+
         body_data = self.get_body_data()
-        if self.get_header("Content-Type") and (
-            "text" or "javascript"
-        ) in self.get_header("Content-Type"):
-            self.decoding = chardet.detect(body_data)["encoding"]  # 探测当前的编码
-            if self.decoding:
-                try:
-                    self._body_str = body_data.decode(self.decoding)  # 请求体
-                except Exception as e:
-                    self._body_str = body_data
-                    self.decoding = None
-            else:
-                self._body_str = body_data
-        else:
-            self._body_str = body_data
-            self.decoding = None
+        if body_data.startswith(codecs.BOM_UTF8):
+            return "utf-8-sig"
+        match = _META_CHARSET.search(body_data, 0, CHARSET_SNIFF_SIZE)
+        if match:
+            charset = match.group(1).decode("ascii")
+            if self._known_encoding(charset):
+                return charset
+
+        if body_data and any(t in content_type for t in _TEXT_CONTENT_TYPES):
+            import chardet
+
+            return chardet.detect(body_data[:CHARDET_SAMPLE_SIZE])["encoding"]
+        return None
+
+    @staticmethod
+    def _known_encoding(name):
+        try:
+            codecs.lookup(name)
+            return True
+        except LookupError:
+            return False
 
     def get_text(self, decoding=None):
+        """
+        返回解码后的文本（按encoding解码，无法判断编码时按utf-8）；结果缓存
+        :param decoding: 指定编码时直接按该编码解码
+        :return:
+        """
         if decoding:
             return self.get_body_data().decode(decoding)
-        return self.get_body_data().decode()
+        if self._body_str is None:
+            self._body_str = self.get_body_data().decode(
+                self.encoding or "utf-8", errors="replace"
+            )
+        return self._body_str
+
+    text = property(get_text)
+
+    def search(self, pattern, flags=0):
+        """
+        直接在（解压后的）响应体字节上匹配正则，不需要解码
+        :param pattern: bytes正则或编译好的bytes正则，如rb'"read_num"\s*:\s*(\d+)'
+        :param flags:
+        :return: re.Match或None
+        """
+        if isinstance(pattern, bytes):
+            return re.search(pattern, self.get_body_data(), flags)
+        return pattern.search(self.get_body_data())
+
+    def findall(self, pattern, flags=0):
+        """
+        同search，返回所有匹配
+        :param pattern:
+        :param flags:
+        :return:
+        """
+        if isinstance(pattern, bytes):
+            return re.findall(pattern, self.get_body_data(), flags)
+        return pattern.findall(self.get_body_data())
 
     def set_body_str(self, body_str, encoding=None):
         if isinstance(body_str, str):
@@ -238,7 +398,7 @@ class Response(HttpTransfer):
                 self.set_body_data(body_str.encode(encoding))
             else:
                 self.set_body_data(
-                    body_str.encode(self.decoding if self.decoding else "utf-8")
+                    body_str.encode(self.encoding if self.encoding else "utf-8")
                 )
             self._body_str = body_str
             return
@@ -281,20 +441,98 @@ class Response(HttpTransfer):
 
         res_data = "%s %s %s\r\n" % (self.response_version, self.status, self.reason)
         res_data += "%s\r\n" % self.build_headers()
-        res_data = res_data.encode(self.decoding if self.decoding else "utf-8")
-        res_data += self.get_body_data()
+        res_data = res_data.encode(self._encoding if self._encoding else "utf-8")
+        # 没有插件读取过响应体时，原样转发收到的（可能压缩的）内容
+        res_data += self._raw_body if self._body is None else self._body
         return res_data
 
 
+class StreamResponse(HttpTransfer):
+    """
+    不需要检查的响应：只解析状态行和响应头，响应体不缓存、不解压，
+    按原来的分帧方式（Content-Length / chunked / 关闭连接）分块转发给客户端
+    """
+
+    def __init__(self, request, proxy_socket):
+        HttpTransfer.__init__(self)
+
+        self.request = request
+
+        self._h = HTTPResponse(proxy_socket, method=request.command)
+        self._h.begin()
+
+        self.response_version = self.version_dict[self._h.version]
+        self.status = self._h.status
+        self.reason = self._h.reason
+        self.will_close = self._h.will_close
+        self.has_body = _response_has_body(request.command, self.status)
+        # 没有长度也不是chunked：响应体以上游关闭连接结束，转发完之后客户端连接也要关闭
+        self.close_delimited = (
+            self.has_body and not self._h.chunked and self._h.length is None
+        )
+        self._header_items = self._h.msg.items()  # 保留原始顺序和重复的头（如多个Set-Cookie）
+        self.set_headers(self._h.msg)
+
+    def _head_data(self):
+        res_data = "%s %s %s\r\n" % (self.response_version, self.status, self.reason)
+        for k, v in self._header_items:
+            res_data += k + ": " + v + "\r\n"
+        res_data += "\r\n"
+        return res_data.encode("latin-1")
+
+    def relay(self, client_socket):
+        """
+        把响应转发给客户端（每次最多RELAY_BUFFER_SIZE字节），返回转发的响应体字节数
+        :param client_socket:
+        :return:
+        """
+        pending = self._head_data()  # 响应头和第一块响应体一起发送
+        size = 0
+        # HEAD和1xx/204/304即使带着chunked头也没有响应体，不能读取，也不能补结束块（客户端不会读，长连接会错位）
+        rechunk = self._h.chunked and self.has_body
+        try:
+            while self.has_body:
+                data = self._h.read1(RELAY_BUFFER_SIZE)
+                if not data:
+                    break
+                size += len(data)
+                if rechunk:
+                    # HTTPResponse已经去掉了分块，按原来的chunked格式重新分块
+                    data = b"%x\r\n%s\r\n" % (len(data), data)
+                client_socket.sendall(pending + data)
+                pending = b""
+            if rechunk:
+                pending += b"0\r\n\r\n"
+            if pending:
+                client_socket.sendall(pending)
+        finally:
+            self._h.close()
+        return size
+
+
 class CAAuth(object):
     """
     用于CA证书的生成以及代理证书的自签名
     """
 
-    def __init__(self, ca_file="ca.pem", cert_file="ca.crt"):
+    def __init__(
+        self,
+        ca_file="ca.pem",
+        cert_file="ca.crt",
+        cache_dir=None,
+        context_cache_size=CONTEXT_CACHE_SIZE,
+    ):
         self.ca_file_path = ca_file
         self.cert_file_path = cert_file
         self._gen_ca()  # 生成CA证书，需要添加到浏览器的合法证书机构中
+        # 主机证书目录按CA区分，更换CA后不会用到旧CA签发的证书；重启代理后继续使用已签发的证书
+        self.cache_dir = cache_dir or os.path.join(
+            gettempdir(), "baseproxy", self._ca_fingerprint()
+        )
+        self.context_cache_size = context_cache_size
+        self._contexts = OrderedDict()  # 主机名 -> 服务器端SSLContext
+        self._leaf_key = None  # 所有主机证书共用的私钥
+        self._lock = threading.Lock()
 
     def _gen_ca(self, again=False):
         # Generate key
@@ -338,37 +576,82 @@ class CAAuth(object):
         self.cert = load_certificate(FILETYPE_PEM, open(file, "rb").read())
         self.key = load_privatekey(FILETYPE_PEM, open(file, "rb").read())
 
-    def __getitem__(self, cn):
-        # 将为每个域名生成的服务器证书，放到临时目录中
-        cache_dir = gettempdir()
-        root_dir = os.path.join(cache_dir, "baseproxy")
-        if not os.path.exists(root_dir):
-            os.makedirs(root_dir)
+    def _ca_fingerprint(self):
+        return self.cert.digest("sha1").decode().replace(":", "")[:16].lower()
 
-        cnp = os.path.join(root_dir, "baseproxy_{}.pem".format(cn))
+    def get_context(self, cn):
+        """
+        返回主机对应的服务器端SSLContext
+        按主机名LRU缓存，命中时不需要签发证书，也不需要读文件
+        :param cn: 主机名
+        :return:
+        """
+        with self._lock:
+            context = self._contexts.get(cn)
+            if context is not None:
+                self._contexts.move_to_end(cn)
+                return context
+
+        context = SSLContext(PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile=self[cn])
+        with self._lock:
+            self._contexts[cn] = context
+            while len(self._contexts) > self.context_cache_size:
+                self._contexts.popitem(last=False)
+        return context
 
-        if not os.path.exists(cnp):
-            self._sign_ca(cn, cnp)
+    def __getitem__(self, cn):
+        # 将为每个域名生成的服务器证书，放到临时目录中（按CA区分），已签发的证书直接复用
+        cnp = os.path.join(self.cache_dir, "baseproxy_{}.pem".format(cn))
+        if not self._is_fresh(cnp):
+            with self._lock:
+                if not self._is_fresh(cnp):
+                    self._sign_ca(cn, cnp)
         return cnp
 
+    @staticmethod
+    def _is_fresh(path):
+        try:
+            return time.time() - os.path.getmtime(path) < LEAF_CERT_MAX_AGE
+        except OSError:
+            return False
+
+    def _get_leaf_key(self):
+        """
+        所有主机证书共用一个私钥（保存在证书目录中，重启后继续使用），签发新证书时不需要生成RSA密钥
+        调用时需持有self._lock
+        :return:
+        """
+        if self._leaf_key is None:
+            key_path = os.path.join(self.cache_dir, "leaf_key.pem")
+            if os.path.exists(key_path):
+                with open(key_path, "rb") as f:
+                    self._leaf_key = load_privatekey(FILETYPE_PEM, f.read())
+            else:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                key = PKey()
+                key.generate_key(TYPE_RSA, 2048)
+                self._write_atomic(key_path, dump_privatekey(FILETYPE_PEM, key))
+                self._leaf_key = key
+        return self._leaf_key
+
+    @staticmethod
+    def _write_atomic(path, data):
+        # 先写临时文件再替换，其他进程不会读到写了一半的文件
+        tmp_path = "{}.{}.tmp".format(path, threading.get_ident())
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
     def _sign_ca(self, cn, cnp):
         # 使用合法的CA证书为代理程序生成服务器证书
         # create certificate
         try:
+            key = self._get_leaf_key()
 
-            key = PKey()
-            key.generate_key(TYPE_RSA, 2048)
-
-            # Generate CSR
-            req = X509Req()
-            req.get_subject().CN = cn
-            req.set_pubkey(key)
-            req.sign(key, "sha256")
-
-            # Sign CSR
             cert = X509()
             cert.set_version(2)
-            cert.set_subject(req.get_subject())
+            cert.get_subject().CN = cn
             cert.set_serial_number(self.serial)
             cert.gmtime_adj_notBefore(0)
             cert.gmtime_adj_notAfter(31536000)  # 一年
@@ -377,12 +660,14 @@ class CAAuth(object):
 
             cert.add_extensions([X509Extension(b"subjectAltName", False, ss)])
 
-            cert.set_pubkey(req.get_pubkey())
+            cert.set_pubkey(key)
             cert.sign(self.key, "sha256")
 
-            with open(cnp, "wb+") as f:
-                f.write(dump_privatekey(FILETYPE_PEM, key))
-                f.write(dump_certificate(FILETYPE_PEM, cert))
+            self._write_atomic(
+                cnp,
+                dump_privatekey(FILETYPE_PEM, key)
+                + dump_certificate(FILETYPE_PEM, cert),
+            )
         except Exception as e:
             raise Exception("generate CA fail:{}".format(str(e)))
 
@@ -392,15 +677,38 @@ class CAAuth(object):
 
 
 class ProxyHandle(BaseHTTPRequestHandler):
+    # HTTP/1.1：客户端没有要求关闭时保持连接，继续处理同一连接上的后续请求
+    protocol_version = "HTTP/1.1"
+
     def __init__(self, request, client_addr, server):
         self.is_connected = False
+        self._proxy_sock = None
+        self._proxy_sock_reused = False  # 上游连接是否已完成过请求（复用的连接可能已被服务器关闭）
+        # 需要解密（MITM）的主机，支持通配符如"*.qq.com"；不设置时解密所有主机
+        self.intercept_host_lst = None
         self.hook_init()
         BaseHTTPRequestHandler.__init__(self, request, client_addr, server)
 
     def hook_init(self):
-        # 增加初始化的其他操作，如初始化filter_url_lst
+        # 增加初始化的其他操作，如初始化filter_url_lst、intercept_host_lst
         self.filter_url_lst = []
 
+    def should_intercept(self, hostname):
+        """
+        CONNECT时判断是否解密该主机的https流量
+        只有intercept_host_lst中的主机才签发证书、解密，其余的（图片CDN、上报等）直接转发；
+        没有设置intercept_host_lst时全部解密（与原来的行为一致，filter_url_lst只决定拦截哪些请求）
+        :param hostname:
+        :return:
+        """
+        if not self.intercept_host_lst:
+            return True
+        hostname = hostname.lower()
+        for pattern in self.intercept_host_lst:
+            if fnmatch.fnmatch(hostname, pattern.lower()):
+                return True
+        return False
+
     def do_CONNECT(self):
         """
         处理https连接请求
@@ -408,7 +716,7 @@ class ProxyHandle(BaseHTTPRequestHandler):
         """
 
         self.is_connected = True  # 用来标识是否之前经历过CONNECT
-        if self.server.https:
+        if self.server.https and self.should_intercept(self.path.split(":")[0]):
             self.connect_intercept()
         else:
             self.connect_relay()
@@ -441,11 +749,37 @@ class ProxyHandle(BaseHTTPRequestHandler):
             request = self.mitm_request(request)
 
         if request:
-            self._proxy_sock.sendall(request.to_data())
+            # 只有订阅了该URL的响应插件才需要完整读取、解压响应，其余响应边读边转发
+            rsp_plugs = (
+                [p for p in self.server.rsp_plugs if p.subscribes(request.url)]
+                if flag
+                else []
+            )
+            try:
+                response = self._send_upstream(
+                    request, Response if rsp_plugs else StreamResponse
+                )
+            except Exception as e:
+                self._close_upstream()
+                self.send_error(502, "{} request fail ".format(self.hostname))
+                return
+
+            if not rsp_plugs:
+                try:
+                    response.relay(self.request)
+                except Exception as e:
+                    # 已经开始转发，无法再返回错误页面，只能关闭连接
+                    self._close_upstream()
+                    self.close_connection = True
+                    return
+                self._release_upstream(response)
+                if response.close_delimited:
+                    self.close_connection = True
+                return
+
+            self._release_upstream(response)
             # 将响应信息返回给客户端
-            response = Response(request, self._proxy_sock)
-            if flag:
-                response = self.mitm_response(response)
+            response = self.mitm_response(response, rsp_plugs)
 
             if response:
                 self.request.sendall(response.to_data())
@@ -460,6 +794,49 @@ class ProxyHandle(BaseHTTPRequestHandler):
     do_DELETE = do_GET
     do_OPTIONS = do_GET
 
+    def _send_upstream(self, request, response_class=Response):
+        """
+        向上游发送请求并读取响应（Response完整读取，StreamResponse只读取响应头）
+        复用的长连接可能已被服务器因空闲关闭，此时重新连接并重试一次
+        :param request:
+        :param response_class:
+        :return:
+        """
+        if self._proxy_sock is None:
+            # 上一个响应之后上游关闭了连接，重新连接
+            self._connect_ssldst()
+        try:
+            self._proxy_sock.sendall(request.to_data())
+            response = response_class(request, self._proxy_sock)
+        except (ConnectionError, SSLError):
+            if not self._proxy_sock_reused:
+                raise
+            self._close_upstream()
+            self._connect_ssldst()
+            self._proxy_sock.sendall(request.to_data())
+            response = response_class(request, self._proxy_sock)
+
+        self._proxy_sock_reused = True
+        return response
+
+    def _release_upstream(self, response):
+        """
+        响应体读完后决定上游连接是否复用
+        普通http请求每次都重新连接目标服务器（_proxy_to_dst），用完即关闭
+        :param response:
+        :return:
+        """
+        if response.will_close or not self.is_connected:
+            self._close_upstream()
+
+    def _close_upstream(self):
+        if self._proxy_sock is not None:
+            try:
+                self._proxy_sock.close()
+            except Exception:
+                pass
+        self._proxy_sock = None
+
     def _proxy_to_ssldst(self):
         """
         代理连接https目标服务器
@@ -470,14 +847,19 @@ class ProxyHandle(BaseHTTPRequestHandler):
         # 如果之前经历过connect
         # CONNECT www.baidu.com:443 HTTP 1.1
         self.hostname, self.port = self.path.split(":")
+        self._connect_ssldst()
+
+    def _connect_ssldst(self):
+        """
+        连接（或重新连接）https目标服务器
+        :return:
+        """
+        self._proxy_sock_reused = False
         self._proxy_sock = socket()
         self._proxy_sock.settimeout(10)
         self._proxy_sock.connect((self.hostname, int(self.port)))
-        # 进行SSL包裹
-        context = ssl.SSLContext(PROTOCOL_TLS_CLIENT)
-        context.check_hostname = False
-        context.verify_mode = ssl.CERT_NONE
-        self._proxy_sock = context.wrap_socket(self._proxy_sock)
+        # 进行SSL包裹（上游的SSLContext由MitmProxy创建一次，所有连接共用）
+        self._proxy_sock = self.server.upstream_context.wrap_socket(self._proxy_sock)
 
     def _proxy_to_dst(self):
         # 代理连接http目标服务器
@@ -498,6 +880,7 @@ class ProxyHandle(BaseHTTPRequestHandler):
                 fragment=u.fragment,
             )
         )
+        self._proxy_sock_reused = False
         self._proxy_sock = socket()
         self._proxy_sock.settimeout(10)
         self._proxy_sock.connect((self.hostname, int(self.port)))
@@ -515,8 +898,7 @@ class ProxyHandle(BaseHTTPRequestHandler):
             self.end_headers()
 
             # 这个时候需要将客户端的socket包装成sslsocket,这个时候的self.path类似www.baidu.com:443，根据域名使用相应的证书
-            context = ssl.SSLContext(PROTOCOL_TLS_SERVER)
-            context.load_cert_chain(certfile=self.server.ca[self.path.split(":")[0]])
+            context = self.server.ca.get_context(self.path.split(":")[0])
             self.request = context.wrap_socket(
                 self.request,
                 server_side=True,
@@ -530,10 +912,18 @@ class ProxyHandle(BaseHTTPRequestHandler):
 
         self.setup()
         self.ssl_host = "https://%s" % self.path
+        # 长连接：在同一个TLS连接上持续处理请求，上游连接也一直复用，
+        # 直到客户端要求关闭（Connection: close）、断开或空闲超时
+        self.request.settimeout(KEEPALIVE_TIMEOUT)
+        self.close_connection = False
         try:
-            self.handle_one_request()
+            while not self.close_connection:
+                self.handle_one_request()
         except Exception as e:
-            return
+            pass
+        finally:
+            self.close_connection = True
+            self._close_upstream()
 
     def connect_relay(self):
         """
@@ -554,21 +944,28 @@ class ProxyHandle(BaseHTTPRequestHandler):
 
         inputs = [self.request, self._proxy_sock]
 
-        while True:
+        closed = False
+        while not closed:
             readable, writeable, errs = select.select(inputs, [], inputs, 10)
             if errs:
                 break
             for r in readable:
-                data = r.recv(8092)
-                if data:
-                    if r is self.request:
-                        self._proxy_sock.sendall(data)
-                    elif r is self._proxy_sock:
-                        self.request.sendall(data)
-                else:
-                    break
+                try:
+                    data = r.recv(RELAY_BUFFER_SIZE)
+                    if data:
+                        if r is self.request:
+                            self._proxy_sock.sendall(data)
+                        elif r is self._proxy_sock:
+                            self.request.sendall(data)
+                        continue
+                except OSError:
+                    pass
+                # 任一方关闭连接（或出错）时结束转发
+                closed = True
+                break
+        self.close_connection = True
         self.request.close()
-        self._proxy_sock.close()
+        self._close_upstream()
 
     def _send_ca(self):
         # 发送CA证书给用户进行安装并信任
@@ -588,8 +985,8 @@ class ProxyHandle(BaseHTTPRequestHandler):
             req = p(self.server).deal_request(req)
         return req
 
-    def mitm_response(self, rsp):
-        for p in self.server.rsp_plugs:
+    def mitm_response(self, rsp, rsp_plugs=None):
+        for p in self.server.rsp_plugs if rsp_plugs is None else rsp_plugs:
             rsp = p(self.server).deal_response(rsp)
         return rsp
 
@@ -613,6 +1010,10 @@ class MitmProxy(ThreadingMixIn, HTTPServer):
         self.rsp_plugs = []  ##响应拦截插件列表
         self.ca = CAAuth(ca_file=ca_file, cert_file=cert_file)
         self.https = https
+        # 连接上游https服务器用的SSLContext（不校验证书）
+        self.upstream_context = ssl.SSLContext(PROTOCOL_TLS_CLIENT)
+        self.upstream_context.check_hostname = False
+        self.upstream_context.verify_mode = ssl.CERT_NONE
 
     def register(self, intercept_plug):
         if not issubclass(intercept_plug, InterceptPlug):
@@ -642,5 +1043,18 @@ class ReqIntercept(InterceptPlug):
 
 
 class RspIntercept(InterceptPlug):
+    # 需要检查的响应URL（包含其中任一字符串）；为None时检查所有通过filter_url_lst的响应
+    # 没有插件订阅的响应不缓存、不解压，直接流式转发
+    url_filters = None
+
+    @classmethod
+    def subscribes(cls, url):
+        if cls.url_filters is None:
+            return True
+        for filter_x in cls.url_filters:
+            if filter_x in url:
+                return True
+        return False
+
     def deal_response(self, response):
         pass